@@ -0,0 +1,620 @@
+"""
+Micro-benchmarks for every public function in database.py, run against seeded
+databases of increasing size. Each size gets the given number of users and of
+registrations, with realistic event and status distributions. The suite reports
+ops/sec and p50/p95/p99 latency per function and writes the results as JSON so
+that index, schema or connection changes can be compared across runs.
+
+Usage: python -m benchmarks.bench_database [--sizes 10000,100000,1000000]
+           [--iterations 200] [--output bench_database.json] [--seed 1]
+"""
+
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temp_database
+import database as db
+from codegen import generate_ticket_code, random_code
+
+EVENT_SIZE_RATIO = 20_000  # One event per this many registrations, at least 10
+DISCOUNT_CODES_PER_EVENT = 20
+INVITED_SHARE = 0.3  # Share of users who joined through a referral link
+INVITER_SHARE = 0.02  # Share of users who have ever invited someone
+LAUNCH_CAPACITY = 1000  # Seats of the fully booked launch event
+LAUNCH_WAITLIST = 5000  # Users waiting for a seat of the launch event
+
+# (status, weight) for past events and for the active one, which still has
+# receipts waiting for review.
+PAST_EVENT_STATUSES = [
+    ("confirmed", 80),
+    ("rejected", 10),
+    ("pending_verification", 10),
+]
+ACTIVE_EVENT_STATUSES = [
+    ("confirmed", 55),
+    ("pending_verification", 30),
+    ("rejected", 10),
+    ("pending", 5),
+]
+
+
+class Dataset:
+    """What the seeder created, so benchmark cases can pick realistic arguments."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.event_ids = []
+        self.active_event_id = None
+        self.referral_codes = []
+        self.ticket_codes = []
+        self.discount_codes = []  # (event_id, code_id, code)
+        self.pending_registration_ids = []
+        self.unchecked_registration_ids = []  # Confirmed, not yet checked in
+        self.registration_pairs = []  # (user_id, event_id)
+        self.receipt_unique_ids = []
+        self.receipt_phashes = []
+        self.launch_event_id = None  # Fully booked, with a waitlist
+        self.launch_registration_ids = []
+        self.waitlisted_user_ids = []
+        self.next_user_id = size + 1
+
+
+def _weighted_choice(rng: random.Random, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def seed_database(size: int, rng: random.Random) -> Dataset:
+    """
+    Fills a fresh database with `size` users and `size` registrations. Triggers
+    are dropped while seeding and the counters they maintain are rebuilt at the
+    end, which is much faster than firing them for every row.
+    """
+    data = Dataset(size)
+    conn = db.get_db_connection()
+    triggers = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    for (name,) in triggers.fetchall():
+        conn.execute(f"DROP TRIGGER {name}")
+
+    # Events: roughly one a week, the latest one active and in the future.
+    event_count = max(10, size // EVENT_SIZE_RATIO)
+    first_date = datetime(2024, 1, 6, 18, 0)
+    events = []
+    reminders = []
+    for index in range(event_count):
+        fee = rng.choice([0, 100_000, 150_000, 250_000])
+        starts_at = int((first_date + timedelta(weeks=index)).timestamp())
+        events.append(
+            (
+                f"Event {index + 1}",
+                "A benchmark event.",
+                starts_at,
+                fee,
+                int(fee > 0),
+                "Card 1234" if fee else None,
+                "24,1",
+                int(index == event_count - 1),
+            )
+        )
+        # Past events' reminders went out; the active event's are still due.
+        sent_at = None if index == event_count - 1 else "2024-01-01 00:00:00"
+        for hour in (24, 1):
+            reminders.append((index + 1, hour, starts_at - hour * 3600, sent_at))
+    conn.executemany(
+        "INSERT INTO events (name, description, starts_at, timezone, fee, is_paid, payment_details, reminders, is_active) "
+        "VALUES (?, ?, ?, 'UTC', ?, ?, ?, ?, ?)",
+        events,
+    )
+    conn.executemany(
+        "INSERT INTO event_reminders (event_id, hours_before, remind_at, sent_at) "
+        "VALUES (?, ?, ?, ?)",
+        reminders,
+    )
+    data.event_ids = list(range(1, event_count + 1))
+    data.active_event_id = data.event_ids[-1]
+
+    discount_rows = []
+    for event_id in data.event_ids:
+        for _ in range(DISCOUNT_CODES_PER_EVENT):
+            discount_rows.append(
+                (
+                    event_id,
+                    f"E{event_id}{random_code(6)}",
+                    rng.choice(["percentage", "fixed"]),
+                    rng.choice([10, 20, 50]),
+                    rng.randint(0, 50),
+                )
+            )
+    conn.executemany(
+        "INSERT OR IGNORE INTO discount_codes (event_id, code, discount_type, value, uses_left) "
+        "VALUES (?, ?, ?, ?, ?)",
+        discount_rows,
+    )
+    data.discount_codes = [
+        tuple(row)
+        for row in conn.execute("SELECT event_id, code_id, code FROM discount_codes")
+    ]
+    codes_by_event = {}
+    for event_id, _, code in data.discount_codes:
+        codes_by_event.setdefault(event_id, []).append(code)
+
+    # Users: a few prolific inviters account for most referrals.
+    inviter_pool = max(1, int(size * INVITER_SHARE))
+    users = []
+    referral_counts = Counter()
+    for user_id in range(1, size + 1):
+        invited_by = None
+        if user_id > inviter_pool and rng.random() < INVITED_SHARE:
+            invited_by = min(int(rng.paretovariate(1.2)), inviter_pool)
+            referral_counts[invited_by] += 1
+        referral_code = uuid.uuid4().hex[:8]
+        users.append(
+            (user_id, f"user{user_id}", f"Name{user_id}", referral_code, invited_by)
+        )
+        if user_id % 97 == 0:
+            data.referral_codes.append(referral_code)
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (user_id, username, first_name, referral_code, invited_by_user_id) "
+        "VALUES (?, ?, ?, ?, ?)",
+        users,
+    )
+    conn.executemany(
+        "UPDATE users SET referral_count = ? WHERE user_id = ?",
+        [(count, user_id) for user_id, count in referral_counts.items()],
+    )
+    del users
+
+    # Registrations: later events draw bigger crowds.
+    event_weights = [index + 1 for index in range(event_count)]
+    used_ticket_codes = set()
+    registrations = []
+    for event_id in rng.choices(data.event_ids, event_weights, k=size):
+        is_active = event_id == data.active_event_id
+        status = _weighted_choice(
+            rng, ACTIVE_EVENT_STATUSES if is_active else PAST_EVENT_STATUSES
+        )
+        ticket_code = checked_in_at = receipt = unique_id = phash = None
+        bands = [None] * 4
+        registered_at = first_date + timedelta(
+            weeks=event_id - 2, seconds=rng.randrange(7 * 24 * 3600)
+        )
+        if status == "confirmed":
+            ticket_code = generate_ticket_code()
+            while ticket_code in used_ticket_codes:
+                ticket_code = generate_ticket_code()
+            used_ticket_codes.add(ticket_code)
+            if not is_active and rng.random() < 0.8:
+                checked_in_at = (registered_at + timedelta(days=7)).isoformat(" ")
+        if status in ("confirmed", "rejected") or (
+            status == "pending_verification" and rng.random() < 0.8
+        ):
+            receipt = f"receipt-{rng.getrandbits(48):x}"
+            unique_id = f"unique-{rng.getrandbits(48):x}"
+            phash = rng.getrandbits(64)
+            bands = [(phash >> (16 * band)) & 0xFFFF for band in range(4)]
+            if len(data.receipt_phashes) < 1000:
+                data.receipt_unique_ids.append(unique_id)
+                data.receipt_phashes.append(phash)
+            if phash >= 1 << 63:
+                phash -= 1 << 64  # Stored as a signed 64-bit integer
+        discount = None
+        if rng.random() < 0.15:
+            discount = rng.choice(codes_by_event[event_id])
+        registrations.append(
+            (
+                rng.randint(1, size),
+                event_id,
+                status,
+                ticket_code,
+                receipt,
+                discount,
+                rng.choice([0, 100_000, 150_000]),
+                checked_in_at,
+                registered_at.strftime("%Y-%m-%d %H:%M:%S"),
+                unique_id,
+                phash,
+                *bands,
+            )
+        )
+    conn.executemany(
+        "INSERT INTO registrations (user_id, event_id, status, ticket_code, receipt_file_id, "
+        "discount_code_used, final_fee, checked_in_at, registered_at, receipt_unique_id, "
+        "receipt_phash, receipt_phash_b0, receipt_phash_b1, receipt_phash_b2, receipt_phash_b3) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        registrations,
+    )
+    del registrations
+    data.ticket_codes = rng.sample(
+        sorted(used_ticket_codes), min(1000, len(used_ticket_codes))
+    )
+
+    cursor = conn.execute(
+        "SELECT registration_id FROM registrations "
+        "WHERE status = 'pending_verification' AND receipt_file_id IS NOT NULL"
+    )
+    data.pending_registration_ids = [row[0] for row in cursor]
+    rng.shuffle(data.pending_registration_ids)
+    cursor = conn.execute(
+        "SELECT registration_id FROM registrations "
+        "WHERE event_id = ? AND status = 'confirmed' AND checked_in_at IS NULL",
+        (data.active_event_id,),
+    )
+    data.unchecked_registration_ids = [row[0] for row in cursor]
+    cursor = conn.execute(
+        "SELECT user_id, event_id FROM registrations ORDER BY random() LIMIT 1000"
+    )
+    data.registration_pairs = [tuple(row) for row in cursor]
+
+    # A launch event that sold out at once: every seat held, a long waitlist.
+    cursor = conn.execute(
+        "INSERT INTO events (name, description, fee, is_paid, capacity, is_active) "
+        "VALUES ('Launch', 'A sold-out benchmark event.', 0, 0, ?, 0)",
+        (LAUNCH_CAPACITY,),
+    )
+    data.launch_event_id = cursor.lastrowid
+    launch_users = rng.sample(range(1, size + 1), min(size, LAUNCH_CAPACITY))
+    conn.executemany(
+        "INSERT INTO registrations (user_id, event_id, status, final_fee) "
+        "VALUES (?, ?, 'pending_verification', 0)",
+        [(user_id, data.launch_event_id) for user_id in launch_users],
+    )
+    cursor = conn.execute(
+        "SELECT registration_id FROM registrations WHERE event_id = ?",
+        (data.launch_event_id,),
+    )
+    data.launch_registration_ids = [row[0] for row in cursor]
+    data.waitlisted_user_ids = list(
+        range(data.next_user_id, data.next_user_id + LAUNCH_WAITLIST)
+    )
+    data.next_user_id += LAUNCH_WAITLIST
+    conn.executemany(
+        "INSERT INTO event_waitlist (event_id, user_id) VALUES (?, ?)",
+        [(data.launch_event_id, user_id) for user_id in data.waitlisted_user_ids],
+    )
+
+    conn.execute("DELETE FROM event_referrals")
+    conn.execute(
+        "INSERT INTO event_referrals (event_id, inviter_user_id, referral_count) "
+        + db.EVENT_REFERRALS_QUERY
+    )
+    conn.commit()
+    conn.close()
+    db.initialize_database()  # Recreates the triggers
+    db.rebuild_event_stats()
+    return data
+
+
+def build_cases(data: Dataset, rng: random.Random):
+    """
+    Returns (function name, make_args, max_iterations) for every benchmarked call.
+    make_args() returns the positional arguments of one call; max_iterations caps
+    slow calls and calls that consume seeded rows.
+    """
+    active = data.active_event_id
+    pending = iter(data.pending_registration_ids)
+    launch = data.launch_event_id
+    launch_registrations = iter(data.launch_registration_ids)
+    unchecked = iter(data.unchecked_registration_ids)
+    new_user_ids = iter(range(data.next_user_id, data.next_user_id + 10**7))
+    counter = iter(range(10**9))
+
+    # Throwaway rows for the destructive calls, so they don't eat into the dataset.
+    throwaway_codes = []
+    for _ in range(2000):
+        code = f"DEL{random_code(8)}"
+        db.create_discount_code(active, code, "fixed", 1, 1)
+        throwaway_codes.append(db.get_discount_code(active, code)["code_id"])
+    throwaway_codes = iter(throwaway_codes)
+
+    def returning_user():
+        user_id = rng.randint(1, data.size)
+        return (user_id, f"user{user_id}", f"Name{user_id}")
+
+    def new_user():
+        user_id = next(new_user_ids)
+        invited_by = rng.randint(1, data.size) if rng.random() < INVITED_SHARE else None
+        return (user_id, f"user{user_id}", f"Name{user_id}", invited_by)
+
+    def create_throwaway_event():
+        db.create_event(
+            "Throwaway", "Deleted by the benchmark.", None, "UTC", 0, 0, None, []
+        )
+        event_id = max(row["event_id"] for row in db.get_all_events())
+        db.set_active_event(active)
+        return (event_id,)
+
+    def pending_batch(size: int):
+        return [next(pending, 0) for _ in range(size)]
+
+    def check_in_batch():
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return ([(next(unchecked, 0), now) for _ in range(50)],)
+
+    def free_launch_seat():
+        # Rejecting a launch registration frees a seat for the waitlist.
+        db.update_registration_status(next(launch_registrations), "rejected")
+        return (30,)
+
+    def similar_phash():
+        # A seeded receipt's hash with two bits flipped, like a recompressed copy.
+        phash = rng.choice(data.receipt_phashes)
+        for bit in rng.sample(range(64), 2):
+            phash ^= 1 << bit
+        return (phash, 3)
+
+    def discount_code():
+        event_id, _, code = rng.choice(data.discount_codes)
+        return (event_id, code)
+
+    def import_batch():
+        # 1,000 codes from a partner file, a fifth of which the event already has.
+        existing = [
+            code for event_id, _, code in data.discount_codes if event_id == active
+        ]
+        codes = [f"IMP{next(counter)}" for _ in range(800)]
+        codes += rng.choices(existing, k=200)
+        return (active, codes, "percentage", 10, 1)
+
+    pending_count = len(data.pending_registration_ids)
+    return [
+        ("get_db_connection", lambda: (), None),
+        ("get_data_version", lambda: ("users", "registrations"), None),
+        ("initialize_database", lambda: (), 20),
+        ("add_or_update_user", new_user, None),
+        ("add_or_update_user[returning]", returning_user, None),
+        (
+            "bulk_update_user_profiles",
+            lambda: ([returning_user() for _ in range(200)],),
+            None,
+        ),
+        (
+            "find_user_by_referral_code",
+            lambda: (rng.choice(data.referral_codes),),
+            None,
+        ),
+        ("get_user_referral_info", lambda: (rng.randint(1, data.size),), None),
+        ("get_referrer", lambda: (rng.randint(1, data.size),), None),
+        ("get_top_referrers", lambda: (10,), None),
+        ("get_top_event_referrers", lambda: (rng.choice(data.event_ids), 10), None),
+        (
+            "get_user_registration_for_event",
+            lambda: rng.choice(data.registration_pairs),
+            None,
+        ),
+        (
+            "create_registration",
+            lambda: (next(new_user_ids), active, "pending_verification", 150_000),
+            None,
+        ),
+        ("reserve_seat", lambda: (next(new_user_ids), active, 30), None),
+        ("reserve_seat[full]", lambda: (next(new_user_ids), launch, 30), None),
+        (
+            "get_waitlist_position",
+            lambda: (rng.choice(data.waitlisted_user_ids), launch),
+            None,
+        ),
+        ("promote_from_waitlist", free_launch_seat, len(data.launch_registration_ids)),
+        ("expire_seat_holds", lambda: (), None),
+        ("get_event_seats", lambda: (launch,), None),
+        (
+            "get_last_registration_id",
+            lambda: rng.choice(data.registration_pairs),
+            None,
+        ),
+        ("get_pending_registrations", lambda: (10,), None),
+        ("get_next_pending_registration", lambda: (), None),
+        (
+            "update_registration_status",
+            lambda: (next(pending, 0), rng.choice(["confirmed", "rejected"])),
+            pending_count // 2,
+        ),
+        (
+            "bulk_update_registration_status",
+            lambda: (pending_batch(10), "confirmed"),
+            pending_count // 20,
+        ),
+        (
+            "set_ticket_qr_file_id",
+            lambda: (rng.randint(1, data.size), f"qr-{next(counter)}"),
+            None,
+        ),
+        (
+            "get_registration_by_ticket_code",
+            lambda: (rng.choice(data.ticket_codes),),
+            None,
+        ),
+        (
+            "add_receipt_to_registration",
+            lambda: (
+                *rng.choice(data.registration_pairs),
+                f"receipt-{next(counter)}",
+                f"unique-bench-{next(counter)}",
+            ),
+            None,
+        ),
+        (
+            "find_receipt_by_unique_id",
+            lambda: (
+                rng.choice(data.receipt_unique_ids),
+                *rng.choice(data.registration_pairs),
+            ),
+            None,
+        ),
+        ("find_similar_receipts", similar_phash, None),
+        (
+            "set_receipt_local_path",
+            lambda: (
+                rng.choice(data.pending_registration_ids),
+                f"receipts/ab/{rng.getrandbits(256):064x}.jpg",
+            ),
+            None,
+        ),
+        ("get_unarchived_receipts", lambda: (20,), None),
+        (
+            "set_receipt_phash",
+            lambda: (rng.choice(data.pending_registration_ids), rng.getrandbits(64)),
+            None,
+        ),
+        ("get_confirmed_attendees", lambda: (active,), 50),
+        ("get_confirmed_tickets", lambda: (active,), 50),
+        ("record_check_ins", check_in_batch, None),
+        ("get_participants_for_event", lambda: (active,), 50),
+        ("get_active_event", lambda: (), None),
+        (
+            "create_event",
+            lambda: (
+                "Bench",
+                "Created by the benchmark.",
+                int(time.time()) + 86400,
+                "UTC",
+                0,
+                0,
+                None,
+                [24, 1],
+            ),
+            50,
+        ),
+        ("get_all_events", lambda: (), None),
+        ("get_due_reminders", lambda: (int(time.time()),), None),
+        (
+            "claim_reminder",
+            lambda: (rng.choice(data.event_ids), rng.choice([24, 1])),
+            None,
+        ),
+        ("get_event_by_id", lambda: (rng.choice(data.event_ids),), None),
+        ("set_active_event", lambda: (active,), None),
+        ("delete_event_by_id", create_throwaway_event, 50),
+        (
+            "get_discount_codes_for_event",
+            lambda: (rng.choice(data.event_ids),),
+            None,
+        ),
+        ("delete_discount_code", lambda: (next(throwaway_codes),), 2000),
+        (
+            "create_discount_code",
+            lambda: (active, f"NEW{next(counter)}", "percentage", 10, 5),
+            None,
+        ),
+        (
+            "generate_discount_codes",
+            lambda: (active, 1000, f"B{next(counter)}", "percentage", 10, 1),
+            20,
+        ),
+        ("create_discount_codes", import_batch, 20),
+        ("count_discount_codes", lambda: (rng.choice(data.event_ids),), None),
+        ("get_discount_code", discount_code, None),
+        ("use_discount_code", lambda: (rng.choice(data.discount_codes)[1],), None),
+        ("get_event_stats", lambda: (rng.choice(data.event_ids),), None),
+        ("rebuild_event_stats", lambda: (), 5),
+    ]
+
+
+def run_case(function, make_args, iterations: int) -> dict:
+    latencies = []
+    for _ in range(iterations):
+        args = make_args()
+        started = time.perf_counter()
+        function(*args)
+        latencies.append(time.perf_counter() - started)
+    total = sum(latencies)
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    else:
+        cuts = latencies * 99
+    return {
+        "iterations": iterations,
+        "ops_per_sec": iterations / total if total else None,
+        "p50_ms": cuts[49] * 1000,
+        "p95_ms": cuts[94] * 1000,
+        "p99_ms": cuts[98] * 1000,
+    }
+
+
+def public_functions():
+    return {
+        name
+        for name, member in inspect.getmembers(db, inspect.isfunction)
+        if member.__module__ == db.__name__ and not name.startswith("_")
+    }
+
+
+def benchmark_size(size: int, iterations: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    path = use_temp_database()
+    started = time.perf_counter()
+    data = seed_database(size, rng)
+    seed_seconds = time.perf_counter() - started
+    print(
+        f"\n{size:,} users / registrations "
+        f"(seeded in {seed_seconds:.1f}s, {os.path.getsize(path) / 2**20:.1f} MiB)"
+    )
+    print(
+        f"  {'function':<36}{'ops/sec':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    )
+
+    results = {}
+    for name, make_args, max_iterations in build_cases(data, rng):
+        function = getattr(db, name.split("[")[0])
+        count = (
+            iterations if max_iterations is None else min(iterations, max_iterations)
+        )
+        if count < 1:
+            continue
+        result = run_case(function, make_args, count)
+        results[name] = result
+        print(
+            f"  {name:<36}{result['ops_per_sec']:>10,.1f}"
+            f"{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+        )
+
+    missing = public_functions() - {name.split("[")[0] for name in results}
+    if missing:
+        print(f"  Not benchmarked: {', '.join(sorted(missing))}")
+    return {
+        "seed_seconds": seed_seconds,
+        "database_bytes": os.path.getsize(path),
+        "functions": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda s: [int(x) for x in s.split(",")],
+        default=[10_000, 100_000, 1_000_000],
+        help="Comma-separated dataset sizes",
+    )
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", default="bench_database.json")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "iterations": args.iterations,
+        "seed": args.seed,
+        "sizes": {},
+    }
+    for size in args.sizes:
+        report["sizes"][str(size)] = benchmark_size(size, args.iterations, args.seed)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measures bulk discount code creation: generating random codes and importing a
+partner file, each as one executemany transaction, against the one-statement-
+per-code path the admin conversation used to be limited to. Also times the
+CSV sent back to the admin and a code lookup once the event holds every code.
+
+Usage: python -m benchmarks.bench_discount_codes [--codes 100000] [--baseline 2000]
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.common import count_row_writes, use_temp_database
+import database as db
+from bot.admin import _discount_codes_csv
+from codegen import random_code
+
+COLLISION_SHARE = 0.1  # Share of an imported file the event already has
+
+
+def create_event() -> int:
+    db.create_event("Campaign", "Bulk codes.", None, "UTC", 100000, 1, None, [])
+    return max(row["event_id"] for row in db.get_all_events())
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--codes", type=int, default=100_000)
+    parser.add_argument(
+        "--baseline", type=int, default=2000, help="Codes created one at a time"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    use_temp_database()
+
+    event_id = create_event()
+    started = time.perf_counter()
+    for number in range(args.baseline):
+        db.create_discount_code(event_id, f"ONE{number}", "percentage", 10, 1)
+    per_code = (time.perf_counter() - started) / args.baseline
+    print(
+        f"One at a time:   {args.baseline:>8,} codes at {1 / per_code:>10,.0f} codes/s "
+        f"(~{per_code * args.codes:.1f}s for {args.codes:,})"
+    )
+
+    event_id = create_event()
+    with count_row_writes() as writes:
+        codes, elapsed = timed(
+            db.generate_discount_codes, event_id, args.codes, "P", "percentage", 10, 1
+        )
+    assert len(set(codes)) == args.codes
+    print(
+        f"Generate:        {len(codes):>8,} codes in {elapsed:.2f}s "
+        f"({len(codes) / elapsed:,.0f} codes/s, {writes['rows']:,} rows written)"
+    )
+
+    # A partner file for the same event with some codes it already has.
+    taken = rng.sample(codes, int(args.codes * COLLISION_SHARE))
+    fresh = [f"IMP{random_code(10)}" for _ in range(args.codes - len(taken))]
+    imported = fresh + taken
+    rng.shuffle(imported)
+    created, elapsed = timed(
+        db.create_discount_codes, event_id, imported, "fixed", 50000, 1
+    )
+    assert len(created) == len(set(fresh))
+    print(
+        f"Import:          {len(imported):>8,} codes in {elapsed:.2f}s "
+        f"({len(created):,} created, {len(imported) - len(created):,} skipped)"
+    )
+
+    rows = [(code, "percentage", 10, 1) for code in codes]
+    document, elapsed = timed(_discount_codes_csv, rows)
+    print(
+        f"CSV export:      {len(rows):>8,} codes in {elapsed:.2f}s "
+        f"({len(document) / 2**20:.1f} MiB)"
+    )
+
+    lookups = 1000
+    started = time.perf_counter()
+    for code in rng.choices(codes, k=lookups):
+        assert db.get_discount_code(event_id, code)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Lookup:          {elapsed / lookups * 1000:.3f} ms per code among "
+        f"{db.count_discount_codes(event_id):,}"
+    )
+
+
+if __name__ == "__main__":
+    main()
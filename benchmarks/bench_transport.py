@@ -0,0 +1,162 @@
+"""
+Benchmarks HTTP transport settings against the fake Bot API: a burst of
+outgoing messages (like a reminder fan-out) is sent while updates keep
+arriving through getUpdates long polling.
+
+Each configuration is run with getUpdates on its own request object (as the
+bot does) and, for comparison, sharing the send request's connection pool.
+Reports send throughput, pool timeouts, connections opened and how long
+incoming updates took to be fetched during the burst.
+
+HTTP/2 is not covered: the fake server only speaks HTTP/1.1, so compare
+SEND_HTTP_VERSION against the real Bot API.
+
+Usage: python -m benchmarks.bench_transport [--messages 1000] [--concurrency 32]
+           [--pool-sizes 8,32] [--keepalive 4,32] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import benchmarks.common  # Sets the environment config.py requires
+from benchmarks.fake_bot_api import FakeBotApi
+from telegram import Bot
+from telegram.error import TimedOut
+from bot.transport import build_get_updates_request, build_send_request
+from config import ALLOWED_UPDATES, TELEGRAM_BOT_TOKEN
+
+UPDATE_INTERVAL = 0.05  # Seconds between incoming updates during the burst
+
+
+def incoming_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Bench"},
+            "text": "hello",
+        },
+    }
+
+
+async def poll(bot: Bot, pushed: dict, intake: list, stop: asyncio.Event):
+    """Long polls like the Updater, recording how long each update waited."""
+    offset = 0
+    while not stop.is_set():
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=1, allowed_updates=ALLOWED_UPDATES
+            )
+        except TimedOut:
+            continue  # No connection free in a shared pool
+        now = time.monotonic()
+        for update in updates:
+            if update.update_id in pushed:  # Not a redelivery after a timeout
+                intake.append(now - pushed.pop(update.update_id))
+            offset = update.update_id + 1
+
+
+async def run_case(args, pool_size: int, keepalive: int, shared: bool):
+    api = FakeBotApi()
+    api.latency = args.latency
+    await api.start()
+    send_request = build_send_request(
+        pool_size=pool_size, keepalive_connections=keepalive
+    )
+    get_updates_request = send_request if shared else build_get_updates_request()
+    bot = Bot(
+        TELEGRAM_BOT_TOKEN,
+        base_url=api.base_url,
+        request=send_request,
+        get_updates_request=get_updates_request,
+    )
+    await bot.initialize()
+
+    pushed, intake = {}, []
+    stop = asyncio.Event()
+    poller = asyncio.create_task(poll(bot, pushed, intake, stop))
+    await asyncio.sleep(0.2)  # Let the first long poll settle
+
+    async def feed():
+        while not stop.is_set():
+            update_id = api.next_update_id()
+            pushed[update_id] = time.monotonic()
+            api.push_update(incoming_update(update_id))
+            await asyncio.sleep(UPDATE_INTERVAL)
+
+    in_flight = asyncio.Semaphore(args.concurrency)
+
+    async def send(chat_id: int) -> bool:
+        async with in_flight:
+            try:
+                await bot.send_message(chat_id, "Reminder")
+                return True
+            except TimedOut:
+                return False
+
+    feeder = asyncio.create_task(feed())
+    started = time.monotonic()
+    results = await asyncio.gather(*(send(i) for i in range(args.messages)))
+    elapsed = time.monotonic() - started
+    stop.set()
+    await feeder
+    await poller
+    await bot.shutdown()
+    await api.stop()
+
+    sent = sum(results)
+    layout = "shared" if shared else "separate"
+    cuts = (
+        statistics.quantiles(intake, n=100, method="inclusive")
+        if len(intake) > 1
+        else None
+    )
+    intake_text = (
+        f"p50 {cuts[49] * 1000:7.1f}  p95 {cuts[94] * 1000:7.1f}  max {max(intake) * 1000:7.1f}"
+        if cuts
+        else "n/a"
+    )
+    print(
+        f"  pool {pool_size:>4}  keepalive {keepalive:>3}  {layout:<8}  "
+        f"{sent / elapsed:8.1f} msg/s  timeouts {len(results) - sent:>5}  "
+        f"connections {api.connections:>5}  "
+        f"update intake (ms): {intake_text}"
+    )
+
+
+async def main(args):
+    print(
+        f"Sending {args.messages:,} messages, {args.concurrency} at a time, {args.latency * 1000:.0f} ms "
+        f"per call, one incoming update every {UPDATE_INTERVAL * 1000:.0f} ms"
+    )
+    for pool_size in args.pool_sizes:
+        for keepalive in args.keepalive:
+            for shared in (False, True):
+                await run_case(args, pool_size, keepalive, shared)
+
+
+def int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument(
+        "--concurrency", type=int, default=32, help="Sends in flight at once"
+    )
+    parser.add_argument("--pool-sizes", type=int_list, default=[8, 32])
+    parser.add_argument(
+        "--keepalive",
+        type=int_list,
+        default=[4, 32],
+        help="Idle connections kept open for reuse",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Seconds per Bot API call"
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,79 @@
+"""
+Compares the rows written and time spent per /start for the legacy
+SELECT-then-INSERT/UPDATE user write against the single-statement upsert.
+
+Usage: python -m benchmarks.bench_user_upsert [--users 5000]
+"""
+
+import argparse
+import time
+import uuid
+
+from benchmarks.common import count_row_writes, use_temp_database
+import database as db
+
+
+def legacy_add_or_update_user(user_id, username, first_name, invited_by=None):
+    """The pre-upsert implementation, kept here as the comparison baseline."""
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+    user = cursor.fetchone()
+    if user is None:
+        referral_code = str(uuid.uuid4())[:8]
+        cursor.execute(
+            "INSERT INTO users (user_id, username, first_name, referral_code, invited_by_user_id) VALUES (?, ?, ?, ?, ?)",
+            (user_id, username, first_name, referral_code, invited_by),
+        )
+        if invited_by:
+            cursor.execute(
+                "UPDATE users SET referral_count = referral_count + 1 WHERE user_id = ?",
+                (invited_by,),
+            )
+    else:
+        cursor.execute(
+            "UPDATE users SET username = ?, first_name = ? WHERE user_id = ?",
+            (username, first_name, user_id),
+        )
+    conn.commit()
+    conn.close()
+
+
+def run_scenario(write_user, users: int) -> dict:
+    """Creates `users` users (half of them invited), then replays a /start for each."""
+    use_temp_database()
+    write_user(1, "inviter", "Inviter")
+    for user_id in range(2, users + 2):
+        write_user(user_id, f"user{user_id}", "Name", 1 if user_id % 2 else None)
+
+    with count_row_writes() as writes:
+        started = time.perf_counter()
+        for user_id in range(2, users + 2):
+            write_user(user_id, f"user{user_id}", "Name")
+        elapsed = time.perf_counter() - started
+
+    return {
+        "rows_written_per_start": writes["rows"] / users,
+        "starts_per_second": users / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"Returning-user /start, {args.users} users, unchanged profiles")
+    for name, write_user in (
+        ("legacy select+update", legacy_add_or_update_user),
+        ("upsert", db.add_or_update_user),
+    ):
+        result = run_scenario(write_user, args.users)
+        print(
+            f"  {name:<22} rows written/start: {result['rows_written_per_start']:.2f}"
+            f"   starts/sec: {result['starts_per_second']:,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks are run from the project root as modules, for example:
+    python -m benchmarks.bench_user_upsert
+"""
+
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+# config.py refuses to load without these; benchmarks never talk to Telegram.
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:benchmark")
+os.environ.setdefault("BOT_USERNAME", "benchmark_bot")
+os.environ.setdefault("ADMIN_CHAT_ID", "1")
+os.environ.setdefault("ADMIN_USER_IDS", "1")
+
+import database as db
+
+
+def use_temp_database() -> str:
+    """Points the database module at a fresh database file in a temporary directory."""
+    directory = tempfile.mkdtemp(prefix="isocrates-bench-")
+    db.DATABASE_NAME = os.path.join(directory, "bench.db")
+    db.initialize_database()
+    return db.DATABASE_NAME
+
+
+class _CountingConnection(sqlite3.Connection):
+    counter = None
+
+    def close(self):
+        self.counter["rows"] += self.total_changes
+        super().close()
+
+
+@contextmanager
+def count_row_writes():
+    """
+    Counts the rows written through database.get_db_connection while active.
+    Yields a dict whose "rows" entry is updated as connections are closed.
+    """
+    counter = {"rows": 0}
+    original = db.get_db_connection
+
+    def counting_connection(timeout: float = 5.0):
+        conn = sqlite3.connect(
+            db.DATABASE_NAME, timeout=timeout, factory=_CountingConnection
+        )
+        conn.counter = counter
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    db.get_db_connection = counting_connection
+    try:
+        yield counter
+    finally:
+        db.get_db_connection = original
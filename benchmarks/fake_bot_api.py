@@ -0,0 +1,250 @@
+"""
+A minimal local stand-in for the Telegram Bot API, for load tests and replays.
+
+It speaks just enough HTTP/1.1 for python-telegram-bot's httpx client, serves
+getUpdates from an in-memory queue (with long polling), and answers send/edit
+calls with plausible Message objects. Every outgoing call is reported to an
+optional observer so harnesses can measure how long the bot took to respond.
+"""
+
+import asyncio
+import itertools
+import json
+import time
+from email.parser import BytesParser
+from urllib.parse import parse_qsl
+
+FAKE_BOT_USER = {
+    "id": 999999,
+    "is_bot": True,
+    "first_name": "Fake Bot",
+    "username": "fake_bot",
+    "can_join_groups": False,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+# A 1x1 transparent PNG, served for every file download.
+FAKE_FILE_BYTES = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000d49444154789c6360606060000000050001a5f645400000000049454e44ae426082"
+)
+
+
+def _decode_form_value(value: str):
+    """PTB JSON-encodes non-string parameters; plain strings are sent as-is."""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_parameters(content_type: str, body: bytes) -> dict:
+    """Decodes a Bot API request body (JSON, urlencoded or multipart) into a dict."""
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        params = {}
+        for part in message.get_payload():
+            name = part.get_param("name", header="content-disposition")
+            if part.get_filename():
+                params[name] = f"<upload {part.get_filename()}>"
+            else:
+                params[name] = _decode_form_value(
+                    part.get_payload(decode=True).decode()
+                )
+        return params
+    return {
+        key: _decode_form_value(value)
+        for key, value in parse_qsl(body.decode(), keep_blank_values=True)
+    }
+
+
+class FakeBotApi:
+    """
+    In-process fake Bot API server. Call `await start()`, point the bot at
+    `base_url`, and feed it updates with `push_update()`.
+
+    `observer(method, params, monotonic_time)` is called for every request other
+    than getUpdates, and each of those is answered after `latency` seconds, like
+    a round trip to Telegram. While `offline` is True, every request has its
+    connection dropped without a response, simulating a network or proxy outage.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, observer=None):
+        self.host = host
+        self.port = port
+        self.observer = observer
+        self.call_counts = {}
+        self.connections = 0  # TCP connections accepted so far
+        self.offline = False
+        self.latency = 0.0
+        self._server = None
+        self._updates = []  # Pending update dicts, oldest first
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    @property
+    def base_file_url(self) -> str:
+        return f"http://{self.host}:{self.port}/file/bot"
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def next_update_id(self) -> int:
+        return next(self._update_ids)
+
+    def push_update(self, update: dict):
+        """Queues an update for getUpdates. An update_id is assigned if missing."""
+        update.setdefault("update_id", self.next_update_id())
+        self._updates.append(update)
+        self._new_updates.set()
+
+    @property
+    def pending_updates(self) -> int:
+        return len(self._updates)
+
+    # --- HTTP plumbing ---
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                if self.offline:
+                    break
+
+                if path.startswith("/file/"):
+                    status, content_type, payload = 200, "image/png", FAKE_FILE_BYTES
+                else:
+                    method = path.rstrip("/").rsplit("/", 1)[-1]
+                    params = parse_parameters(headers.get("content-type", ""), body)
+                    result = await self._dispatch(method, params)
+                    status, content_type = 200, "application/json"
+                    payload = json.dumps({"ok": True, "result": result}).encode()
+
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    "Connection: keep-alive\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass  # Server shut down mid long-poll
+        finally:
+            writer.close()
+
+    # --- Bot API methods ---
+    async def _dispatch(self, method: str, params: dict):
+        self.call_counts[method] = self.call_counts.get(method, 0) + 1
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if self.observer:
+            self.observer(method, params, time.monotonic())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == "getMe":
+            return FAKE_BOT_USER
+        if method == "getFile":
+            return self._file(params.get("file_id"))
+        if method == "sendMediaGroup":
+            return [
+                self._message(params["chat_id"], photo=True)
+                for _ in params.get("media", [])
+            ]
+        if method in ("sendMessage", "editMessageText"):
+            return self._message(params.get("chat_id", 0), text=params.get("text"))
+        if method in ("sendPhoto", "editMessageCaption"):
+            return self._message(
+                params.get("chat_id", 0), photo=True, caption=params.get("caption")
+            )
+        if method == "sendDocument":
+            return self._message(params["chat_id"], document=True)
+        if method.startswith(("send", "edit")):
+            return self._message(params.get("chat_id", 0))
+        return True  # answerCallbackQuery, deleteMessage, deleteWebhook, ...
+
+    async def _get_updates(self, params: dict):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # Updates below the offset have been confirmed by the bot.
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    def _message(self, chat_id, text=None, photo=False, caption=None, document=False):
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": FAKE_BOT_USER,
+        }
+        if text is not None:
+            message["text"] = text
+        if photo:
+            file_number = next(self._file_ids)
+            message["photo"] = [
+                {
+                    "file_id": f"fake-photo-{file_number}",
+                    "file_unique_id": f"fake-unique-{file_number}",
+                    "width": 330,
+                    "height": 330,
+                }
+            ]
+        if caption is not None:
+            message["caption"] = caption
+        if document:
+            file_number = next(self._file_ids)
+            message["document"] = {
+                "file_id": f"fake-document-{file_number}",
+                "file_unique_id": f"fake-unique-{file_number}",
+            }
+        return message
+
+    def _file(self, file_id):
+        return {
+            "file_id": file_id,
+            "file_unique_id": f"unique-{file_id}",
+            "file_size": len(FAKE_FILE_BYTES),
+            "file_path": f"photos/{file_id}.png",
+        }
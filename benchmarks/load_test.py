@@ -0,0 +1,279 @@
+"""
+End-to-end load test: runs the real Application against the fake Bot API and
+drives it with a swarm of synthetic users going through the whole flow
+(/start with referral codes, registration choice, discount codes, receipt
+photos) followed by admin approvals. Reports throughput and p50/p95/p99
+latency per handler for each concurrency level.
+
+Usage: python -m benchmarks.load_test [--users 200] [--concurrency 1,10,50]
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from benchmarks.common import use_temp_database
+from benchmarks.fake_bot_api import FakeBotApi
+import database as db
+from config import ADMIN_USER_IDS
+
+STEP_TIMEOUT = 30  # Seconds to wait for the bot to answer one update
+RESPONSE_METHODS = {
+    "sendMessage",
+    "sendPhoto",
+    "sendMediaGroup",
+    "sendDocument",
+    "editMessageText",
+    "editMessageCaption",
+}
+LOAD_TEST_DISCOUNT_CODE = "LOADTEST"
+
+
+class ResponseTracker:
+    """Resolves a waiting future the next time the bot sends something to a chat."""
+
+    def __init__(self):
+        self._waiters = defaultdict(list)  # chat_id -> [Future]
+
+    def expect(self, chat_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id].append(future)
+        return future
+
+    def observe(self, method: str, params: dict, now: float):
+        if method not in RESPONSE_METHODS or "chat_id" not in params:
+            return
+        waiters = self._waiters.get(int(params["chat_id"]))
+        while waiters:
+            future = waiters.pop(0)
+            if not future.done():
+                future.set_result(now)
+                return
+
+
+class UpdateFactory:
+    """Builds Bot API update payloads for synthetic users."""
+
+    def __init__(self, api: FakeBotApi):
+        self.api = api
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def user(user_id: int) -> dict:
+        return {
+            "id": user_id,
+            "is_bot": False,
+            "first_name": f"User{user_id}",
+            "username": f"user{user_id}",
+        }
+
+    def _base_message(self, user_id: int) -> dict:
+        return {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self.user(user_id),
+        }
+
+    def text(self, user_id: int, text: str) -> dict:
+        message = self._base_message(user_id)
+        message["text"] = text
+        if text.startswith("/"):
+            command_length = len(text.split()[0])
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": command_length}
+            ]
+        return {"update_id": self.api.next_update_id(), "message": message}
+
+    def photo(self, user_id: int) -> dict:
+        message = self._base_message(user_id)
+        message["photo"] = [
+            {
+                "file_id": f"receipt-{user_id}",
+                "file_unique_id": f"receipt-unique-{user_id}",
+                "width": 800,
+                "height": 1200,
+                "file_size": 120_000,
+            }
+        ]
+        return {"update_id": self.api.next_update_id(), "message": message}
+
+    def callback(self, user_id: int, chat_id: int, data: str) -> dict:
+        message = self._base_message(chat_id)
+        message["caption"] = "Pending registration"
+        return {
+            "update_id": self.api.next_update_id(),
+            "callback_query": {
+                "id": str(next(self._ids)),
+                "from": self.user(user_id),
+                "chat_instance": str(chat_id),
+                "data": data,
+                "message": message,
+            },
+        }
+
+
+class LoadTest:
+    def __init__(self, api: FakeBotApi, tracker: ResponseTracker, referral_codes):
+        self.api = api
+        self.tracker = tracker
+        self.updates = UpdateFactory(api)
+        self.referral_codes = referral_codes
+        self.latencies = defaultdict(list)  # handler name -> [seconds]
+        self.timeouts = defaultdict(int)
+
+    async def step(self, handler: str, chat_id: int, update: dict):
+        """Sends one update and waits for the bot's first response to `chat_id`."""
+        response = self.tracker.expect(chat_id)
+        sent_at = time.monotonic()
+        self.api.push_update(update)
+        try:
+            answered_at = await asyncio.wait_for(response, STEP_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.timeouts[handler] += 1
+            return
+        self.latencies[handler].append(answered_at - sent_at)
+
+    async def user_flow(self, user_id: int):
+        start = "/start"
+        if self.referral_codes and random.random() < 0.5:
+            start += f" {random.choice(self.referral_codes)}"
+        await self.step("start", user_id, self.updates.text(user_id, start))
+        await self.step(
+            "handle_choice", user_id, self.updates.text(user_id, "Yes, Register Me!")
+        )
+        if random.random() < 0.3:
+            await self.step(
+                "handle_discount_prompt", user_id, self.updates.text(user_id, "Yes")
+            )
+            await self.step(
+                "handle_discount_code",
+                user_id,
+                self.updates.text(user_id, LOAD_TEST_DISCOUNT_CODE),
+            )
+        else:
+            await self.step(
+                "handle_discount_prompt", user_id, self.updates.text(user_id, "No")
+            )
+        await self.step("handle_receipt", user_id, self.updates.photo(user_id))
+
+    async def approve(self, registration):
+        admin_id = ADMIN_USER_IDS[0]
+        data = f"approve_{registration['registration_id']}_{registration['user_id']}"
+        await self.step(
+            "handle_registration_approval",
+            registration["user_id"],
+            self.updates.callback(admin_id, admin_id, data),
+        )
+
+
+async def run_bounded(concurrency: int, coroutines):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(coroutine):
+        async with semaphore:
+            await coroutine
+
+    await asyncio.gather(*(bounded(c) for c in coroutines))
+
+
+def percentile(values, pct: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def report(concurrency: int, users: int, elapsed: float, test: LoadTest):
+    steps = sum(len(v) for v in test.latencies.values())
+    print(
+        f"\nConcurrency {concurrency}: {users} users in {elapsed:.2f}s "
+        f"-> {users / elapsed:.1f} registrations/s, {steps / elapsed:.1f} updates/s"
+    )
+    print(
+        f"  {'handler':<30}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'timeouts':>10}"
+    )
+    for handler, values in test.latencies.items():
+        print(
+            f"  {handler:<30}{len(values):>7}"
+            f"{percentile(values, 50) * 1000:>10.1f}"
+            f"{percentile(values, 95) * 1000:>10.1f}"
+            f"{percentile(values, 99) * 1000:>10.1f}"
+            f"{test.timeouts[handler]:>10}"
+        )
+
+
+def seed_database(inviters: int):
+    """Creates an active paid event, an unlimited discount code and some inviters."""
+    db.create_event(
+        name="Load Test Event",
+        description="Synthetic event for load testing.",
+        starts_at=int(time.time()) + 30 * 24 * 3600,
+        timezone="UTC",
+        fee=150000,
+        is_paid=True,
+        payment_details="Pay to account 1234.",
+        reminder_hours=[24],
+    )
+    event_id = db.get_active_event()["event_id"]
+    db.create_discount_code(event_id, LOAD_TEST_DISCOUNT_CODE, "percentage", 10, 10**9)
+    codes = []
+    for inviter_id in range(1, inviters + 1):
+        db.add_or_update_user(inviter_id, f"inviter{inviter_id}", "Inviter")
+        codes.append(db.get_user_referral_info(inviter_id)["referral_code"])
+    return codes
+
+
+async def main(args):
+    from bot.core import build_application
+
+    database_path = use_temp_database()
+    # Keep the heartbeat file and any other relative paths out of the project.
+    os.chdir(os.path.dirname(database_path))
+    os.makedirs("logs", exist_ok=True)
+    referral_codes = seed_database(args.inviters)
+
+    tracker = ResponseTracker()
+    api = FakeBotApi(observer=tracker.observe)
+    await api.start()
+    application = build_application(
+        base_url=api.base_url, base_file_url=api.base_file_url
+    )
+    await application.initialize()
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=1)
+
+    next_user_id = 1_000_000
+    try:
+        for concurrency in args.concurrency:
+            test = LoadTest(api, tracker, referral_codes)
+            user_ids = range(next_user_id, next_user_id + args.users)
+            next_user_id += args.users
+
+            started = time.monotonic()
+            await run_bounded(concurrency, [test.user_flow(u) for u in user_ids])
+            pending = db.get_pending_registrations(args.users)
+            await run_bounded(concurrency, [test.approve(r) for r in pending])
+            report(concurrency, args.users, time.monotonic() - started, test)
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await api.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200, help="Users per level")
+    parser.add_argument(
+        "--concurrency",
+        type=lambda s: [int(x) for x in s.split(",")],
+        default=[1, 10, 50],
+        help="Comma-separated concurrency levels",
+    )
+    parser.add_argument("--inviters", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
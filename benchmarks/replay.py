@@ -0,0 +1,176 @@
+"""
+Replays captured updates (logs/updates.jsonl, written with CAPTURE_UPDATES=1)
+into the real Application running against the fake Bot API, either at the
+original pace scaled by --speed or, with --speed 0, as fast as possible.
+
+Updates are fed in capture order. For repeatable runs, pass --database with a
+snapshot of the production database taken when the capture started; it is
+copied, never modified. Reports replay throughput, outgoing Bot API calls and
+the approximate response latency (from an update to the bot's first reply in
+that chat).
+
+Usage: python -m benchmarks.replay logs/updates.jsonl [more files...]
+           [--speed 1] [--database isocrates.db] [--settle 1.0]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import time
+from collections import defaultdict, deque
+
+from benchmarks.common import use_temp_database
+from benchmarks.fake_bot_api import FakeBotApi
+import database as db
+
+RESPONSE_METHODS = {
+    "sendMessage",
+    "sendPhoto",
+    "sendMediaGroup",
+    "sendDocument",
+    "editMessageText",
+    "editMessageCaption",
+}
+
+
+def load_capture(paths):
+    """Reads capture files (rotated ones included) and returns (t, update) sorted by time."""
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records.append((record["t"], record["u"]))
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+def update_chat_id(update: dict):
+    """Returns the chat an update came from, or None for updates without one."""
+    for key in ("message", "edited_message", "channel_post"):
+        if key in update:
+            return update[key]["chat"]["id"]
+    if "callback_query" in update:
+        message = update["callback_query"].get("message")
+        if message:
+            return message["chat"]["id"]
+        return update["callback_query"]["from"]["id"]
+    return None
+
+
+class LatencyTracker:
+    """Pairs each update with the next bot reply to the same chat."""
+
+    def __init__(self):
+        self._pushed = defaultdict(deque)  # chat_id -> push times
+        self.latencies = []
+        self.last_call = time.monotonic()
+
+    def pushed(self, chat_id):
+        if chat_id is not None:
+            self._pushed[chat_id].append(time.monotonic())
+
+    def observe(self, method: str, params: dict, now: float):
+        self.last_call = now
+        if method not in RESPONSE_METHODS or "chat_id" not in params:
+            return
+        pushed = self._pushed.get(int(params["chat_id"]))
+        if pushed:
+            self.latencies.append(now - pushed.popleft())
+
+
+async def wait_until_idle(api: FakeBotApi, application, tracker, settle: float):
+    """Waits until every update was fetched and handled and the bot went quiet."""
+    while True:
+        await asyncio.sleep(0.05)
+        busy = api.pending_updates or not application.update_queue.empty()
+        if not busy and time.monotonic() - tracker.last_call >= settle:
+            return
+
+
+async def replay(args):
+    from bot.core import build_application
+
+    records = load_capture(args.captures)
+    if not records:
+        raise SystemExit("The capture is empty.")
+
+    database_path = use_temp_database()
+    if args.database:
+        shutil.copyfile(args.database, database_path)
+        db.initialize_database()
+    # Keep the heartbeat file and any other relative paths out of the project.
+    os.chdir(os.path.dirname(database_path))
+    os.makedirs("logs", exist_ok=True)
+
+    tracker = LatencyTracker()
+    api = FakeBotApi(observer=tracker.observe)
+    await api.start()
+    application = build_application(
+        base_url=api.base_url, base_file_url=api.base_file_url
+    )
+    await application.initialize()
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=1)
+
+    try:
+        first_capture_time = records[0][0]
+        started = time.monotonic()
+        for captured_at, update in records:
+            if args.speed > 0:
+                due = started + (captured_at - first_capture_time) / args.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            # Fresh ids keep getUpdates offsets consistent across captures.
+            update = dict(update, update_id=api.next_update_id())
+            tracker.pushed(update_chat_id(update))
+            api.push_update(update)
+        await wait_until_idle(api, application, tracker, args.settle)
+        elapsed = tracker.last_call - started
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await api.stop()
+
+    span = records[-1][0] - first_capture_time
+    print(
+        f"Replayed {len(records):,} updates spanning {span:.1f}s of capture "
+        f"in {elapsed:.2f}s ({len(records) / max(elapsed, 1e-9):.1f} updates/s)"
+    )
+    calls = {m: n for m, n in api.call_counts.items() if m != "getUpdates"}
+    print("  Bot API calls:", ", ".join(f"{m} {n}" for m, n in sorted(calls.items())))
+    latencies = tracker.latencies
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        print(
+            f"  response latency (ms): p50 {cuts[49] * 1000:.1f}  "
+            f"p95 {cuts[94] * 1000:.1f}  p99 {cuts[98] * 1000:.1f}  "
+            f"max {max(latencies) * 1000:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("captures", nargs="+", help="Capture files to replay")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Pace relative to the capture (2 = twice as fast); 0 = as fast as possible",
+    )
+    parser.add_argument(
+        "--database", help="Database snapshot to start from (copied, not modified)"
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=1.0,
+        help="Seconds without Bot API calls after which the replay counts as done",
+    )
+    asyncio.run(replay(parser.parse_args()))
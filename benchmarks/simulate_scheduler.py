@@ -0,0 +1,208 @@
+"""
+Runs days of reminder-scheduler activity in seconds on a simulated clock.
+
+Many active events, each with thousands of confirmed attendees, are seeded into
+a temporary database. The real check_and_send_reminders job is then ticked on a
+fake clock (with optional jitter and outages) against a fake bot that records
+every message. The run checks that each reminder reaches each attendee exactly
+once and reports scheduler CPU time per tick and dispatch lag.
+
+Usage: python -m benchmarks.simulate_scheduler [--events 20] [--attendees 2000]
+           [--days 7] [--tick 60] [--jitter 5] [--outage-chance 0.001]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temp_database
+import database as db
+from bot import scheduler
+
+REMINDER_CHOICES = ["24,1", "48,24,2", "1", "72,24,3,1"]
+SIMULATION_START = datetime(2025, 3, 1, 9, 0)
+
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now.timestamp()
+
+
+class FakeBot:
+    """Records every message along with the simulated time it was sent."""
+
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.deliveries = Counter()  # (chat_id, text) -> count
+        self.first_sent = {}  # text -> simulated time of its first delivery
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.deliveries[(chat_id, text)] += 1
+        self.first_sent.setdefault(text, self.clock.now)
+
+
+class FakeApplication:
+    def __init__(self):
+        self.tasks = []
+
+    def create_task(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.append(task)
+        return task
+
+    async def wait_for_tasks(self):
+        tasks, self.tasks = self.tasks, []
+        await asyncio.gather(*tasks)
+
+
+class FakeContext:
+    def __init__(self, bot, application):
+        self.bot = bot
+        self.application = application
+
+
+def seed_events(events: int, attendees: int, days: int, rng: random.Random):
+    """
+    Inserts `events` active events dated so that all of their reminders fall
+    inside the simulated period, each with `attendees` confirmed registrations.
+    Returns {(event_id, hours): (reminder_time, message)} for every reminder.
+    """
+    conn = db.get_db_connection()
+    conn.executemany(
+        "INSERT INTO users (user_id, username, first_name, referral_code) VALUES (?, ?, ?, ?)",
+        [(u, f"user{u}", "Sim", f"sim{u}") for u in range(1, attendees + 1)],
+    )
+    expected = {}
+    earliest = SIMULATION_START + timedelta(hours=73)
+    span = (SIMULATION_START + timedelta(days=days) - earliest).total_seconds()
+    for index in range(events):
+        date = earliest + timedelta(seconds=rng.randrange(int(span)))
+        date = date.replace(second=0, microsecond=0)
+        reminders = rng.choice(REMINDER_CHOICES)
+        starts_at = int(date.timestamp())
+        cursor = conn.execute(
+            "INSERT INTO events (name, starts_at, timezone, reminders, is_active) "
+            "VALUES (?, ?, 'UTC', ?, 1)",
+            (f"Sim Event {index + 1}", starts_at, reminders),
+        )
+        event_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO registrations (user_id, event_id, status) VALUES (?, ?, 'confirmed')",
+            [(user_id, event_id) for user_id in range(1, attendees + 1)],
+        )
+        conn.executemany(
+            "INSERT INTO event_reminders (event_id, hours_before, remind_at) VALUES (?, ?, ?)",
+            [
+                (event_id, hour, starts_at - hour * 3600)
+                for hour in map(int, reminders.split(","))
+            ],
+        )
+        for hour in map(int, reminders.split(",")):
+            message = f"📢 Reminder: The event 'Sim Event {index + 1}' is starting in approximately {hour} hour(s)!"
+            expected[(event_id, hour)] = (date - timedelta(hours=hour), message)
+    conn.commit()
+    conn.close()
+    return expected
+
+
+def summarize(values, scale: float = 1) -> str:
+    if not values:
+        return "n/a"
+    if len(values) > 1:
+        cuts = statistics.quantiles(values, n=100, method="inclusive")
+    else:
+        cuts = values * 99
+    return (
+        f"p50 {cuts[49] * scale:.3f}  p95 {cuts[94] * scale:.3f}  "
+        f"max {max(values) * scale:.3f}"
+    )
+
+
+async def simulate(args) -> bool:
+    rng = random.Random(args.seed)
+    use_temp_database()
+    expected = seed_events(args.events, args.attendees, args.days, rng)
+
+    clock = FakeClock(SIMULATION_START)
+    bot = FakeBot(clock)
+    application = FakeApplication()
+    context = FakeContext(bot, application)
+    scheduler.clock = clock
+
+    end = SIMULATION_START + timedelta(days=args.days)
+    tick_cpu = []
+    ticks = outages = 0
+    started = time.perf_counter()
+    clock.now += timedelta(seconds=10)
+    while clock.now < end:
+        cpu_before = time.process_time()
+        await scheduler.check_and_send_reminders(context)
+        tick_cpu.append(time.process_time() - cpu_before)
+        await application.wait_for_tasks()
+        ticks += 1
+
+        step = args.tick + rng.uniform(-args.jitter, args.jitter)
+        if rng.random() < args.outage_chance:
+            outages += 1
+            step += rng.uniform(60, 20 * 60)  # The bot was down or the loop stalled
+        clock.now += timedelta(seconds=step)
+    elapsed = time.perf_counter() - started
+
+    missing = duplicates = 0
+    lags = []
+    for (event_id, hour), (reminder_time, message) in expected.items():
+        counts = [bot.deliveries[(u, message)] for u in range(1, args.attendees + 1)]
+        missing += counts.count(0)
+        duplicates += sum(count - 1 for count in counts if count > 1)
+        if message in bot.first_sent:
+            lags.append((bot.first_sent[message] - reminder_time).total_seconds())
+    expected_messages = {message for _, message in expected.values()}
+    unexpected = sum(
+        count
+        for (_, text), count in bot.deliveries.items()
+        if text not in expected_messages
+    )
+
+    print(
+        f"Simulated {args.days} days in {elapsed:.2f}s: {ticks:,} ticks, "
+        f"{outages} outages, {len(expected)} reminders, "
+        f"{sum(bot.deliveries.values()):,} messages"
+    )
+    print(f"  scheduler CPU per tick (ms): {summarize(tick_cpu, 1000)}")
+    print(f"  dispatch lag (s):            {summarize(lags)}")
+    print(
+        f"  missing: {missing:,}  duplicates: {duplicates:,}  unexpected: {unexpected:,}"
+    )
+    ok = missing == duplicates == unexpected == 0
+    print("  exactly-once delivery:", "OK" if ok else "FAILED")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--attendees", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--tick", type=float, default=60, help="Seconds per tick")
+    parser.add_argument(
+        "--jitter", type=float, default=5, help="Max seconds of tick jitter"
+    )
+    parser.add_argument(
+        "--outage-chance",
+        type=float,
+        default=0.0,
+        help="Chance per tick of a 1-20 minute outage",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if args.days < 4:
+        parser.error("--days must be at least 4 so every reminder fits the period")
+    sys.exit(0 if asyncio.run(simulate(args)) else 1)
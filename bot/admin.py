@@ -1,17 +1,61 @@
+import asyncio
+import csv
+import io
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import time
+from collections import Counter
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.ext import (
     ContextTypes,
     ConversationHandler,
 )
 import database as db
-from .utils import admin_only, format_toman, get_user_info
+from codegen import is_valid_ticket_code, normalize_code
+from . import checkin
+from .checkin import check_in_desk
+from .flood import flood_control
+from .tickets import send_ticket
+from .receipt_archive import receipt_archive
+from .receipts import pending_review
+from .render_cache import screen_cache
+from .runtime_config import reload_runtime_settings
+from .leaderboard import format_leaderboard, referral_leaderboard
+from .outbound import ADMIN
+from .utils import (
+    admin_only,
+    format_event_time,
+    format_toman,
+    get_user_info,
+    parse_event_time,
+    parse_reminder_hours,
+    send_bulk_messages,
+)
+from .waitlist import promote_waitlist
 from config import *
 
 interactions_logger = logging.getLogger("interactions")
 app_logger = logging.getLogger("app")
 
 
+def _render_admin_panel():
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                "View Pending Registrations", callback_data="view_pending"
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                "Review Pending in Batches", callback_data="review_batch"
+            )
+        ],
+        [InlineKeyboardButton("Manage Events", callback_data="manage_events")],
+        [InlineKeyboardButton("📊 Dashboard", callback_data="dashboard")],
+        [InlineKeyboardButton("🏆 Top Referrers", callback_data="leaderboard")],
+    ]
+    return "Admin Control Panel:", InlineKeyboardMarkup(keyboard)
+
+
 @admin_only
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Resets any ongoing admin conversation and displays the main admin panel."""
@@ -23,16 +67,9 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     )
 
     message = update.message or update.callback_query.message
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                "View Pending Registrations", callback_data="view_pending"
-            )
-        ],
-        [InlineKeyboardButton("Manage Events", callback_data="manage_events")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    text = "Admin Control Panel:"
+    text, reply_markup = screen_cache.get_or_render(
+        "admin_panel", None, (), _render_admin_panel
+    )
     if update.callback_query:
         await update.callback_query.edit_message_text(text, reply_markup=reply_markup)
     else:
@@ -51,7 +88,8 @@ async def view_pending_registrations(
     )
     await query.answer()
 
-    pending_reg = db.get_next_pending_registration()
+    pending = pending_review(1)
+    pending_reg = pending[0] if pending else None
     if not pending_reg:
         await query.edit_message_text(text="No pending registrations found.")
         return ConversationHandler.END
@@ -65,6 +103,8 @@ async def view_pending_registrations(
         event_name,
         final_fee,
         discount_code,
+        duplicate_of,
+        local_path,
     ) = pending_reg
 
     caption = (
@@ -74,6 +114,8 @@ async def view_pending_registrations(
         f"Fee Paid: {format_toman(final_fee)}\n"
         f"Discount Used: {discount_code or 'None'}"
     )
+    if duplicate_of:
+        caption += f"\n⚠️ Duplicate of registration {duplicate_of}"
     keyboard = [
         [
             InlineKeyboardButton(
@@ -88,7 +130,7 @@ async def view_pending_registrations(
 
     await context.bot.send_photo(
         chat_id=query.message.chat_id,
-        photo=file_id,
+        photo=await asyncio.to_thread(receipt_archive.read, local_path) or file_id,
         caption=caption,
         reply_markup=reply_markup,
     )
@@ -109,10 +151,19 @@ async def handle_registration_approval(
     await query.answer()
 
     ticket_code = db.update_registration_status(int(reg_id), "confirmed")
+    if not ticket_code:
+        await query.edit_message_caption(
+            caption=f"Registration {reg_id} was already decided. Nothing was changed."
+        )
+        return
     await query.edit_message_caption(caption=f"✅ Registration {reg_id} approved.")
-    await context.bot.send_message(
-        chat_id=target_user_id,
-        text=f"Congratulations! Your registration has been approved.\n\nYour unique ticket code is: {ticket_code}",
+    await send_ticket(
+        context.bot,
+        target_user_id,
+        int(reg_id),
+        ticket_code,
+        f"Congratulations! Your registration has been approved.\n\nYour unique ticket code is: {ticket_code}",
+        rate_limit_args=ADMIN,
     )
 
 
@@ -128,29 +179,455 @@ async def handle_registration_rejection(
     )
     await query.answer()
 
-    db.update_registration_status(int(reg_id), "rejected")
+    if not db.update_registration_status(int(reg_id), "rejected"):
+        await query.edit_message_caption(
+            caption=f"Registration {reg_id} was already decided. Nothing was changed."
+        )
+        return
+    promote_waitlist(context.application)
     await query.edit_message_caption(caption=f"❌ Registration {reg_id} rejected.")
     await context.bot.send_message(
         chat_id=target_user_id,
         text="Unfortunately, your registration could not be approved.",
+        rate_limit_args=ADMIN,
     )
 
 
 @admin_only
-async def manage_events(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def review_pending_batch(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    """Sends the next batch of pending receipts as a media group with bulk actions."""
+    query = update.callback_query
     user = update.effective_user
-    interactions_logger.info(f"ADMIN {get_user_info(user)} entered event management.")
+    await query.answer()
+
+    batch = pending_review(PENDING_BATCH_SIZE)
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} opened a review batch of {len(batch)} registrations."
+    )
+    if not batch:
+        await query.edit_message_text(text="No pending registrations found.")
+        return ConversationHandler.END
+
+    photos = []
+    lines = []
+    for number, reg in enumerate(batch, start=1):
+        summary = (
+            f"#{number} '{reg['name']}' - {reg['first_name']} (@{reg['username']}), "
+            f"Fee: {format_toman(reg['final_fee'])}, "
+            f"Discount: {reg['discount_code_used'] or 'None'} [Reg ID:{reg['registration_id']}]"
+        )
+        if reg["duplicate_of"]:
+            summary += f" ⚠️ Duplicate of Reg ID:{reg['duplicate_of']}"
+        # The archived copy is used when there is one, so review works even if
+        # Telegram no longer has the file.
+        photo = (
+            await asyncio.to_thread(receipt_archive.read, reg["receipt_local_path"])
+            or reg["receipt_file_id"]
+        )
+        photos.append((photo, summary))
+        lines.append(summary)
+
+    chat_id = query.message.chat_id
+    if len(photos) == 1:
+        await context.bot.send_photo(
+            chat_id=chat_id, photo=photos[0][0], caption=photos[0][1]
+        )
+    else:
+        media = [
+            InputMediaPhoto(media=photo, caption=summary) for photo, summary in photos
+        ]
+        await context.bot.send_media_group(chat_id=chat_id, media=media)
+
+    context.user_data["review_batch"] = [
+        (reg["registration_id"], reg["user_id"]) for reg in batch
+    ]
+    keyboard = [
+        [
+            InlineKeyboardButton("✅ Approve All", callback_data="batch_approve"),
+            InlineKeyboardButton("❌ Reject All", callback_data="batch_reject"),
+        ]
+    ]
+    await context.bot.send_message(
+        chat_id=chat_id,
+        text=f"Review batch ({len(batch)} receipts):\n\n" + "\n".join(lines),
+        reply_markup=InlineKeyboardMarkup(keyboard),
+    )
+    await query.delete_message()
+    return ConversationHandler.END
+
+
+@admin_only
+async def handle_batch_decision(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Approves or rejects every registration in the admin's current review batch."""
+    query = update.callback_query
+    user = update.effective_user
+    approve = query.data == "batch_approve"
+
+    batch = context.user_data.pop("review_batch", None)
+    if not batch:
+        await query.answer(
+            "This batch has expired. Please open a new one.", show_alert=True
+        )
+        return
+    await query.answer()
+
+    new_status = "confirmed" if approve else "rejected"
+    updated = db.bulk_update_registration_status(
+        [reg_id for reg_id, _ in batch], new_status
+    )
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} {'approved' if approve else 'rejected'} a batch of "
+        f"{len(updated)} registrations {[reg_id for reg_id, _, _ in updated]}."
+    )
+
+    if approve:
+        messages = [
+            (
+                user_id,
+                "Congratulations! Your registration has been approved.\n\n"
+                f"Your unique ticket code is: {ticket_code}\n"
+                "Use /myticket to get your QR ticket.",
+            )
+            for _, user_id, ticket_code in updated
+        ]
+    else:
+        messages = [
+            (user_id, "Unfortunately, your registration could not be approved.")
+            for _, user_id, _ in updated
+        ]
+        promote_waitlist(context.application)
+    context.application.create_task(
+        send_bulk_messages(context.bot, messages, priority=ADMIN)
+    )
+
+    skipped = len(batch) - len(updated)
+    text = (
+        f"{'✅ Approved' if approve else '❌ Rejected'} {len(updated)} registrations."
+    )
+    if skipped:
+        text += f"\n{skipped} had already been handled and were skipped."
+    keyboard = [[InlineKeyboardButton("⏭️ Next Batch", callback_data="review_batch")]]
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+@admin_only
+async def view_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Shows the precomputed registration counters for the active event."""
+    query = update.callback_query
+    user = update.effective_user
+    interactions_logger.info(f"ADMIN {get_user_info(user)} opened the dashboard.")
+    await query.answer()
+
+    keyboard = [
+        [InlineKeyboardButton("⬅️ Back to Admin Panel", callback_data="admin_back")]
+    ]
+    active_event = db.get_active_event()
+    if not active_event:
+        await query.edit_message_text(
+            "There is no active event.", reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return ADMIN_CHOOSING
+
+    stats = db.get_event_stats(active_event["event_id"])
+    confirmed = int(stats.get("status:confirmed", 0))
+    pending = int(stats.get("status:pending_verification", 0))
+    rejected = int(stats.get("status:rejected", 0))
+    # Seat holds only become registrations once the user completes them.
+    total = sum(
+        int(value)
+        for metric, value in stats.items()
+        if metric.startswith("status:")
+        and metric not in ("status:reserved", "status:expired")
+    )
+    conversion = f"{confirmed / total:.0%}" if total else "n/a"
+    text = (
+        f"📊 Dashboard for '{active_event['name']}'\n\n"
+        f"Registrations: {total}\n"
+        f"Confirmed: {confirmed}\n"
+        f"Pending Verification: {pending}\n"
+        f"Rejected: {rejected}\n"
+        f"Conversion: {conversion}\n"
+        f"Revenue: {format_toman(stats.get('revenue', 0))}\n"
+        f"Discount Codes Used: {int(stats.get('discount_uses', 0))}\n"
+        f"Referral Signups: {int(stats.get('referral_signups', 0))}"
+    )
+    seats = db.get_event_seats(active_event["event_id"])
+    if seats:
+        capacity, seats_left, waitlisted = seats
+        text += (
+            f"\nSeats Left: {seats_left}/{capacity} "
+            f"({int(stats.get('status:reserved', 0))} held)\n"
+            f"Waitlist: {waitlisted}"
+        )
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+    return ADMIN_CHOOSING
+
+
+@admin_only
+async def view_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Shows the overall referral leaderboard and the one for the active event."""
+    query = update.callback_query
+    user = update.effective_user
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} viewed the referral leaderboard."
+    )
+    await query.answer()
+
+    text = format_leaderboard("🏆 Top Inviters (All Time)", referral_leaderboard.top())
+    active_event = db.get_active_event()
+    if active_event:
+        event_entries = db.get_top_event_referrers(
+            active_event["event_id"], LEADERBOARD_SIZE
+        )
+        text += "\n\n" + format_leaderboard(
+            f"🎟️ Top Inviters for '{active_event['name']}'", event_entries
+        )
+    keyboard = [
+        [InlineKeyboardButton("⬅️ Back to Admin Panel", callback_data="admin_back")]
+    ]
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+    return ADMIN_CHOOSING
+
+
+@admin_only
+async def view_event_referrers(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    query = update.callback_query
+    user = update.effective_user
+    await query.answer()
+    event_id = int(query.data.split("_")[2])
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} viewed top referrers for Event [ID:{event_id}]."
+    )
+    event = db.get_event_by_id(event_id)
+    if not event:
+        await query.edit_message_text("Error: Event not found.")
+        return MANAGING_EVENTS
+
+    entries = db.get_top_event_referrers(event_id, LEADERBOARD_SIZE)
+    text = format_leaderboard(f"🏆 Top Inviters for '{event['name']}'", entries)
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                "⬅️ Back to Event Details", callback_data=f"view_event_{event_id}"
+            )
+        ]
+    ]
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+    return VIEWING_EVENT
+
+
+@admin_only
+async def rebuild_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Recomputes the dashboard counters from scratch and reports any drift."""
+    user = update.effective_user
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} requested a statistics rebuild."
+    )
+    drift = db.rebuild_event_stats()
+    if not drift:
+        await update.message.reply_text("✅ Statistics rebuilt. No drift found.")
+        return
+
+    app_logger.warning(f"Statistics drift corrected for {len(drift)} counters.")
+    lines = [
+        f"- Event {event_id} {metric}: {stored:g} → {expected:g}"
+        for event_id, metric, stored, expected in drift
+    ]
+    await update.message.reply_text(
+        f"⚠️ Statistics rebuilt. Corrected {len(drift)} drifted counters:\n\n"
+        + "\n".join(lines)
+    )
+
+
+@admin_only
+async def reload_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Reloads the runtime settings from .env without restarting the bot."""
+    user = update.effective_user
+    interactions_logger.info(f"ADMIN {get_user_info(user)} requested a config reload.")
+    try:
+        changed = reload_runtime_settings()
+    except ValueError as e:
+        app_logger.error(f"Config reload by {get_user_info(user)} rejected: {e}")
+        await update.message.reply_text(
+            f"❌ Config not reloaded, the current settings stay in effect:\n{e}"
+        )
+        return
+
+    if changed:
+        await update.message.reply_text(
+            f"✅ Config reloaded. Changed: {', '.join(changed)}."
+        )
+    else:
+        await update.message.reply_text("✅ Config reloaded. Nothing changed.")
+
+
+@admin_only
+async def flood_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Shows what the per-user flood control has let through and dropped."""
+    lines = [
+        "🌊 Flood control",
+        f"Limit: {FLOOD_BURST} updates at once, then {FLOOD_RATE:g}/s per user",
+        f"Tracked users: {flood_control.tracked_users:,} "
+        f"(evicted: {flood_control.evicted:,})",
+        f"Allowed: {flood_control.allowed:,}",
+        f"Dropped: {flood_control.dropped:,}",
+    ]
+    offenders = flood_control.top_offenders(5)
+    if offenders:
+        lines.append("\nTop offenders:")
+        lines.extend(
+            f"- {user_id}: {dropped:,} dropped" for user_id, dropped in offenders
+        )
+    exempt = sorted(
+        flood_control.exempt_user_ids | get_settings().flood_exempt_user_ids
+    )
+    if exempt:
+        lines.append(f"\nExempt (besides admins): {', '.join(map(str, exempt))}")
+    await update.message.reply_text("\n".join(lines))
+
+
+@admin_only
+async def flood_exempt(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Toggles a user's flood control exemption until the next restart."""
+    user = update.effective_user
+    if len(context.args) != 1 or not context.args[0].lstrip("-").isdigit():
+        await update.message.reply_text("Usage: /floodexempt <user_id>")
+        return
+
+    user_id = int(context.args[0])
+    if user_id in flood_control.exempt_user_ids:
+        flood_control.exempt_user_ids.discard(user_id)
+        action = "removed from"
+    else:
+        flood_control.exempt_user_ids.add(user_id)
+        action = "added to"
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} {action} the flood exemptions: {user_id}."
+    )
+    await update.message.reply_text(
+        f"✅ User {user_id} {action} the flood control exemptions."
+    )
+
+
+@admin_only
+async def verify_ticket(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Looks up a ticket code given as `/verify <code>` and shows who holds it."""
+    user = update.effective_user
+    if not context.args:
+        await update.message.reply_text("Usage: /verify <ticket code>")
+        return
+
+    code = normalize_code("".join(context.args))
+    interactions_logger.info(f"ADMIN {get_user_info(user)} verified ticket '{code}'.")
+    registration = db.get_registration_by_ticket_code(code)
+    if registration is None:
+        hint = ""
+        if not is_valid_ticket_code(code):
+            hint = "\nThe code also fails its checksum, so it was probably mistyped."
+        await update.message.reply_text(f"❌ No ticket found for {code}.{hint}")
+        return
+
+    icon = "✅" if registration["status"] == "confirmed" else "⚠️"
+    await update.message.reply_text(
+        f"{icon} Ticket {code}\n"
+        f"Event: {registration['event_name']}\n"
+        f"Holder: {registration['first_name']} (@{registration['username']})\n"
+        f"Status: {registration['status']}"
+    )
+
+
+CHECK_IN_REPLIES = {
+    checkin.CHECKED_IN: "✅ {code} - {name}",
+    checkin.ALREADY_CHECKED_IN: "⚠️ {code} - ALREADY checked in at {time} UTC ({name})",
+    checkin.NOT_CONFIRMED: "⛔ {code} - registration is not confirmed",
+    checkin.UNKNOWN: "❌ {code} - not a ticket for this event",
+}
+
+
+@admin_only
+async def start_check_in(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Enters door check-in mode for the active event."""
+    user = update.effective_user
+    active_event = db.get_active_event()
+    if not active_event:
+        await update.message.reply_text("There is no active event to check in for.")
+        return ConversationHandler.END
+
+    check_in_desk.ensure_loaded(active_event["event_id"])
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} started check-in for Event [ID:{active_event['event_id']}]."
+    )
+    await update.message.reply_text(
+        f"🚪 Check-in mode for '{active_event['name']}'\n"
+        f"{check_in_desk.checked_in_count}/{check_in_desk.ticket_count} tickets checked in so far.\n\n"
+        "Send ticket codes, one per line. Send /done when finished."
+    )
+    return CHECKING_IN
+
+
+@admin_only
+async def handle_check_in_codes(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    """Checks in every ticket code in the message, one per line."""
+    user = update.effective_user
+    codes = [
+        normalize_code(line)
+        for line in update.message.text.splitlines()
+        if line.strip()
+    ]
+    results = Counter()
+    lines = []
+    for code in codes:
+        result, ticket = check_in_desk.check_in(code)
+        results[result] += 1
+        lines.append(
+            CHECK_IN_REPLIES[result].format(
+                code=code,
+                name=ticket["name"] if ticket else "",
+                time=ticket["checked_in_at"][11:] if ticket else "",
+            )
+        )
+
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} submitted {len(codes)} check-in codes: {dict(results)}."
+    )
+    if len(codes) > 1:
+        lines.append(
+            f"\n{results[checkin.CHECKED_IN]} checked in, "
+            f"{results[checkin.ALREADY_CHECKED_IN]} duplicates, "
+            f"{results[checkin.NOT_CONFIRMED] + results[checkin.UNKNOWN]} refused."
+        )
+    await update.message.reply_text("\n".join(lines))
+    return CHECKING_IN
+
+
+@admin_only
+async def finish_check_in(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    user = update.effective_user
+    check_in_desk.flush()
+    interactions_logger.info(f"ADMIN {get_user_info(user)} left check-in mode.")
+    await update.message.reply_text(
+        f"Check-in mode closed. {check_in_desk.checked_in_count}/{check_in_desk.ticket_count} "
+        "tickets checked in."
+    )
+    return ConversationHandler.END
 
-    message = update.message or update.callback_query.message
-    if update.callback_query:
-        await update.callback_query.answer()
 
+def _render_event_list():
     events = db.get_all_events()
     keyboard = []
     if events:
         for event in events:
             prefix = "✅ " if event["is_active"] else ""
-            button_text = f"{prefix}{event['name']} ({event['date']})"
+            starts_at = format_event_time(
+                event["starts_at"], event["timezone"], show_timezone=False
+            )
+            button_text = f"{prefix}{event['name']} ({starts_at})"
             keyboard.append(
                 [
                     InlineKeyboardButton(
@@ -165,9 +642,21 @@ async def manage_events(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     keyboard.append(
         [InlineKeyboardButton("⬅️ Back to Admin Panel", callback_data="admin_back")]
     )
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return "Event Management:", InlineKeyboardMarkup(keyboard)
+
+
+@admin_only
+async def manage_events(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    user = update.effective_user
+    interactions_logger.info(f"ADMIN {get_user_info(user)} entered event management.")
 
-    text = "Event Management:"
+    message = update.message or update.callback_query.message
+    if update.callback_query:
+        await update.callback_query.answer()
+
+    text, reply_markup = screen_cache.get_or_render(
+        "event_list", None, ("events",), _render_event_list
+    )
     if update.callback_query:
         await update.callback_query.edit_message_text(text, reply_markup=reply_markup)
     else:
@@ -175,31 +664,20 @@ async def manage_events(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     return MANAGING_EVENTS
 
 
-@admin_only
-async def view_event_details(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    user = update.effective_user
-    await query.answer()
-
-    event_id = int(query.data.split("_")[2])
-    interactions_logger.info(
-        f"ADMIN {get_user_info(user)} is viewing details for Event [ID:{event_id}]."
-    )
-    context.user_data["selected_event_id"] = event_id
-
+def _render_event_details(event_id: int):
     event = db.get_event_by_id(event_id)
     if not event:
-        await query.edit_message_text("Error: Event not found.")
-        return MANAGING_EVENTS
+        return None
 
     status = "Active" if event["is_active"] else "Inactive"
     paid_status = f"Paid ({format_toman(event['fee'])})" if event["is_paid"] else "Free"
     details_text = (
         f"Event: {event['name']}\n"
         f"Description: {event['description']}\n"
-        f"Date: {event['date']}\n"
+        f"Date: {format_event_time(event['starts_at'], event['timezone'])}\n"
         f"Type: {paid_status}\n"
         f"Reminders: {event['reminders']} hours before\n"
+        f"Capacity: {event['capacity'] or 'Unlimited'}\n"
         f"Status: {status}"
     )
 
@@ -208,7 +686,12 @@ async def view_event_details(update: Update, context: ContextTypes.DEFAULT_TYPE)
             InlineKeyboardButton(
                 "👥 View Participants", callback_data=f"view_participants_{event_id}"
             )
-        ]
+        ],
+        [
+            InlineKeyboardButton(
+                "🏆 Top Referrers", callback_data=f"event_referrers_{event_id}"
+            )
+        ],
     ]
     if event["is_paid"]:
         keyboard.append(
@@ -237,7 +720,29 @@ async def view_event_details(update: Update, context: ContextTypes.DEFAULT_TYPE)
         [InlineKeyboardButton("⬅️ Back to Event List", callback_data="manage_events")]
     )
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return details_text, InlineKeyboardMarkup(keyboard)
+
+
+@admin_only
+async def view_event_details(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    user = update.effective_user
+    await query.answer()
+
+    event_id = int(query.data.split("_")[2])
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} is viewing details for Event [ID:{event_id}]."
+    )
+    context.user_data["selected_event_id"] = event_id
+
+    screen = screen_cache.get_or_render(
+        "event_details", event_id, ("events",), lambda: _render_event_details(event_id)
+    )
+    if screen is None:
+        await query.edit_message_text("Error: Event not found.")
+        return MANAGING_EVENTS
+
+    details_text, reply_markup = screen
     await query.edit_message_text(details_text, reply_markup=reply_markup)
     return VIEWING_EVENT
 
@@ -312,14 +817,28 @@ async def get_event_description(
     interactions_logger.info(
         f"ADMIN {get_user_info(user)} (Event Creation) set description: '{update.message.text}'."
     )
-    await update.message.reply_text("Enter the event date in YYYY-MM-DD HH:MM format:")
+    await update.message.reply_text(
+        f"Enter the event date in YYYY-MM-DD HH:MM format ({EVENT_TIMEZONE} time):"
+    )
     return GETTING_EVENT_DATE
 
 
 @admin_only
 async def get_event_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user
-    context.user_data["event_date"] = update.message.text
+    try:
+        starts_at = parse_event_time(update.message.text, EVENT_TIMEZONE)
+    except ValueError:
+        await update.message.reply_text(
+            "That is not a valid date. Please use YYYY-MM-DD HH:MM, e.g. 2025-03-01 18:30:"
+        )
+        return GETTING_EVENT_DATE
+    if starts_at <= time.time():
+        await update.message.reply_text(
+            "That time has already passed. Please enter a future date:"
+        )
+        return GETTING_EVENT_DATE
+    context.user_data["starts_at"] = starts_at
     interactions_logger.info(
         f"ADMIN {get_user_info(user)} (Event Creation) set date: '{update.message.text}'."
     )
@@ -352,7 +871,7 @@ async def get_event_is_paid(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return GETTING_EVENT_FEE
     else:
-        context.user_data["fee"] = 0.0
+        context.user_data["fee"] = 0
         context.user_data["payment_details"] = None
         await query.edit_message_text("Enter reminder hours (e.g., 24, 1):")
         return GETTING_REMINDERS
@@ -361,7 +880,13 @@ async def get_event_is_paid(update: Update, context: ContextTypes.DEFAULT_TYPE)
 @admin_only
 async def get_event_fee(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user
-    context.user_data["fee"] = float(update.message.text)
+    fee = update.message.text.replace(",", "").strip()
+    if not fee.isdigit() or int(fee) == 0:
+        await update.message.reply_text(
+            "Please enter the fee as a whole number of Toman (e.g., 150000):"
+        )
+        return GETTING_EVENT_FEE
+    context.user_data["fee"] = int(fee)
     interactions_logger.info(
         f"ADMIN {get_user_info(user)} (Event Creation) set fee: {update.message.text}."
     )
@@ -385,25 +910,52 @@ async def get_payment_details(
     return GETTING_REMINDERS
 
 
+@admin_only
+async def get_event_reminders(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    user = update.effective_user
+    try:
+        context.user_data["reminder_hours"] = parse_reminder_hours(update.message.text)
+    except ValueError:
+        await update.message.reply_text(
+            "Please enter whole hours separated by commas (e.g., 24, 1):"
+        )
+        return GETTING_REMINDERS
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} (Event Creation) set reminders: '{update.message.text}'."
+    )
+    await update.message.reply_text("Enter the number of seats, or 0 for no limit:")
+    return GETTING_EVENT_CAPACITY
+
+
 @admin_only
 async def save_event_and_finish(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     user = update.effective_user
-    context.user_data["reminders"] = update.message.text
+    text = update.message.text.strip()
+    if not text.isdigit():
+        await update.message.reply_text(
+            "Please enter a whole number of seats, or 0 for no limit:"
+        )
+        return GETTING_EVENT_CAPACITY
+    context.user_data["capacity"] = int(text) or None
     interactions_logger.info(
-        f"ADMIN {get_user_info(user)} (Event Creation) set reminders: '{update.message.text}'. Saving event."
+        f"ADMIN {get_user_info(user)} (Event Creation) set capacity: {text}. Saving event."
     )
 
     try:
         db.create_event(
             name=context.user_data["event_name"],
             description=context.user_data["event_description"],
-            date=context.user_data["event_date"],
+            starts_at=context.user_data["starts_at"],
+            timezone=EVENT_TIMEZONE,
             fee=context.user_data["fee"],
             is_paid=context.user_data["is_paid"],
             payment_details=context.user_data.get("payment_details"),
-            reminders=context.user_data["reminders"],
+            reminder_hours=context.user_data["reminder_hours"],
+            capacity=context.user_data["capacity"],
         )
         await update.message.reply_text(
             f"✅ Event '{context.user_data['event_name']}' created."
@@ -456,27 +1008,8 @@ async def view_participants(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 
 # --- Discount Code Management ---
-@admin_only
-async def manage_discounts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    # This function now handles both callback queries and message-driven transitions
-    query = update.callback_query
-    message = update.message
-    user = update.effective_user
-
-    if query:
-        await query.answer()
-        event_id = int(query.data.split("_")[2])
-        interactions_logger.info(
-            f"ADMIN {get_user_info(user)} entered discount management for Event [ID:{event_id}] via callback."
-        )
-    else:  # This case is for after creating a code
-        event_id = context.user_data["selected_event_id"]
-        interactions_logger.info(
-            f"ADMIN {get_user_info(user)} returned to discount management for Event [ID:{event_id}] after action."
-        )
-
-    context.user_data["selected_event_id"] = event_id
-    codes = db.get_discount_codes_for_event(event_id)
+def _render_discount_list(event_id: int):
+    codes = db.get_discount_codes_for_event(event_id, limit=DISCOUNT_LIST_SIZE)
     event = db.get_event_by_id(event_id)
     text = f"Discount Codes for '{event['name']}'\n\n"
 
@@ -484,6 +1017,9 @@ async def manage_discounts(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     if not codes:
         text += "No discount codes created yet."
     else:
+        total = db.count_discount_codes(event_id)
+        if total > len(codes):
+            text += f"Showing the first {len(codes)} of {total:,} codes. Export the CSV to see them all."
         for code in codes:
             value = (
                 f"{int(code['value'])}%"
@@ -503,9 +1039,20 @@ async def manage_discounts(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         [
             InlineKeyboardButton(
                 "➕ Create New Code", callback_data=f"create_discount_{event_id}"
-            )
+            ),
+            InlineKeyboardButton(
+                "📦 Bulk Codes", callback_data=f"bulk_discount_{event_id}"
+            ),
         ]
     )
+    if codes:
+        keyboard.append(
+            [
+                InlineKeyboardButton(
+                    "📄 Export CSV", callback_data=f"export_discounts_{event_id}"
+                )
+            ]
+        )
     keyboard.append(
         [
             InlineKeyboardButton(
@@ -513,7 +1060,65 @@ async def manage_discounts(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             )
         ]
     )
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def _discount_codes_csv(rows) -> bytes:
+    """Renders (code, discount_type, value, uses_left) rows as a CSV file."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["code", "discount_type", "value", "uses_left"])
+    for code, discount_type, value, uses_left in rows:
+        writer.writerow([code, discount_type, value, uses_left])
+    return buffer.getvalue().encode()
+
+
+def _parse_discount_csv(data: bytes) -> list[str]:
+    """
+    Reads the codes from the first column of an uploaded CSV, upper-cased like
+    the codes users type. Blank rows and a 'code' header row are skipped.
+    Raises ValueError if the file is not UTF-8 text.
+    """
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("The file is not UTF-8 text.")
+    codes = [
+        row[0].strip().upper()
+        for row in csv.reader(io.StringIO(text))
+        if row and row[0].strip()
+    ]
+    if codes and codes[0] == "CODE":
+        codes.pop(0)
+    return codes
+
+
+@admin_only
+async def manage_discounts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    # This function now handles both callback queries and message-driven transitions
+    query = update.callback_query
+    message = update.message
+    user = update.effective_user
+
+    if query:
+        await query.answer()
+        event_id = int(query.data.split("_")[2])
+        interactions_logger.info(
+            f"ADMIN {get_user_info(user)} entered discount management for Event [ID:{event_id}] via callback."
+        )
+    else:  # This case is for after creating a code
+        event_id = context.user_data["selected_event_id"]
+        interactions_logger.info(
+            f"ADMIN {get_user_info(user)} returned to discount management for Event [ID:{event_id}] after action."
+        )
+
+    context.user_data["selected_event_id"] = event_id
+    text, reply_markup = screen_cache.get_or_render(
+        "discount_list",
+        event_id,
+        ("events", "discount_codes"),
+        lambda: _render_discount_list(event_id),
+    )
 
     if query:
         await query.edit_message_text(text, reply_markup=reply_markup)
@@ -581,6 +1186,7 @@ async def prompt_for_discount_code(
     interactions_logger.info(
         f"ADMIN {get_user_info(user)} started creating a new discount code."
     )
+    context.user_data.pop("discount_bulk", None)
     await query.answer()
     await query.edit_message_text(
         "Please enter the discount code text (e.g., SUMMER25):"
@@ -588,25 +1194,98 @@ async def prompt_for_discount_code(
     return GETTING_DISCOUNT_CODE
 
 
-@admin_only
-async def get_discount_code(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    user = update.effective_user
-    context.user_data["discount_code"] = update.message.text.upper()
-    interactions_logger.info(
-        f"ADMIN {get_user_info(user)} (Discount Creation) set code: '{context.user_data['discount_code']}'."
-    )
+async def _ask_discount_type(message) -> int:
     keyboard = [
         [
             InlineKeyboardButton("Percentage %", callback_data="percentage"),
             InlineKeyboardButton("Fixed Amount (Toman)", callback_data="fixed"),
         ]
     ]
-    await update.message.reply_text(
+    await message.reply_text(
         "What type of discount is this?", reply_markup=InlineKeyboardMarkup(keyboard)
     )
     return GETTING_DISCOUNT_TYPE
 
 
+@admin_only
+async def get_discount_code(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    user = update.effective_user
+    context.user_data["discount_code"] = update.message.text.upper()
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} (Discount Creation) set code: '{context.user_data['discount_code']}'."
+    )
+    return await _ask_discount_type(update.message)
+
+
+@admin_only
+async def prompt_for_bulk_discount_codes(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    query = update.callback_query
+    user = update.effective_user
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} started creating bulk discount codes."
+    )
+    await query.answer()
+    await query.edit_message_text(
+        "Send the number of codes to generate, optionally followed by a prefix "
+        "(e.g., 500 PARTNER).\n\n"
+        "Or upload a CSV file with one code per line in the first column to import them."
+    )
+    return GETTING_BULK_DISCOUNT_CODES
+
+
+@admin_only
+async def get_bulk_discount_codes(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    """Takes a code count and prefix, or a CSV of codes; the type, value and uses follow."""
+    user = update.effective_user
+    message = update.message
+    document = message.document
+    if document:
+        if document.file_size and document.file_size > DISCOUNT_IMPORT_MAX_FILE_SIZE:
+            await message.reply_text(
+                f"That file is too large. The limit is {DISCOUNT_IMPORT_MAX_FILE_SIZE // 2**20} MB:"
+            )
+            return GETTING_BULK_DISCOUNT_CODES
+        file = await document.get_file()
+        try:
+            codes = _parse_discount_csv(bytes(await file.download_as_bytearray()))
+        except ValueError as e:
+            await message.reply_text(f"{e} Please upload a CSV file:")
+            return GETTING_BULK_DISCOUNT_CODES
+        if not codes or len(codes) > DISCOUNT_BULK_MAX_CODES:
+            await message.reply_text(
+                f"The file must contain between 1 and {DISCOUNT_BULK_MAX_CODES:,} codes:"
+            )
+            return GETTING_BULK_DISCOUNT_CODES
+        context.user_data["discount_bulk"] = {"codes": codes}
+        summary = f"import {len(codes):,} codes from '{document.file_name}'"
+    else:
+        parts = message.text.split()
+        count = int(parts[0]) if parts and parts[0].isdecimal() else 0
+        prefix = parts[1].upper() if len(parts) > 1 else ""
+        if len(parts) > 2 or not 1 <= count <= DISCOUNT_BULK_MAX_CODES:
+            await message.reply_text(
+                f"Please send a number between 1 and {DISCOUNT_BULK_MAX_CODES:,}, "
+                "optionally followed by a prefix (e.g., 500 PARTNER):"
+            )
+            return GETTING_BULK_DISCOUNT_CODES
+        if prefix and not (prefix.isascii() and prefix.isalnum()):
+            await message.reply_text(
+                "The prefix may only contain letters and digits. Please try again:"
+            )
+            return GETTING_BULK_DISCOUNT_CODES
+        context.user_data["discount_bulk"] = {"count": count, "prefix": prefix}
+        summary = f"generate {count:,} codes with prefix '{prefix}'"
+
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} (Bulk Discount Creation) will {summary}."
+    )
+    return await _ask_discount_type(message)
+
+
 @admin_only
 async def get_discount_type(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
@@ -628,7 +1307,16 @@ async def get_discount_type(update: Update, context: ContextTypes.DEFAULT_TYPE)
 @admin_only
 async def get_discount_value(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user
-    context.user_data["discount_value"] = float(update.message.text)
+    value = update.message.text.replace(",", "").strip()
+    is_percentage = context.user_data["discount_type"] == "percentage"
+    if not value.isdigit() or int(value) == 0 or (is_percentage and int(value) > 100):
+        await update.message.reply_text(
+            "Please enter a whole percentage from 1 to 100 (e.g., 20):"
+            if is_percentage
+            else "Please enter the amount as a whole number of Toman (e.g., 50000):"
+        )
+        return GETTING_DISCOUNT_VALUE
+    context.user_data["discount_value"] = int(value)
     interactions_logger.info(
         f"ADMIN {get_user_info(user)} (Discount Creation) set value: {context.user_data['discount_value']}."
     )
@@ -644,6 +1332,10 @@ async def save_discount_code(update: Update, context: ContextTypes.DEFAULT_TYPE)
     interactions_logger.info(
         f"ADMIN {get_user_info(user)} (Discount Creation) set uses: {context.user_data['discount_uses']}. Saving."
     )
+    bulk = context.user_data.pop("discount_bulk", None)
+    if bulk:
+        await _save_bulk_discount_codes(update, context, bulk)
+        return await manage_discounts(update, context)
     try:
         db.create_discount_code(
             event_id=event_id,
@@ -667,6 +1359,87 @@ async def save_discount_code(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return await manage_discounts(update, context)
 
 
+async def _save_bulk_discount_codes(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, bulk: dict
+):
+    """Creates the codes in one transaction and sends the new ones back as a CSV."""
+    user = update.effective_user
+    event_id = context.user_data["selected_event_id"]
+    discount_type = context.user_data["discount_type"]
+    value = context.user_data["discount_value"]
+    uses_left = context.user_data["discount_uses"]
+    try:
+        # Up to 100k rows: keep the event loop free while they are written.
+        if "codes" in bulk:
+            codes = await asyncio.to_thread(
+                db.create_discount_codes,
+                event_id,
+                bulk["codes"],
+                discount_type,
+                value,
+                uses_left,
+            )
+            skipped = len(bulk["codes"]) - len(codes)
+        else:
+            codes = await asyncio.to_thread(
+                db.generate_discount_codes,
+                event_id,
+                bulk["count"],
+                bulk["prefix"],
+                discount_type,
+                value,
+                uses_left,
+            )
+            skipped = 0
+    except Exception as e:
+        app_logger.error(f"Failed to save bulk discount codes: {e}", exc_info=True)
+        await update.message.reply_text("An error occurred. No codes were created.")
+        return
+
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} created {len(codes)} discount codes for Event [ID:{event_id}]"
+        f" ({skipped} skipped as duplicates)."
+    )
+    text = f"✅ {len(codes):,} discount codes created."
+    if skipped:
+        text += (
+            f" {skipped:,} were skipped because they already exist or were repeated."
+        )
+    if not codes:
+        await update.message.reply_text(text)
+        return
+    document = _discount_codes_csv(
+        (code, discount_type, value, uses_left) for code in codes
+    )
+    await update.message.reply_document(
+        document=document,
+        filename=f"discount_codes_event{event_id}.csv",
+        caption=text,
+    )
+
+
+@admin_only
+async def export_discount_codes(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    query = update.callback_query
+    user = update.effective_user
+    await query.answer()
+    event_id = int(query.data.split("_")[2])
+    codes = await asyncio.to_thread(db.get_discount_codes_for_event, event_id)
+    interactions_logger.info(
+        f"ADMIN {get_user_info(user)} exported {len(codes)} discount codes of Event [ID:{event_id}]."
+    )
+    document = _discount_codes_csv(
+        (row["code"], row["discount_type"], row["value"], row["uses_left"])
+        for row in codes
+    )
+    await query.message.reply_document(
+        document=document, filename=f"discount_codes_event{event_id}.csv"
+    )
+    return MANAGING_DISCOUNTS
+
+
 @admin_only
 async def cancel_admin_conversation(
     update: Update, context: ContextTypes.DEFAULT_TYPE
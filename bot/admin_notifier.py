@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from telegram import InputMediaPhoto
+from telegram.error import TelegramError
+from config import ADMIN_DIGEST_URGENT_SIZE, PENDING_BATCH_SIZE, get_settings
+from .outbound import ADMIN
+
+app_logger = logging.getLogger("app")
+
+
+class AdminNotifier:
+    """
+    Collects new-receipt notifications for the admin chat and delivers them as
+    digests: the receipts as media groups of up to PENDING_BATCH_SIZE photos,
+    followed by one summary line. A digest goes out on every periodic flush, or
+    right away once `urgent_size` receipts are waiting. Receipts that could not
+    be delivered stay queued for the next flush.
+    """
+
+    def __init__(self, urgent_size: int):
+        self.urgent_size = urgent_size
+        self._pending = []  # (photo file_id, caption, sender) not yet delivered
+        self._lock = asyncio.Lock()
+
+    def add_receipt(self, application, file_id: str, caption: str, sender: str):
+        """Queues a receipt. Never waits on Telegram; urgent flushes run in the background."""
+        self._pending.append((file_id, caption, sender))
+        if len(self._pending) >= self.urgent_size and not self._lock.locked():
+            application.create_task(self.flush(application.bot))
+
+    async def flush(self, bot) -> int:
+        """Sends everything queued as one digest. Returns the number of receipts delivered."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, []
+            chat_id = get_settings().admin_chat_id
+            delivered = 0
+            try:
+                for start in range(0, len(pending), PENDING_BATCH_SIZE):
+                    batch = pending[start : start + PENDING_BATCH_SIZE]
+                    await self._send_photos(bot, chat_id, batch)
+                    delivered += len(batch)
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text=self._summary(pending),
+                    rate_limit_args=ADMIN,
+                )
+            except TelegramError as e:
+                # Photos already in the chat are not sent again; the rest wait.
+                self._pending = pending[delivered:] + self._pending
+                app_logger.warning(
+                    f"Admin digest delivered {delivered} of {len(pending)} receipts: {e}"
+                )
+            return delivered
+
+    @staticmethod
+    async def _send_photos(bot, chat_id, receipts):
+        if len(receipts) == 1:
+            file_id, caption, _ = receipts[0]
+            await bot.send_photo(
+                chat_id=chat_id, photo=file_id, caption=caption, rate_limit_args=ADMIN
+            )
+            return
+        media = [
+            InputMediaPhoto(media=file_id, caption=caption)
+            for file_id, caption, _ in receipts
+        ]
+        await bot.send_media_group(chat_id=chat_id, media=media, rate_limit_args=ADMIN)
+
+    @staticmethod
+    def _summary(receipts) -> str:
+        if len(receipts) == 1:
+            return f"📢 New receipt from {receipts[0][2]} requires verification."
+        return f"📢 {len(receipts)} new receipts require verification."
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+
+async def flush_admin_notifications(context):
+    """Job queue callback that periodically sends the receipt digest."""
+    await admin_notifier.flush(context.bot)
+
+
+admin_notifier = AdminNotifier(ADMIN_DIGEST_URGENT_SIZE)
@@ -0,0 +1,20 @@
+import json
+import logging
+import time
+from telegram import Update
+
+capture_logger = logging.getLogger("capture")
+
+
+async def capture_update(update: Update, context) -> None:
+    """
+    Records an incoming update as one compact JSON line, {"t": <unix time
+    received>, "u": <update>}, for offline replay with benchmarks/replay.py.
+    """
+    capture_logger.info(
+        json.dumps(
+            {"t": round(time.time(), 3), "u": update.to_dict()},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+    )
@@ -0,0 +1,130 @@
+import logging
+import sqlite3
+from datetime import datetime, timezone
+import database as db
+from codegen import is_valid_ticket_code
+from config import CHECKIN_FLUSH_BATCH_SIZE, CHECKIN_WRITE_TIMEOUT
+
+app_logger = logging.getLogger("app")
+
+# Results of CheckInDesk.check_in
+CHECKED_IN = "checked_in"
+ALREADY_CHECKED_IN = "already_checked_in"
+NOT_CONFIRMED = "not_confirmed"
+UNKNOWN = "unknown"
+
+
+class CheckInDesk:
+    """
+    Validates ticket codes at the door against an in-memory index of the active
+    event's confirmed tickets, so each lookup is a dict access. Check-ins are
+    acknowledged immediately and written to the database in batches; if the
+    database is briefly locked they simply stay queued until the next flush.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.event_id = None
+        # ticket_code -> {"registration_id", "name", "checked_in_at"}
+        self._tickets = {}
+        self._pending = []  # (registration_id, checked_in_at) not yet written
+        self.checked_in_count = 0
+
+    def ensure_loaded(self, event_id: int):
+        """Preloads the confirmed tickets of `event_id` unless they are already loaded."""
+        if self.event_id == event_id:
+            return
+        self.flush()
+        self._tickets = {
+            row["ticket_code"]: self._ticket_from_row(row)
+            for row in db.get_confirmed_tickets(event_id)
+        }
+        self.checked_in_count = sum(
+            1 for ticket in self._tickets.values() if ticket["checked_in_at"]
+        )
+        self.event_id = event_id
+        app_logger.info(
+            f"Check-in desk loaded {len(self._tickets)} tickets for Event [ID:{event_id}]."
+        )
+
+    @staticmethod
+    def _ticket_from_row(row) -> dict:
+        name = row["first_name"] or ""
+        if row["username"]:
+            name += f" (@{row['username']})"
+        return {
+            "registration_id": row["registration_id"],
+            "name": name,
+            "checked_in_at": row["checked_in_at"],
+        }
+
+    def _lookup_new_ticket(self, code: str):
+        """Falls back to the database for tickets approved after the desk was loaded."""
+        if not is_valid_ticket_code(code):
+            return None, UNKNOWN  # Typos and garbage never reach the database.
+        try:
+            row = db.get_registration_by_ticket_code(code)
+        except sqlite3.OperationalError as e:
+            app_logger.warning(f"Check-in lookup for '{code}' failed: {e}")
+            return None, UNKNOWN
+        if row is None or row["event_id"] != self.event_id:
+            return None, UNKNOWN
+        if row["status"] != "confirmed":
+            return None, NOT_CONFIRMED
+        ticket = self._ticket_from_row(row)
+        self._tickets[code] = ticket
+        if ticket["checked_in_at"]:
+            self.checked_in_count += 1
+        return ticket, None
+
+    def check_in(self, code: str):
+        """
+        Checks in a normalized ticket code. Returns (result, ticket) where result is
+        one of CHECKED_IN, ALREADY_CHECKED_IN, NOT_CONFIRMED or UNKNOWN.
+        """
+        ticket = self._tickets.get(code)
+        if ticket is None:
+            ticket, result = self._lookup_new_ticket(code)
+            if ticket is None:
+                return result, None
+        if ticket["checked_in_at"]:
+            return ALREADY_CHECKED_IN, ticket
+
+        checked_in_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        ticket["checked_in_at"] = checked_in_at
+        self.checked_in_count += 1
+        self._pending.append((ticket["registration_id"], checked_in_at))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        return CHECKED_IN, ticket
+
+    def flush(self) -> int:
+        """Writes queued check-ins in one transaction. Returns the number written."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, []
+        try:
+            db.record_check_ins(pending, timeout=CHECKIN_WRITE_TIMEOUT)
+        except sqlite3.OperationalError as e:
+            self._pending = pending + self._pending
+            app_logger.warning(
+                f"Could not record {len(pending)} check-ins, will retry: {e}"
+            )
+            return 0
+        return len(pending)
+
+    @property
+    def ticket_count(self) -> int:
+        return len(self._tickets)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+
+async def flush_check_ins(context):
+    """Job queue callback that periodically writes queued check-ins."""
+    check_in_desk.flush()
+
+
+check_in_desk = CheckInDesk(CHECKIN_FLUSH_BATCH_SIZE)
@@ -2,7 +2,7 @@ import logging
 import asyncio
 import time
 import os
-import sys
+import signal
 from telegram.ext import (
     Application,
     ConversationHandler,
@@ -11,10 +11,24 @@ from telegram.ext import (
     filters,
     CallbackQueryHandler,
     JobQueue,
+    TypeHandler,
 )
-from telegram.error import NetworkError
+from telegram import Update
 from config import *
 from . import handlers, admin, scheduler
+from .admin_notifier import admin_notifier, flush_admin_notifications
+from .capture import capture_update
+from .checkin import check_in_desk, flush_check_ins
+from .flood import flood_control
+from .lifecycle import graceful_shutdown
+from .outbound import PriorityRateLimiter
+from .receipts import archive_missing_receipts
+from .runtime_config import handle_sighup
+from .supervisor import polling_supervisor
+from .transport import build_get_updates_request, build_send_request
+from .waitlist import release_expired_holds
+from .workers import shutdown_process_pool
+from .write_buffer import flush_profile_buffer, profile_buffer
 
 app_logger = logging.getLogger("app")
 network_logger = logging.getLogger("network")
@@ -25,31 +39,14 @@ HEARTBEAT_FILE = os.path.join("logs", "heartbeat.log")
 
 async def error_handler(update, context):
     """
-    Logs exceptions. If the exception is a critical and unrecoverable
-    network error, it initiates a controlled shutdown of the bot process
-    so the watchdog can restart it cleanly.
+    Logs exceptions. Polling failures are not handled here: the getUpdates
+    request reports them to the polling supervisor directly.
     """
     err_text = str(context.error)
     network_logger.error(
         f"Exception while handling an update: {err_text}", exc_info=context.error
     )
 
-    # --- Controlled Shutdown Trigger ---
-    # This specific error indicates the polling loop is likely dead and unrecoverable.
-    if "httpx.ConnectError" in err_text:
-        network_logger.critical(
-            "Unrecoverable ConnectError detected. Initiating self-shutdown."
-        )
-        try:
-            # Delete the heartbeat file to signal the watchdog immediately
-            os.remove(HEARTBEAT_FILE)
-            network_logger.info("Heartbeat file removed.")
-        except OSError as e:
-            network_logger.error(f"Could not remove heartbeat file: {e}")
-
-        # Exit the process with an error code. The watchdog will see this and restart.
-        sys.exit(1)
-
 
 async def update_heartbeat():
     """
@@ -71,32 +68,97 @@ async def post_init(application: Application) -> None:
     It's the perfect place to start background tasks.
     """
     asyncio.create_task(update_heartbeat())
+    if hasattr(signal, "SIGHUP"):
+        # `kill -HUP <pid>` reloads the settings from .env.
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, handle_sighup)
 
 
-def run_bot() -> None:
+async def post_stop(application: Application) -> None:
     """
-    Initializes and runs the bot application. The heartbeat task is
-    started automatically by the post_init hook.
+    Called once the application has stopped processing updates, while the bot
+    can still send. Delivers the receipts still waiting for the admin digest.
+    """
+    delivered = await admin_notifier.flush(application.bot)
+    app_logger.info(f"Delivered {delivered} queued admin notifications on stop.")
+
+
+async def post_shutdown(application: Application) -> None:
+    """
+    Called once the application has stopped processing updates. Writes out
+    anything still held in memory so a graceful shutdown loses nothing.
+    """
+    flushed = profile_buffer.flush()
+    app_logger.info(f"Flushed {flushed} buffered profile updates on shutdown.")
+    flushed = check_in_desk.flush()
+    app_logger.info(f"Flushed {flushed} queued check-ins on shutdown.")
+    shutdown_process_pool()
+
+
+def build_application(
+    base_url: str | None = None,
+    base_file_url: str | None = None,
+    capture_updates: bool = False,
+) -> Application:
+    """
+    Builds the Application with all handlers and jobs registered. `base_url`
+    and `base_file_url` point the bot at a different Bot API server, such as the
+    fake one used by the benchmarks; by default the official API is used. With
+    `capture_updates`, every incoming update is also written to the capture log.
     """
     job_queue = JobQueue()
-    application = (
+    get_updates_request = build_get_updates_request()
+    builder = (
         Application.builder()
         .token(TELEGRAM_BOT_TOKEN)
-        .connect_timeout(CONNECT_TIMEOUT)
-        .read_timeout(READ_TIMEOUT)
+        .request(build_send_request())
+        .get_updates_request(get_updates_request)
+        .rate_limiter(PriorityRateLimiter())
         .job_queue(job_queue)
         .post_init(post_init)
-        .http_version("1.1")
-        .build()
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
     )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if base_file_url:
+        builder = builder.base_file_url(base_file_url)
+    application = builder.build()
 
     application.add_error_handler(error_handler)
+    polling_supervisor.watch(application, get_updates_request)
+    if capture_updates:
+        # Group -2 runs first and doesn't stop later groups, so every update is
+        # captured, including the ones flood control drops.
+        application.add_handler(TypeHandler(Update, capture_update), group=-2)
+    # Group -1 drops updates from flooding users before any handler or DB work.
+    application.add_handler(TypeHandler(Update, flood_control.check), group=-1)
     application.job_queue.run_repeating(
-        scheduler.check_and_send_reminders, interval=60, first=10
+        scheduler.check_and_send_reminders, interval=REMINDER_CHECK_INTERVAL, first=10
+    )
+    application.job_queue.run_repeating(
+        flush_profile_buffer, interval=PROFILE_FLUSH_INTERVAL
+    )
+    application.job_queue.run_repeating(
+        flush_check_ins, interval=CHECKIN_FLUSH_INTERVAL
+    )
+    application.job_queue.run_repeating(
+        flush_admin_notifications, interval=ADMIN_DIGEST_INTERVAL
+    )
+    application.job_queue.run_repeating(
+        archive_missing_receipts, interval=RECEIPT_ARCHIVE_BACKFILL_INTERVAL, first=60
+    )
+    application.job_queue.run_repeating(
+        release_expired_holds, interval=SEAT_HOLD_CHECK_INTERVAL
+    )
+    application.job_queue.run_repeating(
+        polling_supervisor.check_polling, interval=POLLING_CHECK_INTERVAL
     )
 
     user_entry_points = [CommandHandler("start", handlers.start)]
-    admin_entry_points = [CommandHandler("admin", admin.admin_panel)]
+    admin_entry_points = [
+        CommandHandler("admin", admin.admin_panel),
+        CommandHandler("checkin", admin.start_check_in),
+    ]
 
     admin_conv_handler = ConversationHandler(
         entry_points=admin_entry_points,
@@ -105,7 +167,13 @@ def run_bot() -> None:
                 CallbackQueryHandler(
                     admin.view_pending_registrations, pattern="^view_pending$"
                 ),
+                CallbackQueryHandler(
+                    admin.review_pending_batch, pattern="^review_batch$"
+                ),
                 CallbackQueryHandler(admin.manage_events, pattern="^manage_events$"),
+                CallbackQueryHandler(admin.view_dashboard, pattern="^dashboard$"),
+                CallbackQueryHandler(admin.view_leaderboard, pattern="^leaderboard$"),
+                CallbackQueryHandler(admin.admin_panel, pattern="^admin_back$"),
             ],
             MANAGING_EVENTS: [
                 CallbackQueryHandler(admin.view_event_details, pattern="^view_event_"),
@@ -127,9 +195,18 @@ def run_bot() -> None:
                 CallbackQueryHandler(
                     admin.view_participants, pattern="^view_participants_"
                 ),
+                CallbackQueryHandler(
+                    admin.view_event_referrers, pattern="^event_referrers_"
+                ),
                 CallbackQueryHandler(admin.manage_events, pattern="^manage_events$"),
                 CallbackQueryHandler(admin.view_event_details, pattern="^view_event_"),
             ],
+            CHECKING_IN: [
+                MessageHandler(
+                    filters.TEXT & ~filters.COMMAND, admin.handle_check_in_codes
+                ),
+                CommandHandler("done", admin.finish_check_in),
+            ],
             GETTING_EVENT_NAME: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, admin.get_event_name)
             ],
@@ -153,6 +230,11 @@ def run_bot() -> None:
                 )
             ],
             GETTING_REMINDERS: [
+                MessageHandler(
+                    filters.TEXT & ~filters.COMMAND, admin.get_event_reminders
+                )
+            ],
+            GETTING_EVENT_CAPACITY: [
                 MessageHandler(
                     filters.TEXT & ~filters.COMMAND, admin.save_event_and_finish
                 )
@@ -161,6 +243,12 @@ def run_bot() -> None:
                 CallbackQueryHandler(
                     admin.prompt_for_discount_code, pattern="^create_discount_"
                 ),
+                CallbackQueryHandler(
+                    admin.prompt_for_bulk_discount_codes, pattern="^bulk_discount_"
+                ),
+                CallbackQueryHandler(
+                    admin.export_discount_codes, pattern="^export_discounts_"
+                ),
                 CallbackQueryHandler(
                     admin.view_discount_details, pattern="^view_discount_"
                 ),
@@ -177,6 +265,12 @@ def run_bot() -> None:
             GETTING_DISCOUNT_CODE: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, admin.get_discount_code)
             ],
+            GETTING_BULK_DISCOUNT_CODES: [
+                MessageHandler(
+                    (filters.TEXT & ~filters.COMMAND) | filters.Document.ALL,
+                    admin.get_bulk_discount_codes,
+                )
+            ],
             GETTING_DISCOUNT_TYPE: [
                 CallbackQueryHandler(
                     admin.get_discount_type, pattern="^(percentage|fixed)$"
@@ -226,17 +320,45 @@ def run_bot() -> None:
     application.add_handler(user_conv_handler)
     application.add_handler(admin_conv_handler)
     application.add_handler(CommandHandler("myreferral", handlers.my_referral))
+    application.add_handler(CommandHandler("topreferrers", handlers.top_referrers))
     application.add_handler(CommandHandler("help", handlers.help_command))
     application.add_handler(CommandHandler("myticket", handlers.my_ticket))
+    application.add_handler(CommandHandler("rebuildstats", admin.rebuild_stats))
+    application.add_handler(CommandHandler("verify", admin.verify_ticket))
+    application.add_handler(CommandHandler("reloadconfig", admin.reload_config))
+    application.add_handler(CommandHandler("floodstats", admin.flood_stats))
+    application.add_handler(CommandHandler("floodexempt", admin.flood_exempt))
     application.add_handler(
         CallbackQueryHandler(admin.handle_registration_approval, pattern="^approve_")
     )
     application.add_handler(
         CallbackQueryHandler(admin.handle_registration_rejection, pattern="^reject_")
     )
+    application.add_handler(
+        CallbackQueryHandler(admin.review_pending_batch, pattern="^review_batch$")
+    )
+    application.add_handler(
+        CallbackQueryHandler(
+            admin.handle_batch_decision, pattern="^batch_(approve|reject)$"
+        )
+    )
+
+    return application
+
 
+def run_bot() -> int:
+    """
+    Initializes and runs the bot application. The heartbeat task is
+    started automatically by the post_init hook. Returns the process exit
+    code: 0 after a normal stop, RESTART_EXIT_CODE after a graceful shutdown
+    requested because the bot could not continue.
+    """
+    application = build_application(capture_updates=CAPTURE_UPDATES)
+    if CAPTURE_UPDATES:
+        app_logger.info("Capture mode on: recording incoming updates.")
     app_logger.info("Bot polling started...")
     # --- THIS IS THE KEY CHANGE ---
     # By setting drop_pending_updates to False, the bot will process all messages
     # that were sent while it was offline.
-    application.run_polling(drop_pending_updates=False)
+    application.run_polling(drop_pending_updates=False, allowed_updates=ALLOWED_UPDATES)
+    return graceful_shutdown.finish()
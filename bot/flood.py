@@ -0,0 +1,119 @@
+import logging
+import time
+from collections import OrderedDict
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from config import (
+    FLOOD_BURST,
+    FLOOD_MAX_TRACKED_USERS,
+    FLOOD_NOTICE_INTERVAL,
+    FLOOD_RATE,
+    get_settings,
+)
+from .utils import get_user_info
+
+interactions_logger = logging.getLogger("interactions")
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated_at", "dropped", "noticed_at")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated_at = now
+        self.dropped = 0
+        self.noticed_at = None
+
+
+class FloodControl:
+    """
+    Per-user token buckets checked before any handler runs. Each user can send
+    `burst` updates back to back and `rate` per second after that; anything
+    beyond is dropped before it reaches a handler or the database, and the user
+    is told to slow down at most once per `notice_interval`. Buckets live in an
+    LRU capped at `max_users`; an evicted user simply starts again with a full
+    bucket. Admins, the users in FLOOD_EXEMPT_USER_IDS and users exempted with
+    /floodexempt are never limited.
+    """
+
+    def __init__(self, rate: float, burst: int, max_users: int, notice_interval: float):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self.notice_interval = notice_interval
+        self._buckets = OrderedDict()  # user_id -> _Bucket, least recently active first
+        self.exempt_user_ids = set()  # Added at runtime by admins
+        self.allowed = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    def is_exempt(self, user_id: int) -> bool:
+        settings = get_settings()
+        return (
+            user_id in self.exempt_user_ids
+            or user_id in settings.admin_user_ids
+            or user_id in settings.flood_exempt_user_ids
+        )
+
+    def _take(self, user_id: int, now: float):
+        """Takes a token from the user's bucket. Returns (allowed, bucket)."""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = _Bucket(self.burst, now)
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._buckets.move_to_end(user_id)
+            bucket.tokens = min(
+                self.burst, bucket.tokens + (now - bucket.updated_at) * self.rate
+            )
+            bucket.updated_at = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return True, bucket
+        return False, bucket
+
+    async def check(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handler for an early group: stops the update if its sender is flooding."""
+        user = update.effective_user
+        if user is None or self.is_exempt(user.id):
+            return
+        now = time.monotonic()
+        allowed, bucket = self._take(user.id, now)
+        if allowed:
+            self.allowed += 1
+            return
+
+        self.dropped += 1
+        bucket.dropped += 1
+        if bucket.noticed_at is None or now - bucket.noticed_at >= self.notice_interval:
+            bucket.noticed_at = now
+            interactions_logger.warning(
+                f"{get_user_info(user)} is flooding; dropping updates "
+                f"({bucket.dropped} so far)."
+            )
+            notice = "You're sending messages too fast. Please wait a moment."
+            if update.callback_query:
+                await update.callback_query.answer(notice)
+            elif update.message:
+                await update.message.reply_text(notice)
+        raise ApplicationHandlerStop
+
+    def top_offenders(self, count: int) -> list[tuple[int, int]]:
+        """The tracked users with the most dropped updates, as (user_id, dropped)."""
+        offenders = [
+            (user_id, bucket.dropped)
+            for user_id, bucket in self._buckets.items()
+            if bucket.dropped
+        ]
+        return sorted(offenders, key=lambda item: item[1], reverse=True)[:count]
+
+    @property
+    def tracked_users(self) -> int:
+        return len(self._buckets)
+
+
+flood_control = FloodControl(
+    FLOOD_RATE, FLOOD_BURST, FLOOD_MAX_TRACKED_USERS, FLOOD_NOTICE_INTERVAL
+)
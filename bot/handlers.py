@@ -2,6 +2,11 @@ import logging
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler
 import database as db
+from .tickets import send_ticket
+from .leaderboard import format_leaderboard, referral_leaderboard
+from .admin_notifier import admin_notifier
+from .receipts import process_receipt, receipts_in_check
+from .write_buffer import profile_buffer
 from .utils import retry_on_network_error, format_toman, get_user_info
 from config import *
 
@@ -27,12 +32,19 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         log_msg = log_msg_base
 
     interactions_logger.info(log_msg)
-    db.add_or_update_user(
-        user_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        invited_by=inviter_id,
-    )
+    if profile_buffer.is_known(user.id):
+        # Returning users can't be credited as referrals, so their refresh can wait.
+        profile_buffer.add(user.id, user.username, user.first_name)
+    else:
+        is_new_user = db.add_or_update_user(
+            user_id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            invited_by=inviter_id,
+        )
+        profile_buffer.remember(user.id, user.username, user.first_name)
+        if is_new_user and inviter_id:
+            referral_leaderboard.credit(inviter_id)
 
     active_event = db.get_active_event()
     if not active_event:
@@ -46,7 +58,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     existing_registration = db.get_user_registration_for_event(
         user.id, active_event["event_id"]
     )
-    if existing_registration:
+    # A user holding a seat reservation goes on to complete the registration.
+    if existing_registration and existing_registration["status"] != "reserved":
         status = existing_registration["status"]
         if status == "confirmed":
             ticket = existing_registration["ticket_code"]
@@ -63,6 +76,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
             )
         return ConversationHandler.END
 
+    if active_event["capacity"] and not existing_registration:
+        position = db.get_waitlist_position(user.id, active_event["event_id"])
+        if position:
+            await update.message.reply_text(
+                f"'{active_event['name']}' is fully booked. You are #{position} on the "
+                "waitlist, and we'll message you as soon as a seat opens up."
+            )
+            return ConversationHandler.END
+
     reply_keyboard = [["Yes, Register Me!", "No, thanks."]]
     await update.message.reply_text(
         f"Welcome to the Isocrates event bot!\n\n"
@@ -93,30 +115,52 @@ async def handle_choice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         await update.message.reply_text("Sorry, event registration just closed.")
         return ConversationHandler.END
 
+    hold_notice = ""
+    if active_event["capacity"]:
+        if not db.reserve_seat(user.id, active_event["event_id"], SEAT_HOLD_MINUTES):
+            position = db.get_waitlist_position(user.id, active_event["event_id"])
+            interactions_logger.info(
+                f"{get_user_info(user)} joined the waitlist at #{position}."
+            )
+            await update.message.reply_text(
+                f"Sorry, '{active_event['name']}' is fully booked. You are #{position} on "
+                "the waitlist, and we'll message you as soon as a seat opens up.",
+                reply_markup=ReplyKeyboardRemove(),
+            )
+            return ConversationHandler.END
+        hold_notice = f"Your seat is held for {SEAT_HOLD_MINUTES} minutes.\n\n"
+
     if active_event["is_paid"]:
         reply_keyboard = [["Yes", "No"]]
         await update.message.reply_text(
-            "Do you have a discount code?",
+            f"{hold_notice}Do you have a discount code?",
             reply_markup=ReplyKeyboardMarkup(
                 reply_keyboard, one_time_keyboard=True, resize_keyboard=True
             ),
         )
         return AWAITING_DISCOUNT_PROMPT
     else:  # Free event
-        db.create_registration(
+        reg_id = db.create_registration(
             user_id=user.id,
             event_id=active_event["event_id"],
             status="pending",
-            final_fee=0.0,
+            final_fee=0,
+        )
+        if not reg_id:
+            await _reply_seat_lost(update)
+            return ConversationHandler.END
+        ticket_code = db.update_registration_status(
+            reg_id, "confirmed", from_status="pending"
+        )
+        await send_ticket(
+            context.bot,
+            update.effective_chat.id,
+            reg_id,
+            ticket_code,
+            "Great! You are now registered for this free event. See you there!\n\n"
+            f"Your ticket code is: {ticket_code}",
+            reply_markup=ReplyKeyboardRemove(),
         )
-        reg_id = db.get_last_registration_id(user.id, active_event["event_id"])
-        if reg_id:
-            ticket_code = db.update_registration_status(reg_id, "confirmed")
-            await update.message.reply_text(
-                "Great! You are now registered for this free event. See you there!\n\n"
-                f"Your ticket code is: {ticket_code}",
-                reply_markup=ReplyKeyboardRemove(),
-            )
         return ConversationHandler.END
 
 
@@ -179,30 +223,37 @@ async def handle_discount_code(
     elif discount["discount_type"] == "fixed":
         final_fee = original_fee - discount["value"]
 
-    final_fee = max(0, final_fee)
+    final_fee = max(0, round(final_fee))  # Whole Toman
 
     context.user_data["final_fee"] = final_fee
     context.user_data["discount_code"] = code
     context.user_data["discount_code_id"] = discount["code_id"]
 
     if final_fee <= 0:
-        db.create_registration(
+        reg_id = db.create_registration(
             user_id=user.id,
             event_id=active_event["event_id"],
             status="pending",
-            final_fee=0.0,
+            final_fee=0,
             discount_code=code,
         )
+        if not reg_id:
+            await _reply_seat_lost(update)
+            return ConversationHandler.END
         db.use_discount_code(discount["code_id"])
-        reg_id = db.get_last_registration_id(user.id, active_event["event_id"])
-        if reg_id:
-            ticket_code = db.update_registration_status(reg_id, "confirmed")
-            await update.message.reply_text(
-                "✅ Your 100% discount code has been successfully applied!\n\n"
-                "You are now registered for this event. See you there!\n\n"
-                f"Your ticket code is: {ticket_code}",
-                reply_markup=ReplyKeyboardRemove(),
-            )
+        ticket_code = db.update_registration_status(
+            reg_id, "confirmed", from_status="pending"
+        )
+        await send_ticket(
+            context.bot,
+            update.effective_chat.id,
+            reg_id,
+            ticket_code,
+            "✅ Your 100% discount code has been successfully applied!\n\n"
+            "You are now registered for this event. See you there!\n\n"
+            f"Your ticket code is: {ticket_code}",
+            reply_markup=ReplyKeyboardRemove(),
+        )
         return ConversationHandler.END
 
     final_fee_str = format_toman(final_fee)
@@ -215,6 +266,20 @@ async def handle_discount_code(
     return AWAITING_RECEIPT
 
 
+async def _reply_seat_lost(update: Update, paid: bool = False):
+    """Tells a user whose seat hold ran out that the event filled up meanwhile."""
+    interactions_logger.info(
+        f"{get_user_info(update.effective_user)} lost their expired seat hold."
+    )
+    text = (
+        "Sorry, your seat hold expired and the event has filled up in the meantime. "
+        "Send /start to join the waitlist."
+    )
+    if paid:
+        text += " If you have already paid, please contact an admin."
+    await update.message.reply_text(text, reply_markup=ReplyKeyboardRemove())
+
+
 @retry_on_network_error
 async def handle_receipt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user
@@ -227,45 +292,101 @@ async def handle_receipt(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         f"{get_user_info(user)} submitted a receipt photo [FileID:{photo.file_id}]."
     )
 
-    db.create_registration(
+    # The exact same file was sent before: a resubmission or someone else's receipt.
+    original = db.find_receipt_by_unique_id(
+        photo.file_unique_id, user.id, active_event["event_id"]
+    )
+    if (
+        original
+        and original["user_id"] == user.id
+        and original["event_id"] == active_event["event_id"]
+        and original["status"] == "pending_verification"
+    ):
+        interactions_logger.info(
+            f"{get_user_info(user)} resubmitted the receipt of registration "
+            f"[ID:{original['registration_id']}]; ignored."
+        )
+        await update.message.reply_text(
+            "We already have this receipt. It is waiting for verification.",
+            reply_markup=ReplyKeyboardRemove(),
+        )
+        context.user_data.clear()
+        return ConversationHandler.END
+    duplicate_of = original["registration_id"] if original else None
+
+    if not db.create_registration(
         user_id=user.id,
         event_id=active_event["event_id"],
         status="pending_verification",
         final_fee=final_fee,
         discount_code=discount_code,
-    )
-    db.add_receipt_to_registration(
+    ):
+        await _reply_seat_lost(update, paid=True)
+        context.user_data.clear()
+        return ConversationHandler.END
+    registration_id = db.add_receipt_to_registration(
         user_id=user.id,
         event_id=active_event["event_id"],
         receipt_file_id=photo.file_id,
+        receipt_unique_id=photo.file_unique_id,
+        duplicate_of=duplicate_of,
     )
 
     if "discount_code_id" in context.user_data:
         db.use_discount_code(context.user_data["discount_code_id"])
 
-    # Send photo with details to admin chat
+    await update.message.reply_text(
+        "Thank you! Your receipt has been submitted for verification.",
+        reply_markup=ReplyKeyboardRemove(),
+    )
+
     caption = (
         f"New payment receipt for: '{active_event['name']}'\n"
         f"From User: {get_user_info(user)}\n"
         f"Fee Paid: {format_toman(final_fee)}\n"
         f"Discount Used: {discount_code or 'None'}"
     )
-    await context.bot.send_photo(
-        chat_id=ADMIN_CHAT_ID, photo=photo.file_id, caption=caption
-    )
-
-    # Send a separate, simple text notification for high visibility
-    notification_text = f"📢 New receipt from {user.full_name} (@{user.username}) requires verification."
-    await context.bot.send_message(chat_id=ADMIN_CHAT_ID, text=notification_text)
-
-    await update.message.reply_text(
-        "Thank you! Your receipt has been submitted for verification.",
-        reply_markup=ReplyKeyboardRemove(),
-    )
+    if duplicate_of:
+        caption += f"\n⚠️ Same file as registration {duplicate_of}"
+    sender = f"{user.full_name} (@{user.username})"
+    if registration_id:
+        receipts_in_check.add(registration_id)
+        context.application.create_task(
+            _submit_receipt(
+                context.application,
+                registration_id,
+                photo.file_id,
+                caption,
+                sender,
+                find_duplicates=not duplicate_of,
+            )
+        )
+    else:
+        admin_notifier.add_receipt(context.application, photo.file_id, caption, sender)
     context.user_data.clear()
     return ConversationHandler.END
 
 
+async def _submit_receipt(
+    application, registration_id, file_id, caption, sender, find_duplicates
+):
+    """
+    Archives a new receipt and checks it for near duplicates before the admins
+    can review it: the registration stays out of the review queue until then,
+    and the receipt goes out with the next admin digest afterwards.
+    """
+    duplicate_of = None
+    try:
+        duplicate_of = await process_receipt(
+            application.bot, registration_id, file_id, find_duplicates
+        )
+    finally:
+        receipts_in_check.discard(registration_id)
+        if duplicate_of:
+            caption += f"\n⚠️ Looks like the receipt of registration {duplicate_of}"
+        admin_notifier.add_receipt(application, file_id, caption, sender)
+
+
 @retry_on_network_error
 async def my_ticket(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
@@ -285,8 +406,13 @@ async def my_ticket(update: Update, context: ContextTypes.DEFAULT_TYPE):
     status = registration["status"]
     if status == "confirmed":
         ticket = registration["ticket_code"]
-        await update.message.reply_text(
-            f"You are confirmed for '{active_event['name']}'!\n\nYour ticket code is: {ticket}"
+        await send_ticket(
+            context.bot,
+            update.effective_chat.id,
+            registration["registration_id"],
+            ticket,
+            f"You are confirmed for '{active_event['name']}'!\n\nYour ticket code is: {ticket}",
+            qr_file_id=registration["ticket_qr_file_id"],
         )
     elif status == "pending_verification":
         await update.message.reply_text(
@@ -296,6 +422,10 @@ async def my_ticket(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             "Your registration for this event was rejected. Please contact an admin."
         )
+    elif status == "reserved":
+        await update.message.reply_text(
+            "A seat is held for you. Use /start to complete your registration."
+        )
 
 
 @retry_on_network_error
@@ -314,6 +444,22 @@ async def my_referral(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Could not retrieve your referral information.")
 
 
+@retry_on_network_error
+async def top_referrers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    interactions_logger.info(f"{get_user_info(user)} requested /topreferrers.")
+    text = format_leaderboard("🏆 Top Inviters", referral_leaderboard.top())
+    active_event = db.get_active_event()
+    if active_event:
+        event_entries = db.get_top_event_referrers(
+            active_event["event_id"], LEADERBOARD_SIZE
+        )
+        text += "\n\n" + format_leaderboard(
+            f"🎟️ Top Inviters for '{active_event['name']}'", event_entries
+        )
+    await update.message.reply_text(text)
+
+
 @retry_on_network_error
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
@@ -323,16 +469,23 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/start - Register for the active event.\n"
         "/myticket - View your ticket for the active event.\n"
         "/myreferral - Get your unique link to invite friends.\n"
+        "/topreferrers - See who has invited the most people.\n"
         "/cancel - Stop any active process, like registration.\n"
         "/help - Shows this help message."
     )
     admin_help_text = (
         "\n\n--- 👑 ADMIN HELP ---\n"
         "You have access to all user commands plus:\n\n"
-        "/admin - Open the main admin control panel."
+        "/admin - Open the main admin control panel.\n"
+        "/verify <code> - Look up who a ticket code belongs to.\n"
+        "/checkin - Start checking in tickets at the door.\n"
+        "/rebuildstats - Recompute dashboard statistics and check for drift.\n"
+        "/floodstats - Show flood control counters and top offenders.\n"
+        "/floodexempt <user_id> - Toggle a user's flood control exemption.\n"
+        "/reloadconfig - Reload admins, timeouts and retries from .env."
     )
 
-    if user.id in ADMIN_USER_IDS:
+    if user.id in get_settings().admin_user_ids:
         full_help_text = user_help_text + admin_help_text
         await update.message.reply_text(full_help_text)
     else:
@@ -0,0 +1,78 @@
+import heapq
+import logging
+import database as db
+from config import LEADERBOARD_SIZE
+
+app_logger = logging.getLogger("app")
+
+
+class ReferralLeaderboard:
+    """
+    Keeps the overall top-K inviters in a small min-heap. It is loaded once from
+    the referral_count index and then updated incrementally whenever an inviter
+    is credited, so reads never touch the users table.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        # user_id -> row dict; None until first loaded from the database.
+        self._entries = None
+        self._heap = []  # (referral_count, user_id), smallest count first
+
+    def _load(self):
+        rows = db.get_top_referrers(self.size)
+        self._entries = {row["user_id"]: dict(row) for row in rows}
+        self._rebuild_heap()
+        app_logger.info(f"Referral leaderboard loaded with {len(rows)} entries.")
+
+    def _rebuild_heap(self):
+        self._heap = [
+            (entry["referral_count"], user_id)
+            for user_id, entry in self._entries.items()
+        ]
+        heapq.heapify(self._heap)
+
+    def credit(self, user_id: int):
+        """Records one more referral for `user_id` after it was written to the database."""
+        if self._entries is None:
+            return  # Not loaded yet; the first read will pick the credit up from the index.
+
+        entry = self._entries.get(user_id)
+        if entry:
+            entry["referral_count"] += 1
+            self._rebuild_heap()
+            return
+
+        row = db.get_referrer(user_id)
+        if row is None:
+            return
+        if len(self._heap) >= self.size:
+            if row["referral_count"] <= self._heap[0][0]:
+                return
+            _, evicted_id = heapq.heappop(self._heap)
+            del self._entries[evicted_id]
+        self._entries[user_id] = dict(row)
+        heapq.heappush(self._heap, (row["referral_count"], user_id))
+
+    def top(self) -> list:
+        """Returns the leaderboard entries, highest referral count first."""
+        if self._entries is None:
+            self._load()
+        return [
+            self._entries[user_id]
+            for _, user_id in heapq.nlargest(self.size, self._heap)
+        ]
+
+
+def format_leaderboard(title: str, entries) -> str:
+    """Formats leaderboard rows as a numbered list under `title`."""
+    if not entries:
+        return f"{title}\nNo referrals yet."
+    lines = [title]
+    for rank, entry in enumerate(entries, start=1):
+        name = f"@{entry['username']}" if entry["username"] else entry["first_name"]
+        lines.append(f"{rank}. {name} - {entry['referral_count']}")
+    return "\n".join(lines)
+
+
+referral_leaderboard = ReferralLeaderboard(LEADERBOARD_SIZE)
@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+import time
+from config import RESTART_EXIT_CODE, SHUTDOWN_DEADLINE
+from .admin_notifier import admin_notifier
+from .checkin import check_in_desk
+from .utils import unsent_bulk_messages
+from .write_buffer import profile_buffer
+
+app_logger = logging.getLogger("app")
+
+
+class GracefulShutdown:
+    """
+    Controlled exit for the bot process. request() stops fetching updates, after
+    which run_polling drains the update queue and background tasks (bulk sends
+    included), post_stop delivers the admin digest and post_shutdown flushes the
+    write-behind buffers. If all that takes longer than the deadline, the process
+    exits anyway, reporting what was dropped. Either way, the exit code tells the
+    watchdog why the bot stopped.
+    """
+
+    def __init__(self):
+        self.exit_code = 0
+        self.reason = None
+        self.started_at = None
+        self._application = None
+        self._deadline_timer = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self.started_at is not None
+
+    def request(
+        self,
+        application,
+        reason: str,
+        exit_code: int = RESTART_EXIT_CODE,
+        deadline: float = SHUTDOWN_DEADLINE,
+    ):
+        """Starts a graceful shutdown. Later requests are ignored."""
+        if self.in_progress:
+            return
+        self.started_at = time.monotonic()
+        self.reason = reason
+        self.exit_code = exit_code
+        self._application = application
+        app_logger.warning(
+            f"Graceful shutdown requested ({reason}). Draining "
+            f"{application.update_queue.qsize()} queued updates with a {deadline}s deadline."
+        )
+        self._deadline_timer = threading.Timer(deadline, self._deadline_exceeded)
+        self._deadline_timer.daemon = True
+        self._deadline_timer.start()
+        application.stop_running()
+
+    def _pending_work(self) -> dict:
+        work = {
+            "buffered profiles": profile_buffer.pending_count,
+            "queued check-ins": check_in_desk.pending_count,
+            "unsent bulk messages": unsent_bulk_messages(),
+            "undelivered admin notifications": admin_notifier.pending_count,
+        }
+        if self._application is not None:
+            work["unprocessed updates"] = self._application.update_queue.qsize()
+        return work
+
+    @staticmethod
+    def _describe(work: dict) -> str:
+        dropped = [f"{count} {name}" for name, count in work.items() if count]
+        return ", ".join(dropped) if dropped else "nothing"
+
+    def _deadline_exceeded(self):
+        """Runs on the timer thread when draining took too long."""
+        elapsed = time.monotonic() - self.started_at
+        app_logger.critical(
+            f"Shutdown deadline exceeded after {elapsed:.1f}s. "
+            f"Exiting with code {self.exit_code}; dropped: {self._describe(self._pending_work())}."
+        )
+        logging.shutdown()  # Flush the log files before the hard exit
+        os._exit(self.exit_code)
+
+    def finish(self) -> int:
+        """Called once run_polling has returned. Logs the outcome and returns the exit code."""
+        if self._deadline_timer:
+            self._deadline_timer.cancel()
+        if self.in_progress:
+            elapsed = time.monotonic() - self.started_at
+            app_logger.info(
+                f"Graceful shutdown ({self.reason}) finished in {elapsed:.2f}s; "
+                f"dropped: {self._describe(self._pending_work())}."
+            )
+        return self.exit_code
+
+
+graceful_shutdown = GracefulShutdown()
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from datetime import timedelta
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from config import (
+    OUTBOUND_BURST,
+    OUTBOUND_CONCURRENCY,
+    OUTBOUND_RATE,
+    OUTBOUND_RETRY_AFTER_ATTEMPTS,
+    OUTBOUND_WEIGHTS,
+)
+
+network_logger = logging.getLogger("network")
+
+# Priority classes, passed to any bot method as `rate_limit_args`.
+INTERACTIVE = "interactive"  # Replies to a user's own action; the default
+ADMIN = "admin"  # Admin chat notifications and messages caused by admin decisions
+BULK = "bulk"  # Broadcasts and reminders
+PRIORITY_CLASSES = (INTERACTIVE, ADMIN, BULK)
+
+# Calls that Telegram doesn't count against the message limits.
+_UNMETERED_PREFIXES = ("get", "answerCallbackQuery", "deleteWebhook")
+
+
+class PriorityRateLimiter(BaseRateLimiter[str]):
+    """
+    Central dispatcher for outgoing Bot API calls. Each call belongs to a
+    priority class (INTERACTIVE unless the caller passes `rate_limit_args`).
+    A class has its own concurrency limit, so a reminder blast can only occupy
+    a few connections, and all classes draw from one token bucket of
+    OUTBOUND_RATE per second. Whenever several classes are waiting, tokens are
+    handed out by weighted fair queueing (stride scheduling) on
+    OUTBOUND_WEIGHTS: a user waits for at most a few bulk sends, while bulk still
+    progresses under a steady stream of interactive traffic. A RetryAfter
+    from flood control pauses the whole bucket before the call is retried.
+    getUpdates never reaches the limiter.
+    """
+
+    def __init__(
+        self,
+        rate: float = OUTBOUND_RATE,
+        burst: int = OUTBOUND_BURST,
+        weights: dict = OUTBOUND_WEIGHTS,
+        concurrency: dict = OUTBOUND_CONCURRENCY,
+        retry_after_attempts: int = OUTBOUND_RETRY_AFTER_ATTEMPTS,
+    ):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._retry_after_attempts = retry_after_attempts
+        self._strides = {name: 1 / weights[name] for name in PRIORITY_CLASSES}
+        self._passes = dict.fromkeys(PRIORITY_CLASSES, 0.0)
+        self._virtual_time = 0.0
+        self._semaphores = {
+            name: asyncio.Semaphore(concurrency[name]) for name in PRIORITY_CLASSES
+        }
+        self._waiting = {name: deque() for name in PRIORITY_CLASSES}
+        self._wakeup = asyncio.Event()
+        self._dispatcher = None
+        self.sent = Counter()  # Calls made per class
+
+    async def initialize(self) -> None:
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    def waiting(self, priority: str) -> int:
+        """Returns how many calls of a class are waiting for a token."""
+        return sum(not waiter.done() for waiter in self._waiting[priority])
+
+    def _refill(self, now: float):
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._refilled_at) * self._rate
+        )
+        self._refilled_at = now
+
+    def _next_class(self) -> str | None:
+        """The waiting class with the lowest pass; ties go to the higher priority."""
+        best = None
+        for name in PRIORITY_CLASSES:
+            queue = self._waiting[name]
+            while queue and queue[0].done():  # Cancelled callers
+                queue.popleft()
+            if queue and (best is None or self._passes[name] < self._passes[best]):
+                best = name
+        return best
+
+    async def _dispatch(self):
+        while True:
+            priority = self._next_class()
+            if priority is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            self._refill(now)
+            delay = max(self._paused_until - now, (1 - self._tokens) / self._rate)
+            if delay > 0:
+                # Pick again afterwards: a more urgent call may arrive meanwhile.
+                await asyncio.sleep(delay)
+                continue
+
+            self._tokens -= 1
+            self._virtual_time = self._passes[priority]
+            self._passes[priority] += self._strides[priority]
+            self._waiting[priority].popleft().set_result(None)
+
+    async def _acquire(self, priority: str):
+        queue = self._waiting[priority]
+        if not queue:
+            # A class coming back from idle doesn't get to spend credit it saved up.
+            self._passes[priority] = max(self._passes[priority], self._virtual_time)
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        self._wakeup.set()
+        await waiter
+
+    async def process_request(
+        self, callback, args, kwargs, endpoint, data, rate_limit_args
+    ):
+        priority = rate_limit_args or INTERACTIVE
+        metered = not endpoint.startswith(_UNMETERED_PREFIXES)
+        async with self._semaphores[priority]:
+            for attempt in range(self._retry_after_attempts + 1):
+                if metered:
+                    await self._acquire(priority)
+                try:
+                    result = await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    if attempt == self._retry_after_attempts:
+                        raise
+                    retry_after = e.retry_after
+                    if isinstance(retry_after, timedelta):
+                        retry_after = retry_after.total_seconds()
+                    self._paused_until = max(
+                        self._paused_until, time.monotonic() + retry_after
+                    )
+                    network_logger.warning(
+                        f"Flood control on {endpoint} ({priority}): pausing all sends "
+                        f"for {retry_after}s. Retry {attempt + 1}/{self._retry_after_attempts}."
+                    )
+                    continue
+                self.sent[priority] += 1
+                return result
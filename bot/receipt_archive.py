@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import logging
+import os
+from telegram.error import TelegramError
+import database as db
+from config import (
+    RECEIPT_ARCHIVE_CONCURRENCY,
+    RECEIPT_ARCHIVE_DIR,
+    RECEIPT_ARCHIVE_MAX_SIZE,
+    RECEIPT_MAX_FILE_SIZE,
+)
+
+app_logger = logging.getLogger("app")
+
+
+class ReceiptArchive:
+    """
+    Local, content-addressed copies of receipt photos. Each file is stored once
+    under its SHA-256 (receipts/ab/abcd...jpg), however many registrations use
+    it, and its path is recorded on the registration. Downloads run at most
+    `concurrency` at a time. Files over `max_file_size` are not downloaded, and
+    once the archive holds `max_size` bytes new files are no longer written;
+    existing copies are never evicted, since they are payment proof.
+    """
+
+    def __init__(
+        self, directory: str, concurrency: int, max_file_size: int, max_size: int
+    ):
+        self.directory = directory
+        self.max_file_size = max_file_size
+        self.max_size = max_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._size = None  # Bytes stored, measured on first use
+        self._given_up = set()  # Registrations whose receipt can't be archived
+
+    def _path_for(self, digest: str, extension: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest + extension)
+
+    def _stored_size(self) -> int:
+        if self._size is None:
+            self._size = 0
+            if os.path.isdir(self.directory):
+                for folder in os.scandir(self.directory):
+                    if folder.is_dir():
+                        self._size += sum(
+                            entry.stat().st_size for entry in os.scandir(folder.path)
+                        )
+        return self._size
+
+    def _write(self, image: bytes, extension: str) -> str | None:
+        """Stores a blob unless an identical one exists. Runs in a thread."""
+        path = self._path_for(hashlib.sha256(image).hexdigest(), extension)
+        if os.path.exists(path):
+            return path
+        if self._stored_size() + len(image) > self.max_size:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(image)
+        os.replace(temporary, path)  # Readers never see a partial file
+        self._size += len(image)
+        return path
+
+    async def store(self, bot, registration_id: int, file_id: str) -> bytes | None:
+        """
+        Downloads a registration's receipt and archives it. Returns the image, also
+        when the archive is full, or None if it could not be downloaded.
+        """
+        async with self._semaphore:
+            try:
+                file = await bot.get_file(file_id)
+                if file.file_size and file.file_size > self.max_file_size:
+                    self._given_up.add(registration_id)
+                    app_logger.warning(
+                        f"Receipt of registration [ID:{registration_id}] is "
+                        f"{file.file_size:,} bytes; not archived."
+                    )
+                    return None
+                image = bytes(await file.download_as_bytearray())
+            except TelegramError as e:
+                app_logger.warning(
+                    f"Could not download the receipt of registration [ID:{registration_id}]: {e}"
+                )
+                return None
+
+        extension = os.path.splitext(file.file_path or "")[1] or ".jpg"
+        try:
+            path = await asyncio.to_thread(self._write, image, extension)
+        except OSError as e:
+            app_logger.error(f"Could not archive a receipt: {e}")
+            return image
+        if path is None:
+            self._given_up.add(registration_id)
+            app_logger.warning(
+                f"Receipt archive is full ({self._size:,} bytes); "
+                f"registration [ID:{registration_id}] not archived."
+            )
+        else:
+            db.set_receipt_local_path(registration_id, path)
+        return image
+
+    def pending_backfill(self, limit: int):
+        """Receipts still missing from the archive, skipping ones that can't be stored."""
+        rows = db.get_unarchived_receipts(limit + len(self._given_up))
+        return [row for row in rows if row["registration_id"] not in self._given_up][
+            :limit
+        ]
+
+    @staticmethod
+    def read(path: str | None) -> bytes | None:
+        """Returns an archived receipt, or None if there is no local copy."""
+        if not path:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+receipt_archive = ReceiptArchive(
+    RECEIPT_ARCHIVE_DIR,
+    RECEIPT_ARCHIVE_CONCURRENCY,
+    RECEIPT_MAX_FILE_SIZE,
+    RECEIPT_ARCHIVE_MAX_SIZE,
+)
@@ -0,0 +1,98 @@
+import io
+import logging
+import database as db
+from config import RECEIPT_ARCHIVE_BACKFILL_BATCH, RECEIPT_PHASH_MAX_DISTANCE
+from .receipt_archive import receipt_archive
+from .workers import run_in_process_pool
+
+try:
+    from PIL import Image
+except ImportError:  # Optional dependency; near-duplicate checks are skipped.
+    Image = None
+
+app_logger = logging.getLogger("app")
+
+# Registrations whose new receipt is still being archived and checked for near
+# duplicates. The admin review queue leaves them out until the check is done.
+receipts_in_check = set()
+
+
+def receipt_dhash(image_bytes: bytes) -> int:
+    """
+    Computes a 64-bit difference hash of an image: each bit says whether a pixel
+    of the 9x8 grayscale thumbnail is brighter than its right neighbour. Resized
+    or recompressed copies of a screenshot stay within a few bits of each other.
+    Runs in the process pool.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    phash = 0
+    for row in range(8):
+        for column in range(8):
+            left = pixels[row * 9 + column]
+            phash = (phash << 1) | (left > pixels[row * 9 + column + 1])
+    return phash
+
+
+async def check_near_duplicates(registration_id: int, image: bytes) -> int | None:
+    """
+    Hashes a receipt photo and flags its registration if an earlier receipt looks
+    the same. Returns the ID of the registration it looks like, if any.
+    """
+    if Image is None:
+        return None
+    try:
+        phash = await run_in_process_pool(receipt_dhash, image)
+    except OSError as e:
+        app_logger.warning(
+            f"Could not hash the receipt of registration [ID:{registration_id}]: {e}"
+        )
+        return None
+
+    matches = db.find_similar_receipts(
+        phash, RECEIPT_PHASH_MAX_DISTANCE, registration_id
+    )
+    duplicate_of = matches[0][0] if matches else None
+    db.set_receipt_phash(registration_id, phash, duplicate_of)
+    if duplicate_of:
+        app_logger.warning(
+            f"Receipt of registration [ID:{registration_id}] looks like the one of "
+            f"registration [ID:{duplicate_of}] ({matches[0][1]} bits apart)."
+        )
+    return duplicate_of
+
+
+async def process_receipt(
+    bot, registration_id: int, file_id: str, find_duplicates: bool = True
+) -> int | None:
+    """
+    Archives a new receipt and checks it for near duplicates, downloading it
+    only once. Runs in the background after the user has been answered. Returns
+    the ID of the registration whose receipt it looks like, if any.
+    """
+    image = await receipt_archive.store(bot, registration_id, file_id)
+    if image is not None and find_duplicates:
+        return await check_near_duplicates(registration_id, image)
+    return None
+
+
+def pending_review(limit: int):
+    """
+    The oldest registrations awaiting verification, up to `limit`, leaving out
+    the ones whose receipt is still being checked for near duplicates.
+    """
+    rows = db.get_pending_registrations(limit + len(receipts_in_check))
+    return [row for row in rows if row["registration_id"] not in receipts_in_check][
+        :limit
+    ]
+
+
+async def archive_missing_receipts(context):
+    """Job queue callback that archives receipts whose download failed or predates the archive."""
+    for row in receipt_archive.pending_backfill(RECEIPT_ARCHIVE_BACKFILL_BATCH):
+        await process_receipt(
+            context.bot,
+            row["registration_id"],
+            row["receipt_file_id"],
+            find_duplicates=bool(row["needs_phash"]),
+        )
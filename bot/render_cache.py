@@ -0,0 +1,31 @@
+import database as db
+
+
+class ScreenCache:
+    """
+    Memoizes rendered admin screens as (text, reply_markup) pairs, keyed by screen
+    name and entity id. Each entry remembers the data versions of the tables it
+    was built from and is only rebuilt after one of those tables was written, so
+    navigating back and forth through unchanged screens costs no queries.
+    """
+
+    def __init__(self):
+        self._screens = {}  # (screen, entity_id) -> (data_version, rendered)
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, screen: str, entity_id, tables, render):
+        """Returns the cached rendering of a screen, calling `render()` if it is stale."""
+        version = db.get_data_version(*tables)
+        cached = self._screens.get((screen, entity_id))
+        if cached and cached[0] == version:
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        rendered = render()
+        self._screens[(screen, entity_id)] = (version, rendered)
+        return rendered
+
+
+screen_cache = ScreenCache()
@@ -0,0 +1,34 @@
+import dataclasses
+import logging
+from config import Settings, get_settings, reload_settings
+
+app_logger = logging.getLogger("app")
+
+
+def reload_runtime_settings() -> list[str]:
+    """
+    Reloads the settings from .env. Everything that uses them reads
+    get_settings() at call time, the send timeouts included (see
+    transport.SettingsTimeoutRequest), so they apply from the next use on.
+    Returns the names of the settings that changed. Raises ValueError, keeping
+    the old settings, if the new ones are invalid.
+    """
+    old = get_settings()
+    new = reload_settings()
+    changed = [
+        field.name
+        for field in dataclasses.fields(Settings)
+        if getattr(old, field.name) != getattr(new, field.name)
+    ]
+    app_logger.info(
+        f"Settings reloaded. Changed: {', '.join(changed) if changed else 'nothing'}."
+    )
+    return changed
+
+
+def handle_sighup():
+    """Signal handler: reloads the settings, logging instead of raising on errors."""
+    try:
+        reload_runtime_settings()
+    except ValueError as e:
+        app_logger.error(f"Settings reload on SIGHUP rejected: {e}")
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from telegram.error import TelegramError
+from config import (
+    ALLOWED_UPDATES,
+    POLLING_BACKOFF_BASE,
+    POLLING_BACKOFF_MAX,
+    POLLING_FAILURE_THRESHOLD,
+    POLLING_FAILURE_WINDOW,
+    POLLING_RECOVERY_ATTEMPTS,
+)
+from .lifecycle import graceful_shutdown
+
+network_logger = logging.getLogger("network")
+
+
+class PollingSupervisor:
+    """
+    Keeps update polling alive without restarting the process. When polling
+    errors pile up (POLLING_FAILURE_THRESHOLD within POLLING_FAILURE_WINDOW
+    seconds) or the polling loop is found dead, the supervisor stops the updater,
+    rebuilds the getUpdates HTTP client, checks the rebuilt connection with a
+    short getUpdates call and restarts polling, backing off with jitter between
+    attempts. The updater keeps its last update offset, so nothing is fetched
+    twice or skipped, and the Application with its conversations, caches and
+    pools stays as it is. After POLLING_RECOVERY_ATTEMPTS failed rebuilds it
+    falls back to a graceful restart.
+    """
+
+    def __init__(self):
+        self._failures = deque()  # Monotonic times of recent polling errors
+        self._recovering = False
+        self._get_updates_request = None
+        self.recoveries = 0
+
+    def watch(self, application, get_updates_request):
+        """
+        Supervises the application's polling. Failed getUpdates calls are
+        reported by the request itself (see transport.GetUpdatesRequest), so
+        errors from handlers, jobs or sends never count, and it is the one
+        client rebuilt during recovery.
+        """
+        self._get_updates_request = get_updates_request
+        get_updates_request.on_network_error = lambda error: self.record_failure(
+            application, error
+        )
+
+    @staticmethod
+    def _error_callback(application):
+        # Same routing as run_polling: polling errors are logged by the error handler.
+        def error_callback(exc: TelegramError) -> None:
+            application.create_task(application.process_error(error=exc, update=None))
+
+        return error_callback
+
+    async def start_polling(self, application):
+        """Starts polling the way run_polling does, keeping any pending updates."""
+        await application.updater.start_polling(
+            drop_pending_updates=False,
+            allowed_updates=ALLOWED_UPDATES,
+            error_callback=self._error_callback(application),
+        )
+
+    def record_failure(self, application, error: Exception):
+        """Called for every network error raised by getUpdates."""
+        now = time.monotonic()
+        self._failures.append(now)
+        while self._failures and now - self._failures[0] > POLLING_FAILURE_WINDOW:
+            self._failures.popleft()
+        if len(self._failures) >= POLLING_FAILURE_THRESHOLD:
+            self.start_recovery(
+                application, f"{len(self._failures)} polling errors, last: {error}"
+            )
+
+    def start_recovery(self, application, reason: str):
+        if self._recovering or graceful_shutdown.in_progress:
+            return
+        self._recovering = True
+        application.create_task(self._recover(application, reason))
+
+    async def _rebuild_transport(self):
+        # HTTPXRequest.initialize() creates a fresh client once the old one is
+        # closed. Sends keep their own client, so replies in flight are untouched.
+        await self._get_updates_request.shutdown()
+        await self._get_updates_request.initialize()
+
+    async def _recover(self, application, reason: str):
+        started = time.monotonic()
+        network_logger.error(
+            f"Polling is failing ({reason}). Rebuilding the transport."
+        )
+        try:
+            if application.updater.running:
+                try:
+                    await application.updater.stop()
+                except TelegramError as e:
+                    # Confirming the last offset failed; the updater still remembers it.
+                    network_logger.warning(f"Error while stopping the updater: {e}")
+
+            for attempt in range(1, POLLING_RECOVERY_ATTEMPTS + 1):
+                backoff = min(
+                    POLLING_BACKOFF_MAX, POLLING_BACKOFF_BASE * 2 ** (attempt - 1)
+                )
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+                if not application.running or graceful_shutdown.in_progress:
+                    return
+                try:
+                    await self._rebuild_transport()
+                    # Goes through the rebuilt client; without an offset it
+                    # confirms nothing, so the updater still fetches these.
+                    await application.bot.get_updates(timeout=0, limit=1)
+                    await self.start_polling(application)
+                except TelegramError as e:
+                    network_logger.warning(
+                        f"Polling recovery attempt {attempt}/{POLLING_RECOVERY_ATTEMPTS} failed: {e}"
+                    )
+                    continue
+
+                self.recoveries += 1
+                self._failures.clear()
+                network_logger.info(
+                    f"Polling recovered after {attempt} attempt(s) in "
+                    f"{time.monotonic() - started:.1f}s."
+                )
+                return
+
+            network_logger.critical(
+                f"Polling could not be recovered after {POLLING_RECOVERY_ATTEMPTS} attempts."
+            )
+            graceful_shutdown.request(
+                application, reason="polling could not be recovered"
+            )
+        finally:
+            self._recovering = False
+
+    async def check_polling(self, context):
+        """Job queue callback that restarts a polling loop that died on its own."""
+        application = context.application
+        if application.running and not application.updater.running:
+            self.start_recovery(application, "the polling loop is not running")
+
+
+polling_supervisor = PollingSupervisor()
@@ -0,0 +1,41 @@
+import io
+import logging
+import database as db
+from .workers import run_in_process_pool
+
+try:
+    import qrcode
+except ImportError:  # Optional dependency; tickets fall back to plain text.
+    qrcode = None
+
+app_logger = logging.getLogger("app")
+
+
+def render_ticket_qr(ticket_code: str) -> bytes:
+    """Renders a ticket code as a PNG QR code. Runs in the process pool."""
+    image = qrcode.make(ticket_code, box_size=10, border=4)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def send_ticket(
+    bot, chat_id, registration_id, ticket_code, text, qr_file_id=None, **kwargs
+):
+    """
+    Sends `text` as the caption of the ticket's QR code. Each QR image is rendered
+    and uploaded only once; its Telegram file_id is stored on the registration and
+    passed back in as `qr_file_id` to reuse it. Extra kwargs go to the send call.
+    """
+    if qr_file_id:
+        return await bot.send_photo(
+            chat_id=chat_id, photo=qr_file_id, caption=text, **kwargs
+        )
+    if qrcode is None:
+        return await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+
+    image = await run_in_process_pool(render_ticket_qr, ticket_code)
+    message = await bot.send_photo(chat_id=chat_id, photo=image, caption=text, **kwargs)
+    db.set_ticket_qr_file_id(registration_id, message.photo[-1].file_id)
+    app_logger.info(f"Uploaded QR ticket for registration [ID:{registration_id}].")
+    return message
@@ -0,0 +1,138 @@
+import httpx
+from telegram.error import NetworkError
+from telegram.request import BaseRequest, HTTPXRequest
+from config import (
+    CONNECT_TIMEOUT,
+    GET_UPDATES_HTTP_VERSION,
+    GET_UPDATES_POOL_SIZE,
+    KEEPALIVE_CONNECTIONS,
+    KEEPALIVE_EXPIRY,
+    READ_TIMEOUT,
+    SEND_HTTP_VERSION,
+    SEND_POOL_SIZE,
+    SEND_POOL_TIMEOUT,
+    get_settings,
+)
+
+
+class SettingsTimeoutRequest(HTTPXRequest):
+    """
+    An HTTPXRequest that takes its default connect and read timeouts from the
+    current settings on every call, so a reload (/reloadconfig or SIGHUP)
+    applies to the next request without touching the HTTP client, and still
+    does after the client is rebuilt. Timeouts a caller passes explicitly win.
+    """
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data=None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ) -> tuple[int, bytes]:
+        settings = get_settings()
+        if read_timeout is BaseRequest.DEFAULT_NONE:
+            read_timeout = settings.read_timeout
+        if connect_timeout is BaseRequest.DEFAULT_NONE:
+            connect_timeout = settings.connect_timeout
+        return await super().do_request(
+            url,
+            method,
+            request_data,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            connect_timeout=connect_timeout,
+            pool_timeout=pool_timeout,
+        )
+
+
+class GetUpdatesRequest(HTTPXRequest):
+    """
+    An HTTPXRequest that passes every network error it raises to
+    `on_network_error` before raising it. PTB uses this request for getUpdates
+    only, so the callback sees exactly the failed polls, whether polling was
+    started by run_polling or by the polling supervisor.
+
+    Like SettingsTimeoutRequest, it takes its default connect timeout from the
+    current settings on every call. The read timeout is left alone: PTB
+    passes one explicitly, adding the long polling timeout to it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_network_error = None
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data=None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ) -> tuple[int, bytes]:
+        if connect_timeout is BaseRequest.DEFAULT_NONE:
+            connect_timeout = get_settings().connect_timeout
+        try:
+            return await super().do_request(
+                url,
+                method,
+                request_data,
+                read_timeout=read_timeout,
+                write_timeout=write_timeout,
+                connect_timeout=connect_timeout,
+                pool_timeout=pool_timeout,
+            )
+        except NetworkError as e:
+            if self.on_network_error:
+                self.on_network_error(e)
+            raise
+
+
+def build_send_request(
+    pool_size: int = SEND_POOL_SIZE,
+    keepalive_connections: int = KEEPALIVE_CONNECTIONS,
+    keepalive_expiry: float = KEEPALIVE_EXPIRY,
+    http_version: str = SEND_HTTP_VERSION,
+    pool_timeout: float = SEND_POOL_TIMEOUT,
+) -> HTTPXRequest:
+    """
+    The request object for every Bot API call except getUpdates. Its timeouts
+    are the reloadable ones (see SettingsTimeoutRequest). The arguments
+    default to the config values and exist so the transport benchmark can try
+    other ones.
+    """
+    return SettingsTimeoutRequest(
+        connection_pool_size=pool_size,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        pool_timeout=pool_timeout,
+        http_version=http_version,
+        httpx_kwargs={
+            "limits": httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            )
+        },
+    )
+
+
+def build_get_updates_request(
+    pool_size: int = GET_UPDATES_POOL_SIZE,
+    http_version: str = GET_UPDATES_HTTP_VERSION,
+) -> HTTPXRequest:
+    """
+    The request object used only for getUpdates. Its connect timeout is the
+    reloadable one. PTB adds the long polling timeout to its read timeout, so
+    that keeps PTB's short default.
+    """
+    return GetUpdatesRequest(
+        connection_pool_size=pool_size,
+        connect_timeout=CONNECT_TIMEOUT,
+        http_version=http_version,
+    )
@@ -1,9 +1,12 @@
 import asyncio
 import logging
+from datetime import datetime
 from functools import wraps
+from zoneinfo import ZoneInfo
 from telegram import User
 from telegram.error import NetworkError, TimedOut
-from config import MAX_RETRIES, RETRY_DELAY, ADMIN_USER_IDS
+from config import EVENT_TIME_FORMAT, get_settings
+from .outbound import BULK
 
 network_logger = logging.getLogger("network")
 interactions_logger = logging.getLogger("interactions")
@@ -31,6 +34,39 @@ def format_toman(amount: float) -> str:
     return f"{int(amount):,} Toman"
 
 
+def parse_event_time(text: str, timezone: str) -> int:
+    """
+    Parses an event time typed in EVENT_TIME_FORMAT as wall-clock time in
+    `timezone` and returns it as Unix time. Raises ValueError if it doesn't parse.
+    """
+    moment = datetime.strptime(text.strip(), EVENT_TIME_FORMAT)
+    return int(moment.replace(tzinfo=ZoneInfo(timezone)).timestamp())
+
+
+def format_event_time(
+    starts_at: int | None, timezone: str | None, show_timezone: bool = True
+) -> str:
+    """Formats an event's start time in the timezone it was entered in."""
+    if starts_at is None:
+        return "Not set"
+    timezone = timezone or "UTC"
+    text = datetime.fromtimestamp(starts_at, ZoneInfo(timezone)).strftime(
+        EVENT_TIME_FORMAT
+    )
+    return f"{text} ({timezone})" if show_timezone else text
+
+
+def parse_reminder_hours(text: str) -> list[int]:
+    """
+    Parses comma-separated reminder hours like '24, 1' into a sorted list of
+    distinct positive integers. Raises ValueError on anything else.
+    """
+    hours = {int(part) for part in text.split(",") if part.strip()}
+    if not hours or min(hours) <= 0:
+        raise ValueError(f"Invalid reminder hours: '{text}'")
+    return sorted(hours, reverse=True)
+
+
 def admin_only(func):
     """
     A decorator to restrict access to a handler to only authorized admin users.
@@ -39,7 +75,7 @@ def admin_only(func):
     @wraps(func)
     async def wrapper(update, context, *args, **kwargs):
         user = update.effective_user
-        if user and user.id in ADMIN_USER_IDS:
+        if user and user.id in get_settings().admin_user_ids:
             return await func(update, context, *args, **kwargs)
         else:
             interactions_logger.warning(
@@ -64,21 +100,67 @@ def retry_on_network_error(func):
 
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        for attempt in range(MAX_RETRIES):
+        settings = get_settings()
+        max_retries = settings.max_retries
+        for attempt in range(max_retries):
             try:
                 return await func(*args, **kwargs)
             except (NetworkError, TimedOut) as e:
-                if attempt + 1 == MAX_RETRIES:
+                if attempt + 1 == max_retries:
                     network_logger.critical(
-                        f"Function '{func.__name__}' failed after {MAX_RETRIES} attempts due to network error: {e}",
+                        f"Function '{func.__name__}' failed after {max_retries} attempts due to network error: {e}",
                         exc_info=True,
                     )
                     raise
 
-                delay = RETRY_DELAY * (2**attempt)
+                delay = settings.retry_delay * (2**attempt)
                 network_logger.warning(
-                    f"Network error in '{func.__name__}': {e}. Retrying in {delay:.2f} seconds... (Attempt {attempt + 1}/{MAX_RETRIES})"
+                    f"Network error in '{func.__name__}': {e}. Retrying in {delay:.2f} seconds... (Attempt {attempt + 1}/{max_retries})"
                 )
                 await asyncio.sleep(delay)
 
     return wrapper
+
+
+# Messages handed to send_bulk_messages that have not finished sending yet.
+_unsent_bulk_messages = 0
+
+
+def unsent_bulk_messages() -> int:
+    """Returns how many bulk messages are still queued or in flight."""
+    return _unsent_bulk_messages
+
+
+def _bulk_message_done(task):
+    global _unsent_bulk_messages
+    _unsent_bulk_messages -= 1
+
+
+async def send_bulk_messages(bot, messages, priority: str = BULK) -> int:
+    """
+    Fans out (chat_id, text) messages concurrently. Pacing is left to the
+    bot's rate limiter, which sends them in the given priority class so they
+    never hold up replies to users. Returns the number of messages that failed.
+    """
+    global _unsent_bulk_messages
+    tasks = []
+    _unsent_bulk_messages += len(messages)
+    try:
+        for chat_id, text in messages:
+            task = asyncio.create_task(
+                bot.send_message(chat_id=chat_id, text=text, rate_limit_args=priority)
+            )
+            task.add_done_callback(_bulk_message_done)
+            tasks.append(task)
+    finally:
+        # Messages that were never started, e.g. because the sender was cancelled.
+        _unsent_bulk_messages -= len(messages) - len(tasks)
+
+    failed = 0
+    for (chat_id, _), result in zip(
+        messages, await asyncio.gather(*tasks, return_exceptions=True)
+    ):
+        if isinstance(result, Exception):
+            failed += 1
+            network_logger.error(f"Bulk send to chat {chat_id} failed: {result}")
+    return failed
@@ -0,0 +1,46 @@
+import logging
+import database as db
+from config import WAITLIST_OFFER_HOURS
+from .outbound import ADMIN
+from .utils import send_bulk_messages
+
+app_logger = logging.getLogger("app")
+
+
+def promote_waitlist(application):
+    """
+    Offers every freed seat to the head of its event's waitlist and lets the
+    promoted users know in the background. Call it whenever seats may have
+    been released.
+    """
+    promoted = db.promote_from_waitlist(WAITLIST_OFFER_HOURS * 60)
+    if not promoted:
+        return
+    app_logger.info(
+        f"Promoted {len(promoted)} users from the waitlist: "
+        f"{[(user_id, event_id) for user_id, event_id, _ in promoted]}."
+    )
+    event_names = {}
+    messages = []
+    for user_id, event_id, _ in promoted:
+        if event_id not in event_names:
+            event_names[event_id] = db.get_event_by_id(event_id)["name"]
+        messages.append(
+            (
+                user_id,
+                f"🎉 A seat just opened up for '{event_names[event_id]}'! "
+                f"It is held for you for {WAITLIST_OFFER_HOURS} hours. "
+                "Send /start to complete your registration.",
+            )
+        )
+    application.create_task(
+        send_bulk_messages(application.bot, messages, priority=ADMIN)
+    )
+
+
+async def release_expired_holds(context):
+    """Job queue callback that frees the seats of lapsed holds for the waitlist."""
+    expired = db.expire_seat_holds()
+    if expired:
+        app_logger.info(f"Released {expired} expired seat holds.")
+    promote_waitlist(context.application)
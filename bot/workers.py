@@ -0,0 +1,27 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from config import PROCESS_POOL_WORKERS
+
+# Shared pool for CPU-bound work (image rendering, hashing) that must stay off
+# the event loop. Created lazily so processes are only spawned when needed.
+_process_pool = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=PROCESS_POOL_WORKERS)
+    return _process_pool
+
+
+async def run_in_process_pool(func, *args):
+    """Runs a picklable, module-level `func(*args)` in the shared process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
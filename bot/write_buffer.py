@@ -0,0 +1,86 @@
+import logging
+import sqlite3
+from collections import OrderedDict
+import database as db
+from config import PROFILE_CACHE_SIZE, PROFILE_FLUSH_BATCH_SIZE
+
+app_logger = logging.getLogger("app")
+
+
+class ProfileWriteBuffer:
+    """
+    Coalesces username/first_name refreshes for users that are already in the
+    database. Refreshes are held in memory, one entry per user, and written in a
+    single batched transaction when `batch_size` users are pending or when
+    flush() is called by the periodic job or on shutdown.
+
+    New users and referral credits never go through this buffer; callers only
+    use it for users it already knows about (see is_known).
+    """
+
+    def __init__(self, batch_size: int, cache_size: int):
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._pending = {}  # user_id -> (username, first_name) not yet written
+        self._known = OrderedDict()  # user_id -> latest (username, first_name), LRU
+
+    def is_known(self, user_id: int) -> bool:
+        return user_id in self._known
+
+    def remember(self, user_id: int, username, first_name):
+        """Records a profile that was just written to the database synchronously."""
+        self._pending.pop(user_id, None)
+        self._touch(user_id, (username, first_name))
+
+    def _touch(self, user_id: int, profile):
+        self._known[user_id] = profile
+        self._known.move_to_end(user_id)
+        if len(self._known) > self.cache_size:
+            # An evicted user's pending refresh still gets flushed; if they come
+            # back first, remember() drops it in favour of the synchronous write.
+            self._known.popitem(last=False)
+
+    def add(self, user_id: int, username, first_name):
+        """Queues a profile refresh for a known user. Unchanged profiles are ignored."""
+        profile = (username, first_name)
+        if self._known.get(user_id) == profile:
+            self._known.move_to_end(user_id)
+            return
+        self._pending[user_id] = profile
+        self._touch(user_id, profile)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """Writes all pending refreshes in one transaction. Returns the number written."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        try:
+            db.bulk_update_user_profiles(
+                [
+                    (user_id, username, first_name)
+                    for user_id, (username, first_name) in pending.items()
+                ]
+            )
+        except sqlite3.Error as e:
+            # Put the batch back, without clobbering anything queued meanwhile.
+            for user_id, profile in pending.items():
+                self._pending.setdefault(user_id, profile)
+            app_logger.error(
+                f"Failed to flush {len(pending)} buffered profile updates: {e}"
+            )
+            return 0
+        return len(pending)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+
+async def flush_profile_buffer(context):
+    """Job queue callback that periodically writes buffered profile refreshes."""
+    profile_buffer.flush()
+
+
+profile_buffer = ProfileWriteBuffer(PROFILE_FLUSH_BATCH_SIZE, PROFILE_CACHE_SIZE)
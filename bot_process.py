@@ -1,5 +1,6 @@
 import os
 import logging
+import sys
 from bot.core import run_bot
 from logging_config import setup_loggers
 from database import initialize_database
@@ -24,12 +25,14 @@ if __name__ == "__main__":
 
     initialize_database()
 
+    exit_code = 1
     try:
         logging.info("Starting Isocrates Bot process...")
-        run_bot()
+        exit_code = run_bot()
     except Exception as e:
         logging.critical(
             f"The bot has crashed unexpectedly in the core process: {e}", exc_info=True
         )
     finally:
         logging.info("Isocrates Bot process has been shut down.")
+    sys.exit(exit_code)
@@ -0,0 +1,43 @@
+import secrets
+
+# Digits and upper-case letters without the easily confused 0/O and 1/I/L (and U, as in Crockford's Base32).
+ALPHABET = "23456789ABCDEFGHJKMNPQRSTVWXYZ"
+TICKET_BODY_LENGTH = 7  # Plus one check character
+
+
+def random_code(length: int) -> str:
+    """Returns a cryptographically random string of `length` characters from ALPHABET."""
+    return "".join(secrets.choice(ALPHABET) for _ in range(length))
+
+
+def normalize_code(text: str) -> str:
+    """Upper-cases a user-typed code and strips the spaces and dashes people add."""
+    return "".join(text.split()).replace("-", "").upper()
+
+
+def _check_character(body: str) -> str:
+    """
+    Luhn mod N check character over ALPHABET. It catches every single-character
+    typo and nearly all swaps of adjacent characters.
+    """
+    base = len(ALPHABET)
+    total = 0
+    factor = 2
+    for char in reversed(body):
+        addend = factor * ALPHABET.index(char)
+        total += addend // base + addend % base
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[(base - total % base) % base]
+
+
+def generate_ticket_code() -> str:
+    """Returns a random 8-character ticket code whose last character is a checksum."""
+    body = random_code(TICKET_BODY_LENGTH)
+    return body + _check_character(body)
+
+
+def is_valid_ticket_code(code: str) -> bool:
+    """Checks the length, alphabet and checksum of a (normalized) ticket code."""
+    if len(code) != TICKET_BODY_LENGTH + 1 or any(c not in ALPHABET for c in code):
+        return False
+    return _check_character(code[:-1]) == code[-1]
@@ -1,6 +1,9 @@
 import os
-from dotenv import load_dotenv
+from dataclasses import dataclass
+from dotenv import dotenv_values, load_dotenv
 
+# The real environment always wins over .env, also when settings are reloaded.
+_PROCESS_ENV = dict(os.environ)
 load_dotenv()
 
 # --- Telegram Bot Configuration ---
@@ -9,16 +12,124 @@ BOT_USERNAME = os.getenv("BOT_USERNAME")
 if not TELEGRAM_BOT_TOKEN or not BOT_USERNAME:
     raise ValueError("TELEGRAM_BOT_TOKEN and BOT_USERNAME must be set in .env file!")
 
+
+# --- Reloadable Settings ---
+@dataclass(frozen=True)
+class Settings:
+    """
+    Settings that can be changed without restarting the bot, by editing .env and
+    sending SIGHUP or using /reloadconfig. Read them through get_settings() at the
+    point of use so that a reload takes effect immediately.
+    """
+
+    admin_chat_id: str
+    admin_user_ids: frozenset[int]
+    connect_timeout: float
+    read_timeout: float
+    max_retries: int
+    retry_delay: float
+    flood_exempt_user_ids: frozenset[int]
+
+
+def _parse_user_ids(value: str | None) -> frozenset[int]:
+    return frozenset(
+        int(uid.strip()) for uid in (value or "").split(",") if uid.strip()
+    )
+
+
+def load_settings() -> Settings:
+    """Reads and validates the settings from .env. Raises ValueError if any is invalid."""
+    env = {**dotenv_values(), **_PROCESS_ENV}
+    admin_chat_id = (env.get("ADMIN_CHAT_ID") or "").strip()
+    try:
+        admin_user_ids = _parse_user_ids(env.get("ADMIN_USER_IDS"))
+        settings = Settings(
+            admin_chat_id=admin_chat_id,
+            admin_user_ids=admin_user_ids,
+            connect_timeout=float(env.get("CONNECT_TIMEOUT") or 10),
+            read_timeout=float(env.get("READ_TIMEOUT") or 20),
+            max_retries=int(env.get("MAX_RETRIES") or 3),
+            retry_delay=float(env.get("RETRY_DELAY") or 2),
+            flood_exempt_user_ids=_parse_user_ids(env.get("FLOOD_EXEMPT_USER_IDS")),
+        )
+    except ValueError as e:
+        raise ValueError(f"Invalid setting in .env file: {e}") from e
+
+    if not settings.admin_chat_id or not settings.admin_user_ids:
+        raise ValueError("ADMIN_CHAT_ID and ADMIN_USER_IDS must be set in .env file!")
+    if settings.connect_timeout <= 0 or settings.read_timeout <= 0:
+        raise ValueError("CONNECT_TIMEOUT and READ_TIMEOUT must be positive.")
+    if settings.max_retries < 1 or settings.retry_delay < 0:
+        raise ValueError("MAX_RETRIES must be at least 1 and RETRY_DELAY not negative.")
+    return settings
+
+
+_settings = load_settings()
+
+
+def get_settings() -> Settings:
+    """Returns the current settings."""
+    return _settings
+
+
+def reload_settings() -> Settings:
+    """
+    Re-reads .env and swaps in the new settings as a whole. If validation fails,
+    ValueError is raised and the current settings stay in effect.
+    """
+    global _settings
+    _settings = load_settings()
+    return _settings
+
+
 # --- Admin Configuration ---
-ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID")
-admin_ids_str = os.getenv("ADMIN_USER_IDS", "")
-ADMIN_USER_IDS = [int(uid.strip()) for uid in admin_ids_str.split(",") if uid.strip()]
-if not ADMIN_CHAT_ID or not ADMIN_USER_IDS:
-    raise ValueError("ADMIN_CHAT_ID and ADMIN_USER_IDS must be set in .env file!")
+# Startup values; use get_settings() where a reload should take effect.
+ADMIN_CHAT_ID = _settings.admin_chat_id
+ADMIN_USER_IDS = sorted(_settings.admin_user_ids)
 
 # --- Database Configuration ---
 DATABASE_NAME = "isocrates.db"
 
+# --- Event Time Configuration ---
+# Admins enter event times in this timezone and format. Times are stored as Unix
+# time along with the timezone they were entered in, which is used for display.
+EVENT_TIMEZONE = "Asia/Tehran"
+EVENT_TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+# --- Ticket Configuration ---
+TICKET_CODE_MAX_ATTEMPTS = 5  # Fresh codes tried before giving up on a UNIQUE collision
+
+PROCESS_POOL_WORKERS = 2  # Worker processes for CPU-bound work like QR rendering
+
+# --- Receipt Archive Configuration ---
+# Receipt photos are copied to local disk, named by their SHA-256, so payment
+# proof doesn't depend on Telegram keeping the files.
+RECEIPT_ARCHIVE_DIR = "receipts"
+RECEIPT_ARCHIVE_CONCURRENCY = 2  # Receipts downloaded at once
+RECEIPT_MAX_FILE_SIZE = 10 * 1024 * 1024  # Bytes; larger receipts are not archived
+# Bytes; once the archive is this large, new receipts are no longer stored
+RECEIPT_ARCHIVE_MAX_SIZE = 5 * 1024**3
+RECEIPT_ARCHIVE_BACKFILL_INTERVAL = 300  # Seconds between retries of missing copies
+RECEIPT_ARCHIVE_BACKFILL_BATCH = 20  # Receipts archived per backfill run
+
+# --- Capacity & Waitlist Configuration ---
+SEAT_HOLD_MINUTES = 30  # How long a seat is held while a user completes registration
+WAITLIST_OFFER_HOURS = 24  # How long a seat offered to a waitlisted user is held
+SEAT_HOLD_CHECK_INTERVAL = 60  # Seconds between releases of expired seat holds
+
+# --- Discount Code Configuration ---
+DISCOUNT_CODE_LENGTH = 8  # Random characters in a generated code, after its prefix
+DISCOUNT_BULK_MAX_CODES = 100_000  # Codes one bulk generation or import may create
+DISCOUNT_IMPORT_MAX_FILE_SIZE = 5 * 1024 * 1024  # Bytes; larger CSV files are refused
+DISCOUNT_LIST_SIZE = 20  # Codes shown as buttons; export the CSV to see them all
+
+# --- Door Check-In Configuration ---
+CHECKIN_FLUSH_INTERVAL = 5  # Seconds between batched check-in writes
+CHECKIN_FLUSH_BATCH_SIZE = 50  # Write early once this many check-ins are queued
+CHECKIN_WRITE_TIMEOUT = (
+    0.2  # Seconds to wait on a locked database before retrying later
+)
+
 # --- Conversation States ---
 # User Flow
 CHOOSING, AWAITING_DISCOUNT_PROMPT, AWAITING_DISCOUNT_CODE, AWAITING_RECEIPT = range(4)
@@ -36,6 +147,7 @@ CHOOSING, AWAITING_DISCOUNT_PROMPT, AWAITING_DISCOUNT_CODE, AWAITING_RECEIPT = r
     GETTING_EVENT_IS_PAID,
     GETTING_PAYMENT_DETAILS,
     GETTING_REMINDERS,
+    GETTING_EVENT_CAPACITY,
     # Discount Management
     MANAGING_DISCOUNTS,
     DELETING_DISCOUNT,
@@ -43,16 +155,107 @@ CHOOSING, AWAITING_DISCOUNT_PROMPT, AWAITING_DISCOUNT_CODE, AWAITING_RECEIPT = r
     GETTING_DISCOUNT_TYPE,
     GETTING_DISCOUNT_VALUE,
     GETTING_DISCOUNT_USES,
-) = range(4, 20)
+    GETTING_BULK_DISCOUNT_CODES,
+    # Door Check-In
+    CHECKING_IN,
+) = range(4, 23)
+
+
+# --- Admin Review Configuration ---
+PENDING_BATCH_SIZE = (
+    10  # Receipts per review batch (a Telegram media group holds at most 10)
+)
+# Receipts whose perceptual hashes differ in at most this many of 64 bits are
+# flagged as duplicates. Up to 3, every such match is found through an index.
+RECEIPT_PHASH_MAX_DISTANCE = 3
+# New receipts are sent to the admin chat as periodic digests instead of one by one.
+ADMIN_DIGEST_INTERVAL = 30  # Seconds between digests
+ADMIN_DIGEST_URGENT_SIZE = 10  # Send a digest right away once this many are waiting
+LEADERBOARD_SIZE = 10  # Number of inviters shown on the referral leaderboards
+
+
+# --- Outbound Message Configuration ---
+# Every Bot API call except getUpdates passes the priority rate limiter
+# (bot/outbound.py). Under contention the classes share the rate by weight.
+OUTBOUND_RATE = 25  # Sends per second across all classes; Telegram allows about 30
+OUTBOUND_BURST = 5  # Sends allowed back to back after an idle period
+OUTBOUND_WEIGHTS = {"interactive": 16, "admin": 4, "bulk": 1}
+# Calls in flight per class. Together they should not exceed SEND_POOL_SIZE.
+OUTBOUND_CONCURRENCY = {"interactive": 10, "admin": 3, "bulk": 3}
+OUTBOUND_RETRY_AFTER_ATTEMPTS = 3  # Retries of a call rejected by flood control
+
+
+# --- Flood Control Configuration ---
+# Per-user token buckets in front of all handlers (bot/flood.py). Admins and the
+# users in FLOOD_EXEMPT_USER_IDS (.env, comma-separated) are never limited.
+FLOOD_RATE = 1.0  # Updates per second a user can keep sending
+FLOOD_BURST = 10  # Updates a user can send back to back
+# Buckets kept in memory; the least recently active user is evicted first.
+FLOOD_MAX_TRACKED_USERS = 50_000
+FLOOD_NOTICE_INTERVAL = 60  # Seconds between "slow down" notices to the same user
+
+
+# --- Write-Behind Buffer Configuration ---
+PROFILE_FLUSH_INTERVAL = 5  # Seconds between flushes of buffered profile refreshes
+PROFILE_FLUSH_BATCH_SIZE = 200  # Flush early once this many users are pending
+PROFILE_CACHE_SIZE = 50_000  # Known users remembered to skip redundant writes
+
+
+# --- Reminder Scheduler Configuration ---
+REMINDER_CHECK_INTERVAL = 60  # Seconds between scheduler ticks
+# A reminder that is overdue by more than this many seconds (for example because
+# the bot was down) is skipped instead of being sent late.
+REMINDER_GRACE_PERIOD = 30 * 60
+
+
+# --- Update Capture Configuration ---
+# Set CAPTURE_UPDATES=1 in .env to record every incoming update to
+# logs/updates.jsonl, for replaying real traffic with benchmarks/replay.py.
+CAPTURE_UPDATES = os.getenv("CAPTURE_UPDATES", "").lower() in ("1", "true", "yes")
 
 
 # --- Network & Watchdog Configuration ---
-CONNECT_TIMEOUT = 10
-READ_TIMEOUT = 20
-MAX_RETRIES = 3
-RETRY_DELAY = 2
+# Startup values; the live ones are in get_settings().
+CONNECT_TIMEOUT = _settings.connect_timeout
+READ_TIMEOUT = _settings.read_timeout
+MAX_RETRIES = _settings.max_retries
+RETRY_DELAY = _settings.retry_delay
 BOT_RESTART_DELAY = 15  # Seconds to wait before the watchdog restarts the bot
 
+# Graceful shutdown
+SHUTDOWN_DEADLINE = (
+    20  # Seconds allowed for draining in-flight work before exiting anyway
+)
+RESTART_EXIT_CODE = 75  # Exit code asking the watchdog for a restart (EX_TEMPFAIL)
+
+# Polling supervisor: rebuilds the HTTP transport in-process when polling keeps failing
+POLLING_FAILURE_THRESHOLD = 3  # Polling errors within the window that trigger a rebuild
+POLLING_FAILURE_WINDOW = 60  # Seconds
+POLLING_CHECK_INTERVAL = 10  # Seconds between checks that the polling loop is alive
+# Rebuilds tried before falling back to a graceful restart
+POLLING_RECOVERY_ATTEMPTS = 5
+# Seconds before the first rebuild, doubled per attempt and jittered
+POLLING_BACKOFF_BASE = 2
+POLLING_BACKOFF_MAX = 60  # Cap on the backoff between rebuilds
+
+# HTTP transport. getUpdates and outgoing calls use separate connection pools,
+# so a reminder fan-out can never starve update intake.
+
+# Max concurrent connections for sends, edits and downloads. Telegram allows about
+# 30 messages/s, which a few connections carry; idle ones cost CPU on every request.
+SEND_POOL_SIZE = 16
+SEND_POOL_TIMEOUT = 5  # Seconds a send waits for a free connection
+# Idle send connections kept open for reuse. Keep it at SEND_POOL_SIZE: with fewer,
+# a burst of sends opens a new connection for almost every message.
+KEEPALIVE_CONNECTIONS = 16
+KEEPALIVE_EXPIRY = 30  # Seconds an idle connection is kept open
+# "2" multiplexes all sends over one connection (needs python-telegram-bot[http2])
+SEND_HTTP_VERSION = os.getenv("SEND_HTTP_VERSION", "1.1")
+GET_UPDATES_POOL_SIZE = 2  # The long poll plus the final offset confirmation
+GET_UPDATES_HTTP_VERSION = "1.1"
+# Update types the handlers use; Telegram doesn't send the others at all.
+ALLOWED_UPDATES = ["message", "callback_query"]
+
 # Heartbeat settings for the watchdog
 HEARTBEAT_INTERVAL = 15  # Seconds: How often the bot updates its heartbeat
 HEARTBEAT_TIMEOUT = 60  # Seconds: How long to wait before declaring the bot frozen
@@ -1,7 +1,18 @@
+import logging
 import sqlite3
 import uuid
 from datetime import datetime
-from config import DATABASE_NAME
+from zoneinfo import ZoneInfo
+from codegen import generate_ticket_code, random_code
+from config import (
+    DATABASE_NAME,
+    DISCOUNT_CODE_LENGTH,
+    EVENT_TIME_FORMAT,
+    EVENT_TIMEZONE,
+    TICKET_CODE_MAX_ATTEMPTS,
+)
+
+app_logger = logging.getLogger("app")
 
 # --- Schema Definition ---
 SCHEMA = """
@@ -15,15 +26,19 @@ CREATE TABLE IF NOT EXISTS users (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX IF NOT EXISTS idx_users_referral_count ON users (referral_count DESC);
+
 CREATE TABLE IF NOT EXISTS events (
     event_id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL,
     description TEXT,
-    date TEXT,
-    fee REAL DEFAULT 0.0,
+    starts_at INTEGER, -- Unix time
+    timezone TEXT, -- IANA name of the timezone the start time was entered in
+    fee INTEGER DEFAULT 0, -- Toman
     is_paid INTEGER DEFAULT 0,
     payment_details TEXT,
-    reminders TEXT,
+    reminders TEXT, -- Hours before the start, comma-separated, e.g. '24,1'
+    capacity INTEGER, -- NULL for events without a seat limit
     is_active INTEGER DEFAULT 1,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -33,7 +48,7 @@ CREATE TABLE IF NOT EXISTS discount_codes (
     event_id INTEGER NOT NULL,
     code TEXT NOT NULL,
     discount_type TEXT NOT NULL, -- 'percentage' or 'fixed'
-    value REAL NOT NULL,
+    value INTEGER NOT NULL, -- Percent, or Toman for 'fixed'
     uses_left INTEGER DEFAULT 1,
     is_active INTEGER DEFAULT 1,
     UNIQUE(event_id, code),
@@ -48,17 +63,510 @@ CREATE TABLE IF NOT EXISTS registrations (
     ticket_code TEXT UNIQUE,
     receipt_file_id TEXT,
     discount_code_used TEXT,
-    final_fee REAL,
+    final_fee INTEGER, -- Toman, after any discount
+    checked_in_at TIMESTAMP,
+    ticket_qr_file_id TEXT,
+    receipt_unique_id TEXT,
+    receipt_phash INTEGER,
+    receipt_phash_b0 INTEGER,
+    receipt_phash_b1 INTEGER,
+    receipt_phash_b2 INTEGER,
+    receipt_phash_b3 INTEGER,
+    duplicate_of INTEGER,
+    receipt_local_path TEXT,
+    reserved_until TIMESTAMP,
     registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users (user_id),
     FOREIGN KEY (event_id) REFERENCES events (event_id)
 );
+
+CREATE INDEX IF NOT EXISTS idx_registrations_user_event
+ON registrations (user_id, event_id);
+
+-- Per-event counters for the admin dashboard, maintained by the triggers below.
+-- Metrics: 'status:<status>', 'revenue', 'discount_uses', 'referral_signups'.
+-- A seat hold ('reserved', or 'expired' once lapsed) is not a signup yet: a
+-- referral counts from the moment the row enters any other status.
+CREATE TABLE IF NOT EXISTS event_stats (
+    event_id INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    value INTEGER NOT NULL DEFAULT 0, -- 'revenue' in Toman, the rest are counts
+    PRIMARY KEY (event_id, metric)
+);
+
+CREATE TRIGGER IF NOT EXISTS event_stats_after_registration_insert
+AFTER INSERT ON registrations
+BEGIN
+    INSERT INTO event_stats (event_id, metric, value)
+    VALUES (NEW.event_id, 'status:' || NEW.status, 1)
+    ON CONFLICT (event_id, metric) DO UPDATE SET value = value + excluded.value;
+    INSERT INTO event_stats (event_id, metric, value)
+    VALUES (NEW.event_id, 'revenue', (NEW.status = 'confirmed') * COALESCE(NEW.final_fee, 0))
+    ON CONFLICT (event_id, metric) DO UPDATE SET value = value + excluded.value;
+    INSERT INTO event_stats (event_id, metric, value)
+    VALUES (NEW.event_id, 'discount_uses', NEW.discount_code_used IS NOT NULL)
+    ON CONFLICT (event_id, metric) DO UPDATE SET value = value + excluded.value;
+    INSERT INTO event_stats (event_id, metric, value)
+    VALUES (
+        NEW.event_id,
+        'referral_signups',
+        (NEW.status NOT IN ('reserved', 'expired'))
+            * COALESCE((SELECT invited_by_user_id IS NOT NULL FROM users WHERE user_id = NEW.user_id), 0)
+    )
+    ON CONFLICT (event_id, metric) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS event_stats_after_registration_update
+AFTER UPDATE OF status, final_fee, discount_code_used ON registrations
+WHEN OLD.status IS NOT NEW.status
+    OR OLD.final_fee IS NOT NEW.final_fee
+    OR OLD.discount_code_used IS NOT NEW.discount_code_used
+BEGIN
+    UPDATE event_stats SET value = value - 1
+    WHERE event_id = OLD.event_id AND metric = 'status:' || OLD.status;
+    INSERT INTO event_stats (event_id, metric, value)
+    VALUES (NEW.event_id, 'status:' || NEW.status, 1)
+    ON CONFLICT (event_id, metric) DO UPDATE SET value = value + excluded.value;
+    UPDATE event_stats
+    SET value = value
+        + (NEW.status = 'confirmed') * COALESCE(NEW.final_fee, 0)
+        - (OLD.status = 'confirmed') * COALESCE(OLD.final_fee, 0)
+    WHERE event_id = NEW.event_id AND metric = 'revenue';
+    UPDATE event_stats
+    SET value = value + (NEW.discount_code_used IS NOT NULL) - (OLD.discount_code_used IS NOT NULL)
+    WHERE event_id = NEW.event_id AND metric = 'discount_uses';
+    UPDATE event_stats
+    SET value = value
+        + ((NEW.status NOT IN ('reserved', 'expired')) - (OLD.status NOT IN ('reserved', 'expired')))
+            * COALESCE((SELECT invited_by_user_id IS NOT NULL FROM users WHERE user_id = NEW.user_id), 0)
+    WHERE event_id = NEW.event_id AND metric = 'referral_signups';
+END;
+
+CREATE TRIGGER IF NOT EXISTS event_stats_after_registration_delete
+AFTER DELETE ON registrations
+BEGIN
+    UPDATE event_stats SET value = value - 1
+    WHERE event_id = OLD.event_id AND metric = 'status:' || OLD.status;
+    UPDATE event_stats SET value = value - (OLD.status = 'confirmed') * COALESCE(OLD.final_fee, 0)
+    WHERE event_id = OLD.event_id AND metric = 'revenue';
+    UPDATE event_stats SET value = value - (OLD.discount_code_used IS NOT NULL)
+    WHERE event_id = OLD.event_id AND metric = 'discount_uses';
+    UPDATE event_stats
+    SET value = value - (OLD.status NOT IN ('reserved', 'expired'))
+        * COALESCE((SELECT invited_by_user_id IS NOT NULL FROM users WHERE user_id = OLD.user_id), 0)
+    WHERE event_id = OLD.event_id AND metric = 'referral_signups';
+END;
+
+-- Registrations per inviter and event, for the per-event referral leaderboard.
+CREATE TABLE IF NOT EXISTS event_referrals (
+    event_id INTEGER NOT NULL,
+    inviter_user_id INTEGER NOT NULL,
+    referral_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, inviter_user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_event_referrals_count
+ON event_referrals (event_id, referral_count DESC);
+
+-- Like 'referral_signups', seat holds are left out until they become registrations.
+CREATE TRIGGER IF NOT EXISTS event_referrals_after_registration_insert
+AFTER INSERT ON registrations
+WHEN NEW.status NOT IN ('reserved', 'expired')
+BEGIN
+    INSERT INTO event_referrals (event_id, inviter_user_id, referral_count)
+    SELECT NEW.event_id, invited_by_user_id, 1 FROM users
+    WHERE user_id = NEW.user_id AND invited_by_user_id IS NOT NULL
+    ON CONFLICT (event_id, inviter_user_id) DO UPDATE SET referral_count = referral_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS event_referrals_after_registration_update
+AFTER UPDATE OF status ON registrations
+WHEN (OLD.status NOT IN ('reserved', 'expired')) != (NEW.status NOT IN ('reserved', 'expired'))
+BEGIN
+    INSERT INTO event_referrals (event_id, inviter_user_id, referral_count)
+    SELECT NEW.event_id, invited_by_user_id, IIF(NEW.status IN ('reserved', 'expired'), -1, 1)
+    FROM users
+    WHERE user_id = NEW.user_id AND invited_by_user_id IS NOT NULL
+    ON CONFLICT (event_id, inviter_user_id)
+    DO UPDATE SET referral_count = referral_count + excluded.referral_count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS event_referrals_after_registration_delete
+AFTER DELETE ON registrations
+WHEN OLD.status NOT IN ('reserved', 'expired')
+BEGIN
+    UPDATE event_referrals SET referral_count = referral_count - 1
+    WHERE event_id = OLD.event_id
+        AND inviter_user_id = (SELECT invited_by_user_id FROM users WHERE user_id = OLD.user_id);
+END;
+
+-- Seats left per event with a capacity. A registration holds a seat from the
+-- moment it is reserved until it is rejected, expires or is deleted; seats are
+-- only ever taken by a conditional decrement (see _claim_seat).
+CREATE TABLE IF NOT EXISTS event_seats (
+    event_id INTEGER PRIMARY KEY,
+    seats_left INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS event_seats_after_registration_update
+AFTER UPDATE OF status ON registrations
+WHEN OLD.status NOT IN ('rejected', 'expired') AND NEW.status IN ('rejected', 'expired')
+BEGIN
+    UPDATE event_seats SET seats_left = seats_left + 1 WHERE event_id = OLD.event_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS event_seats_after_registration_delete
+AFTER DELETE ON registrations
+WHEN OLD.status NOT IN ('rejected', 'expired')
+BEGIN
+    UPDATE event_seats SET seats_left = seats_left + 1 WHERE event_id = OLD.event_id;
+END;
+
+-- Users waiting for a seat of a full event, served in waitlist_id order.
+CREATE TABLE IF NOT EXISTS event_waitlist (
+    waitlist_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(event_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_event_waitlist_event ON event_waitlist (event_id);
+
+-- One row per reminder of an event. sent_at is set once the reminder has been
+-- sent (or skipped), so each fires exactly once; the partial index keeps only
+-- the unsent ones, so finding due reminders is a range scan over remind_at.
+CREATE TABLE IF NOT EXISTS event_reminders (
+    event_id INTEGER NOT NULL,
+    hours_before INTEGER NOT NULL,
+    remind_at INTEGER NOT NULL, -- Unix time
+    sent_at TIMESTAMP,
+    PRIMARY KEY (event_id, hours_before)
+);
+
+CREATE INDEX IF NOT EXISTS idx_event_reminders_due
+ON event_reminders (remind_at) WHERE sent_at IS NULL;
 """
 
+# Columns added after the first release, as (table, column, definition).
+# initialize_database adds any that an older database is missing.
+ADDED_COLUMNS = [
+    ("events", "fee", "INTEGER DEFAULT 0"),
+    ("events", "capacity", "INTEGER"),
+    ("registrations", "discount_code_used", "TEXT"),
+    ("registrations", "final_fee", "INTEGER"),
+    ("registrations", "checked_in_at", "TIMESTAMP"),
+    ("registrations", "ticket_qr_file_id", "TEXT"),
+    ("registrations", "receipt_unique_id", "TEXT"),
+    ("registrations", "receipt_phash", "INTEGER"),
+    ("registrations", "receipt_phash_b0", "INTEGER"),
+    ("registrations", "receipt_phash_b1", "INTEGER"),
+    ("registrations", "receipt_phash_b2", "INTEGER"),
+    ("registrations", "receipt_phash_b3", "INTEGER"),
+    ("registrations", "duplicate_of", "INTEGER"),
+    ("registrations", "receipt_local_path", "TEXT"),
+    ("registrations", "reserved_until", "TIMESTAMP"),
+]
 
-def get_db_connection():
-    """Establishes a connection to the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
+# Indexes on columns from ADDED_COLUMNS, created once the columns exist.
+# Receipts are looked up by Telegram's file_unique_id for exact duplicates and
+# by each 16-bit band of their perceptual hash for near duplicates.
+ADDED_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_registrations_receipt_unique_id "
+    "ON registrations (receipt_unique_id)",
+    *(
+        f"CREATE INDEX IF NOT EXISTS idx_registrations_receipt_phash_b{band} "
+        f"ON registrations (receipt_phash_b{band})"
+        for band in range(4)
+    ),
+    # Only receipts without an archived copy, so the backfill never scans.
+    "CREATE INDEX IF NOT EXISTS idx_registrations_unarchived_receipts "
+    "ON registrations (registration_id) "
+    "WHERE receipt_file_id IS NOT NULL AND receipt_local_path IS NULL",
+    # Only seat holds, so releasing expired ones never scans.
+    "CREATE INDEX IF NOT EXISTS idx_registrations_seat_holds "
+    "ON registrations (reserved_until) WHERE status = 'reserved'",
+    "CREATE INDEX IF NOT EXISTS idx_events_starts_at ON events (starts_at)",
+]
+
+
+def _migrate_typed_event_times(conn):
+    """
+    Rebuilds the events table with the start time as Unix time plus the timezone
+    it was entered in, instead of the free-form `date` text, and the fee as
+    integer Toman. Dates that don't parse are logged and left empty. The sent
+    reminders move from sent_reminders into the schedule in event_reminders.
+    """
+    conn.execute("""
+        CREATE TABLE events_new (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            starts_at INTEGER,
+            timezone TEXT,
+            fee INTEGER DEFAULT 0,
+            is_paid INTEGER DEFAULT 0,
+            payment_details TEXT,
+            reminders TEXT,
+            capacity INTEGER,
+            is_active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+    events = []
+    for row in conn.execute("SELECT * FROM events"):
+        starts_at = None
+        try:
+            starts_at = int(
+                datetime.strptime(row["date"].strip(), EVENT_TIME_FORMAT)
+                .replace(tzinfo=ZoneInfo(EVENT_TIMEZONE))
+                .timestamp()
+            )
+        except (AttributeError, ValueError):
+            app_logger.warning(
+                f"Event {row['event_id']} has an unreadable date '{row['date']}'; "
+                "its start time is left empty."
+            )
+        events.append(
+            (
+                row["event_id"],
+                row["name"],
+                row["description"],
+                starts_at,
+                EVENT_TIMEZONE,
+                round(row["fee"] or 0),
+                row["is_paid"],
+                row["payment_details"],
+                row["reminders"],
+                row["capacity"],
+                row["is_active"],
+                row["created_at"],
+            )
+        )
+    conn.executemany(
+        "INSERT INTO events_new VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", events
+    )
+    has_sent_reminders = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sent_reminders'"
+    ).fetchone()
+    sent = {}
+    if has_sent_reminders:
+        sent = {
+            (row[0], row[1]): row[2]
+            for row in conn.execute(
+                "SELECT event_id, hours_before, sent_at FROM sent_reminders"
+            )
+        }
+    reminders = []
+    for event_id, _, _, starts_at, _, _, _, _, hours, *_ in events:
+        if starts_at is None or not hours:
+            continue
+        for hour in hours.split(","):
+            if hour.strip().isdigit():
+                hour = int(hour)
+                reminders.append(
+                    (
+                        event_id,
+                        hour,
+                        starts_at - hour * 3600,
+                        sent.get((event_id, hour)),
+                    )
+                )
+    conn.executemany(
+        "INSERT OR IGNORE INTO event_reminders (event_id, hours_before, remind_at, sent_at) "
+        "VALUES (?, ?, ?, ?)",
+        reminders,
+    )
+    conn.execute(
+        "UPDATE sqlite_sequence SET seq = "
+        "(SELECT seq FROM sqlite_sequence WHERE name = 'events') WHERE name = 'events_new'"
+    )
+    conn.execute("DROP TABLE events")
+    conn.execute("ALTER TABLE events_new RENAME TO events")
+    conn.execute("DROP TABLE IF EXISTS sent_reminders")
+
+
+def _migrate_referrals_without_seat_holds(conn):
+    """
+    Version 2: seat holds stop counting as referral signups. The referral
+    triggers are dropped so that SCHEMA recreates them with the new
+    definitions, and the counters that holds inflated are recomputed.
+    """
+    for trigger in (
+        "event_stats_after_registration_insert",
+        "event_stats_after_registration_update",
+        "event_stats_after_registration_delete",
+        "event_referrals_after_registration_insert",
+        "event_referrals_after_registration_delete",
+    ):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DELETE FROM event_referrals")
+    conn.execute(
+        "INSERT INTO event_referrals (event_id, inviter_user_id, referral_count) "
+        + EVENT_REFERRALS_QUERY
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO event_stats (event_id, metric, value) "
+        f"SELECT * FROM ({EVENT_STATS_QUERY}) WHERE metric = 'referral_signups'"
+    )
+
+
+def _rebuild_with_integer_column(conn, table, create_sql, column):
+    """
+    Copies `table` into a new one created by `create_sql` (with {table} as the
+    name placeholder), rounding `column` to an integer, and swaps it in. Its
+    indexes and triggers go with the old table; SCHEMA and ADDED_INDEXES
+    recreate them.
+    """
+    columns = [row["name"] for row in conn.execute(f"PRAGMA table_info({table})")]
+    selected = [
+        f"CAST(ROUND({name}) AS INTEGER)" if name == column else name
+        for name in columns
+    ]
+    conn.execute(create_sql.format(table=f"{table}_new"))
+    conn.execute(
+        f"INSERT INTO {table}_new ({', '.join(columns)}) "
+        f"SELECT {', '.join(selected)} FROM {table}"
+    )
+    conn.execute(
+        "UPDATE sqlite_sequence SET seq = (SELECT seq FROM sqlite_sequence WHERE name = ?) "
+        "WHERE name = ?",
+        (table, f"{table}_new"),
+    )
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+
+def _migrate_integer_money(conn):
+    """
+    Version 3: money is stored as integer Toman everywhere, like events.fee.
+    registrations.final_fee and discount_codes.value are rounded into INTEGER
+    columns, and event_stats is recomputed with integer values.
+    """
+    _rebuild_with_integer_column(
+        conn,
+        "registrations",
+        """
+        CREATE TABLE {table} (
+            registration_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            event_id INTEGER,
+            status TEXT,
+            ticket_code TEXT UNIQUE,
+            receipt_file_id TEXT,
+            discount_code_used TEXT,
+            final_fee INTEGER,
+            checked_in_at TIMESTAMP,
+            ticket_qr_file_id TEXT,
+            receipt_unique_id TEXT,
+            receipt_phash INTEGER,
+            receipt_phash_b0 INTEGER,
+            receipt_phash_b1 INTEGER,
+            receipt_phash_b2 INTEGER,
+            receipt_phash_b3 INTEGER,
+            duplicate_of INTEGER,
+            receipt_local_path TEXT,
+            reserved_until TIMESTAMP,
+            registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (event_id) REFERENCES events (event_id)
+        )
+        """,
+        "final_fee",
+    )
+    _rebuild_with_integer_column(
+        conn,
+        "discount_codes",
+        """
+        CREATE TABLE {table} (
+            code_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            code TEXT NOT NULL,
+            discount_type TEXT NOT NULL,
+            value INTEGER NOT NULL,
+            uses_left INTEGER DEFAULT 1,
+            is_active INTEGER DEFAULT 1,
+            UNIQUE(event_id, code),
+            FOREIGN KEY (event_id) REFERENCES events (event_id)
+        )
+        """,
+        "value",
+    )
+    conn.execute("DROP TABLE event_stats")
+    conn.execute("""
+        CREATE TABLE event_stats (
+            event_id INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (event_id, metric)
+        )
+        """)
+    conn.execute(
+        f"INSERT INTO event_stats (event_id, metric, value) {EVENT_STATS_QUERY}"
+    )
+
+
+# Schema migrations that can't be expressed as added columns, in order. The
+# database's PRAGMA user_version counts how many of them it has been through.
+MIGRATIONS = [
+    _migrate_typed_event_times,
+    _migrate_referrals_without_seat_holds,
+    _migrate_integer_money,
+]
+
+# Recomputes every event_referrals counter from registrations and users.
+EVENT_REFERRALS_QUERY = """
+SELECT r.event_id, u.invited_by_user_id, COUNT(*)
+FROM registrations r JOIN users u ON r.user_id = u.user_id
+WHERE u.invited_by_user_id IS NOT NULL AND r.status NOT IN ('reserved', 'expired')
+GROUP BY r.event_id, u.invited_by_user_id
+"""
+
+# Recomputes every event_stats counter directly from the registrations table.
+EVENT_STATS_QUERY = """
+SELECT event_id, 'status:' || status AS metric, COUNT(*) AS value
+FROM registrations GROUP BY event_id, status
+UNION ALL
+SELECT event_id, 'revenue', SUM((status = 'confirmed') * COALESCE(final_fee, 0))
+FROM registrations GROUP BY event_id
+UNION ALL
+SELECT event_id, 'discount_uses', SUM(discount_code_used IS NOT NULL)
+FROM registrations GROUP BY event_id
+UNION ALL
+SELECT r.event_id, 'referral_signups',
+    SUM((r.status NOT IN ('reserved', 'expired')) * COALESCE(u.invited_by_user_id IS NOT NULL, 0))
+FROM registrations r LEFT JOIN users u ON r.user_id = u.user_id GROUP BY r.event_id
+"""
+
+# Recomputes the seats left of every event with a capacity.
+EVENT_SEATS_QUERY = """
+SELECT e.event_id, e.capacity - COUNT(r.registration_id)
+FROM events e
+LEFT JOIN registrations r
+    ON r.event_id = e.event_id AND r.status NOT IN ('rejected', 'expired')
+WHERE e.capacity IS NOT NULL
+GROUP BY e.event_id
+"""
+
+
+# In-process write counters per table, bumped by every write function below.
+# Anything cached from a table is stale once that table's counter has moved.
+_data_versions = {"users": 0, "events": 0, "registrations": 0, "discount_codes": 0}
+
+
+def _bump_data_version(*tables):
+    for table in tables:
+        _data_versions[table] += 1
+
+
+def get_data_version(*tables) -> tuple:
+    """Returns the current write counters of `tables`, for cache invalidation."""
+    return tuple(_data_versions[table] for table in tables)
+
+
+def get_db_connection(timeout: float = 5.0):
+    """Establishes a connection that waits up to `timeout` seconds for locks."""
+    conn = sqlite3.connect(DATABASE_NAME, timeout=timeout)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -66,40 +574,101 @@ def get_db_connection():
 def initialize_database():
     """Creates the database tables and adds new columns if they don't already exist."""
     conn = get_db_connection()
+    existing_tables = {
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
     conn.executescript(SCHEMA)
+    if "event_referrals" not in existing_tables:
+        conn.execute(
+            "INSERT INTO event_referrals (event_id, inviter_user_id, referral_count) "
+            + EVENT_REFERRALS_QUERY
+        )
+        conn.commit()
     # --- Add new columns for backward compatibility ---
-    try:
-        conn.execute("ALTER TABLE events ADD COLUMN fee REAL DEFAULT 0.0")
-        conn.execute("ALTER TABLE registrations ADD COLUMN discount_code_used TEXT")
-        conn.execute("ALTER TABLE registrations ADD COLUMN final_fee REAL")
-    except sqlite3.OperationalError:
-        pass  # Columns already exist
+    for table, column, definition in ADDED_COLUMNS:
+        columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    # A new database already has the latest schema.
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if "events" not in existing_tables:
+        version = len(MIGRATIONS)
+    for number, migrate in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN")
+        try:
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        app_logger.info(f"Database migrated to schema version {number}.")
+    if version < len(MIGRATIONS):
+        conn.executescript(SCHEMA)  # Recreates any triggers a migration dropped
+    conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+    for statement in ADDED_INDEXES:
+        conn.execute(statement)
+    conn.commit()
     conn.close()
+    if "event_stats" not in existing_tables:
+        # Backfill counters for databases created before event_stats existed.
+        rebuild_event_stats()
 
 
 # --- User Functions ---
-def add_or_update_user(user_id, username, first_name, invited_by=None):
+def add_or_update_user(user_id, username, first_name, invited_by=None) -> bool:
+    """
+    Inserts a new user or refreshes an existing one with a single upsert. The
+    profile is only rewritten when it actually changed, and a new user's inviter
+    is credited in the same transaction. Returns True if the user was created.
+    """
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-    user = cursor.fetchone()
-    if user is None:
-        referral_code = str(uuid.uuid4())[:8]
-        cursor.execute(
-            "INSERT INTO users (user_id, username, first_name, referral_code, invited_by_user_id) VALUES (?, ?, ?, ?, ?)",
-            (user_id, username, first_name, referral_code, invited_by),
-        )
-        if invited_by:
-            cursor.execute(
-                "UPDATE users SET referral_count = referral_count + 1 WHERE user_id = ?",
-                (invited_by,),
-            )
-    else:
-        cursor.execute(
-            "UPDATE users SET username = ?, first_name = ? WHERE user_id = ?",
-            (username, first_name, user_id),
+    referral_code = str(uuid.uuid4())[:8]
+    cursor = conn.execute(
+        """
+        INSERT INTO users (user_id, username, first_name, referral_code, invited_by_user_id)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE
+        SET username = excluded.username, first_name = excluded.first_name
+        WHERE users.username IS NOT excluded.username
+            OR users.first_name IS NOT excluded.first_name
+        RETURNING referral_code
+        """,
+        (user_id, username, first_name, referral_code, invited_by),
+    )
+    row = cursor.fetchone()
+    # An existing row keeps its own referral code, so ours only comes back on insert.
+    is_new = row is not None and row[0] == referral_code
+    if is_new and invited_by:
+        conn.execute(
+            "UPDATE users SET referral_count = referral_count + 1 WHERE user_id = ?",
+            (invited_by,),
         )
     conn.commit()
+    _bump_data_version("users")
+    conn.close()
+    return is_new
+
+
+def bulk_update_user_profiles(profiles):
+    """
+    Applies many (user_id, username, first_name) refreshes in one transaction.
+    Rows whose profile is already up to date are left untouched.
+    """
+    conn = get_db_connection()
+    conn.executemany(
+        """
+        UPDATE users SET username = ?, first_name = ?
+        WHERE user_id = ? AND (username IS NOT ? OR first_name IS NOT ?)
+        """,
+        [
+            (username, first_name, user_id, username, first_name)
+            for user_id, username, first_name in profiles
+        ],
+    )
+    conn.commit()
+    _bump_data_version("users")
     conn.close()
 
 
@@ -124,13 +693,67 @@ def get_user_referral_info(user_id):
     return result
 
 
+def get_referrer(user_id: int):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT user_id, username, first_name, referral_count FROM users WHERE user_id = ?",
+        (user_id,),
+    )
+    result = cursor.fetchone()
+    conn.close()
+    return result
+
+
+def get_top_referrers(limit: int):
+    """Fetches the users with the most referrals, walking the referral_count index."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT user_id, username, first_name, referral_count FROM users
+        WHERE referral_count > 0
+        ORDER BY referral_count DESC
+        LIMIT ?
+    """,
+        (limit,),
+    )
+    results = cursor.fetchall()
+    conn.close()
+    return results
+
+
+def get_top_event_referrers(event_id: int, limit: int):
+    """Fetches the inviters whose invitees registered most often for an event."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT er.inviter_user_id AS user_id, u.username, u.first_name, er.referral_count
+        FROM event_referrals er
+        JOIN users u ON er.inviter_user_id = u.user_id
+        WHERE er.event_id = ? AND er.referral_count > 0
+        ORDER BY er.referral_count DESC
+        LIMIT ?
+    """,
+        (event_id, limit),
+    )
+    results = cursor.fetchall()
+    conn.close()
+    return results
+
+
 # --- Registration Functions ---
 def get_user_registration_for_event(user_id: int, event_id: int):
-    """Checks if a user already has a registration for a specific event."""
+    """
+    Checks if a user already has a registration for a specific event. Seat holds
+    that expired don't count.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
-        "SELECT * FROM registrations WHERE user_id = ? AND event_id = ?",
+        "SELECT * FROM registrations WHERE user_id = ? AND event_id = ? AND status != 'expired' "
+        "ORDER BY registration_id DESC LIMIT 1",
         (user_id, event_id),
     )
     registration = cursor.fetchone()
@@ -138,15 +761,209 @@ def get_user_registration_for_event(user_id: int, event_id: int):
     return registration
 
 
-def create_registration(user_id, event_id, status, final_fee=None, discount_code=None):
-    """Creates a new registration record."""
+def _claim_seat(cursor, event_id) -> bool:
+    """
+    Takes a seat of the event inside the caller's transaction. While anyone is
+    on the event's waitlist, new claims fail so that nobody jumps the queue.
+    Events without a capacity always have a seat.
+    """
+    cursor.execute(
+        """
+        UPDATE event_seats SET seats_left = seats_left - 1
+        WHERE event_id = ? AND seats_left > 0
+            AND NOT EXISTS (SELECT 1 FROM event_waitlist WHERE event_id = ?)
+        """,
+        (event_id, event_id),
+    )
+    if cursor.rowcount:
+        return True
+    cursor.execute("SELECT 1 FROM event_seats WHERE event_id = ?", (event_id,))
+    return cursor.fetchone() is None
+
+
+def create_registration(
+    user_id, event_id, status, final_fee=None, discount_code=None
+) -> int | None:
+    """
+    Creates a registration record, or completes the user's seat reservation
+    for the event if they hold one. Returns the registration's ID, or None if
+    the event has no seat left for the user.
+    """
     conn = get_db_connection()
-    conn.execute(
-        "INSERT INTO registrations (user_id, event_id, status, final_fee, discount_code_used) VALUES (?, ?, ?, ?, ?)",
-        (user_id, event_id, status, final_fee, discount_code),
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(
+            """
+            UPDATE registrations
+            SET status = ?, final_fee = ?, discount_code_used = ?, reserved_until = NULL
+            WHERE registration_id = (
+                SELECT registration_id FROM registrations
+                WHERE user_id = ? AND event_id = ? AND status = 'reserved'
+                ORDER BY registration_id DESC LIMIT 1
+            )
+            RETURNING registration_id
+            """,
+            (status, final_fee, discount_code, user_id, event_id),
+        )
+        row = cursor.fetchone()
+        if row is None and _claim_seat(cursor, event_id):
+            cursor.execute(
+                "INSERT INTO registrations (user_id, event_id, status, final_fee, discount_code_used) "
+                "VALUES (?, ?, ?, ?, ?) RETURNING registration_id",
+                (user_id, event_id, status, final_fee, discount_code),
+            )
+            row = cursor.fetchone()
+        cursor.execute("COMMIT")
+        _bump_data_version("registrations")
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def reserve_seat(user_id: int, event_id: int, hold_minutes: int) -> int | None:
+    """
+    Holds a seat of the event for the user for `hold_minutes` while they complete
+    their registration, or puts them on the waitlist if the event is full.
+    Returns the ID of the registration holding the user's seat (an existing one
+    if they already have it), or None if they are on the waitlist.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(
+            "SELECT registration_id FROM registrations "
+            "WHERE user_id = ? AND event_id = ? AND status NOT IN ('rejected', 'expired') "
+            "ORDER BY registration_id DESC LIMIT 1",
+            (user_id, event_id),
+        )
+        row = cursor.fetchone()
+        if row is None and _claim_seat(cursor, event_id):
+            cursor.execute(
+                "INSERT INTO registrations (user_id, event_id, status, reserved_until) "
+                "VALUES (?, ?, 'reserved', datetime('now', ?)) RETURNING registration_id",
+                (user_id, event_id, f"+{hold_minutes} minutes"),
+            )
+            row = cursor.fetchone()
+        elif row is None:
+            cursor.execute(
+                "INSERT OR IGNORE INTO event_waitlist (event_id, user_id) VALUES (?, ?)",
+                (event_id, user_id),
+            )
+        cursor.execute("COMMIT")
+        _bump_data_version("registrations")
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def get_waitlist_position(user_id: int, event_id: int) -> int | None:
+    """Returns the user's 1-based place on the event's waitlist, or None if not on it."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM event_waitlist
+        WHERE event_id = ? AND waitlist_id <= (
+            SELECT waitlist_id FROM event_waitlist WHERE event_id = ? AND user_id = ?
+        )
+        """,
+        (event_id, event_id, user_id),
+    )
+    position = cursor.fetchone()[0]
+    conn.close()
+    return position or None
+
+
+def promote_from_waitlist(hold_minutes: int):
+    """
+    Hands every free seat of an event with a waitlist to the user at its head,
+    as a seat reservation held for `hold_minutes`. Returns a list of
+    (user_id, event_id, registration_id) tuples for the promoted users.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("""
+            SELECT event_id, seats_left FROM event_seats s
+            WHERE seats_left > 0
+                AND EXISTS (SELECT 1 FROM event_waitlist w WHERE w.event_id = s.event_id)
+            """)
+        promoted = []
+        for event_id, seats_left in cursor.fetchall():
+            cursor.execute(
+                """
+                DELETE FROM event_waitlist WHERE waitlist_id IN (
+                    SELECT waitlist_id FROM event_waitlist
+                    WHERE event_id = ? ORDER BY waitlist_id LIMIT ?
+                )
+                RETURNING waitlist_id, user_id
+                """,
+                (event_id, seats_left),
+            )
+            # RETURNING gives no guaranteed order, so restore the queue order.
+            user_ids = [user_id for _, user_id in sorted(map(tuple, cursor.fetchall()))]
+            cursor.execute(
+                "UPDATE event_seats SET seats_left = seats_left - ? WHERE event_id = ?",
+                (len(user_ids), event_id),
+            )
+            for user_id in user_ids:
+                cursor.execute(
+                    "INSERT INTO registrations (user_id, event_id, status, reserved_until) "
+                    "VALUES (?, ?, 'reserved', datetime('now', ?)) RETURNING registration_id",
+                    (user_id, event_id, f"+{hold_minutes} minutes"),
+                )
+                promoted.append((user_id, event_id, cursor.fetchone()[0]))
+        cursor.execute("COMMIT")
+        if promoted:
+            _bump_data_version("registrations")
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return promoted
+
+
+def expire_seat_holds() -> int:
+    """Releases the seats of reservations whose hold has run out. Returns how many."""
+    conn = get_db_connection()
+    cursor = conn.execute(
+        "UPDATE registrations SET status = 'expired' "
+        "WHERE status = 'reserved' AND reserved_until <= datetime('now')"
     )
+    expired = cursor.rowcount
     conn.commit()
+    if expired:
+        _bump_data_version("registrations")
+    conn.close()
+    return expired
+
+
+def get_event_seats(event_id: int):
+    """Returns (capacity, seats_left, waitlisted) for an event with a capacity, or None."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT e.capacity, s.seats_left,
+            (SELECT COUNT(*) FROM event_waitlist w WHERE w.event_id = e.event_id)
+        FROM events e JOIN event_seats s ON s.event_id = e.event_id
+        WHERE e.event_id = ?
+        """,
+        (event_id,),
+    )
+    seats = cursor.fetchone()
     conn.close()
+    return tuple(seats) if seats else None
 
 
 def get_last_registration_id(user_id: int, event_id: int) -> int | None:
@@ -161,58 +978,303 @@ def get_last_registration_id(user_id: int, event_id: int) -> int | None:
     return result[0] if result else None
 
 
-def get_next_pending_registration():
+def get_pending_registrations(limit: int):
+    """Fetches the oldest registrations awaiting receipt verification, up to `limit`."""
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
         """
-        SELECT r.registration_id, r.user_id, r.receipt_file_id, u.username, u.first_name, e.name, r.final_fee, r.discount_code_used
+        SELECT r.registration_id, r.user_id, r.receipt_file_id, u.username, u.first_name, e.name, r.final_fee, r.discount_code_used, r.duplicate_of, r.receipt_local_path
         FROM registrations r
         JOIN users u ON r.user_id = u.user_id
         JOIN events e ON r.event_id = e.event_id
         WHERE r.status = 'pending_verification' AND r.receipt_file_id IS NOT NULL
         ORDER BY r.registered_at ASC
-        LIMIT 1
-    """
+        LIMIT ?
+    """,
+        (limit,),
     )
-    result = cursor.fetchone()
+    results = cursor.fetchall()
     conn.close()
+    return results
+
+
+def get_next_pending_registration():
+    results = get_pending_registrations(1)
+    return results[0] if results else None
+
+
+def _confirm_with_ticket_code(
+    cursor, registration_id, from_status="pending_verification"
+) -> str | None:
+    """
+    Confirms a registration with a fresh ticket code inside the caller's transaction,
+    provided it is still in `from_status`; returns None otherwise. A collision with
+    an existing code only fails that one statement, so another code is tried, up to
+    TICKET_CODE_MAX_ATTEMPTS times.
+    """
+    for attempt in range(1, TICKET_CODE_MAX_ATTEMPTS + 1):
+        ticket_code = generate_ticket_code()
+        try:
+            # A QR cached for an earlier code would no longer scan.
+            cursor.execute(
+                "UPDATE registrations SET status = 'confirmed', ticket_code = ?, ticket_qr_file_id = NULL "
+                "WHERE registration_id = ? AND status = ?",
+                (ticket_code, registration_id, from_status),
+            )
+            return ticket_code if cursor.rowcount == 1 else None
+        except sqlite3.IntegrityError:
+            if attempt == TICKET_CODE_MAX_ATTEMPTS:
+                raise
+
+
+def update_registration_status(
+    registration_id, new_status, from_status="pending_verification"
+):
+    """
+    Moves a registration out of `from_status`, so a decision that was already made
+    (by another admin, or through a stale button) is never overwritten; a rejected
+    registration may have given its seat away. Returns the new ticket code when
+    confirming and True otherwise, or None if the registration was not in
+    `from_status`.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if new_status == "confirmed":
+            result = _confirm_with_ticket_code(cursor, registration_id, from_status)
+        else:
+            cursor.execute(
+                "UPDATE registrations SET status = ? WHERE registration_id = ? AND status = ?",
+                (new_status, registration_id, from_status),
+            )
+            result = True if cursor.rowcount == 1 else None
+        conn.commit()
+        _bump_data_version("registrations")
+    finally:
+        conn.close()  # Rolls back anything left uncommitted
     return result
 
 
-def update_registration_status(registration_id, new_status):
+def bulk_update_registration_status(registration_ids, new_status):
+    """
+    Moves a batch of registrations out of 'pending_verification' in one transaction.
+    Registrations that were already decided elsewhere are skipped. Returns a list of
+    (registration_id, user_id, ticket_code) tuples for the rows that were updated.
+    """
     conn = get_db_connection()
-    ticket_code = None
-    if new_status == "confirmed":
-        ticket_code = str(uuid.uuid4()).split("-")[0].upper()
-        conn.execute(
-            "UPDATE registrations SET status = ?, ticket_code = ? WHERE registration_id = ?",
-            (new_status, ticket_code, registration_id),
-        )
-    else:
-        conn.execute(
-            "UPDATE registrations SET status = ? WHERE registration_id = ?",
-            (new_status, registration_id),
+    cursor = conn.cursor()
+    cursor.execute("BEGIN TRANSACTION")
+    try:
+        placeholders = ",".join("?" * len(registration_ids))
+        cursor.execute(
+            f"SELECT registration_id, user_id FROM registrations "
+            f"WHERE status = 'pending_verification' AND registration_id IN ({placeholders})",
+            list(registration_ids),
         )
+        updated = []
+        if new_status == "confirmed":
+            for registration_id, user_id in cursor.fetchall():
+                ticket_code = _confirm_with_ticket_code(cursor, registration_id)
+                updated.append((registration_id, user_id, ticket_code))
+        else:
+            updated = [(reg_id, user_id, None) for reg_id, user_id in cursor.fetchall()]
+            cursor.executemany(
+                "UPDATE registrations SET status = ? WHERE registration_id = ?",
+                [(new_status, reg_id) for reg_id, _, _ in updated],
+            )
+        cursor.execute("COMMIT")
+        _bump_data_version("registrations")
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return updated
+
+
+def set_ticket_qr_file_id(registration_id: int, file_id: str):
+    """Caches the Telegram file_id of a registration's uploaded QR ticket."""
+    conn = get_db_connection()
+    conn.execute(
+        "UPDATE registrations SET ticket_qr_file_id = ? WHERE registration_id = ?",
+        (file_id, registration_id),
+    )
     conn.commit()
+    _bump_data_version("registrations")
     conn.close()
-    return ticket_code
 
 
-def add_receipt_to_registration(user_id, event_id, receipt_file_id):
+def set_receipt_local_path(registration_id: int, path: str):
+    """Records where the archived copy of a registration's receipt is stored."""
     conn = get_db_connection()
     conn.execute(
+        "UPDATE registrations SET receipt_local_path = ? WHERE registration_id = ?",
+        (path, registration_id),
+    )
+    conn.commit()
+    _bump_data_version("registrations")
+    conn.close()
+
+
+def get_unarchived_receipts(limit: int):
+    """
+    Fetches up to `limit` registrations whose receipt has no archived copy yet,
+    oldest first, with whether it still needs a duplicate check.
+    """
+    conn = get_db_connection()
+    cursor = conn.execute(
         """
-        UPDATE registrations SET receipt_file_id = ?
+        SELECT registration_id, receipt_file_id,
+            receipt_phash IS NULL AND duplicate_of IS NULL AS needs_phash
+        FROM registrations
+        WHERE receipt_file_id IS NOT NULL AND receipt_local_path IS NULL
+        ORDER BY registration_id
+        LIMIT ?
+        """,
+        (limit,),
+    )
+    results = cursor.fetchall()
+    conn.close()
+    return results
+
+
+def get_registration_by_ticket_code(ticket_code: str):
+    """Looks up a registration through the UNIQUE index on ticket_code."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT r.registration_id, r.user_id, r.event_id, r.status, r.ticket_code,
+               r.checked_in_at, u.username, u.first_name, e.name AS event_name
+        FROM registrations r
+        JOIN users u ON r.user_id = u.user_id
+        JOIN events e ON r.event_id = e.event_id
+        WHERE r.ticket_code = ?
+    """,
+        (ticket_code,),
+    )
+    registration = cursor.fetchone()
+    conn.close()
+    return registration
+
+
+def add_receipt_to_registration(
+    user_id, event_id, receipt_file_id, receipt_unique_id=None, duplicate_of=None
+) -> int | None:
+    """
+    Attaches a receipt to the user's latest pending registration for the event,
+    flagging it as a duplicate of registration `duplicate_of` if given. Returns
+    the registration's ID, or None if there was none to attach it to.
+    """
+    conn = get_db_connection()
+    cursor = conn.execute(
+        """
+        UPDATE registrations
+        SET receipt_file_id = ?, receipt_unique_id = ?, duplicate_of = ?
         WHERE registration_id = (
             SELECT registration_id FROM registrations
             WHERE user_id = ? AND event_id = ? AND status = 'pending_verification'
             ORDER BY registered_at DESC LIMIT 1
         )
+        RETURNING registration_id
+        """,
+        (
+            receipt_file_id,
+            receipt_unique_id,
+            duplicate_of,
+            user_id,
+            event_id,
+        ),
+    )
+    row = cursor.fetchone()
+    conn.commit()
+    _bump_data_version("registrations")
+    conn.close()
+    return row[0] if row else None
+
+
+def find_receipt_by_unique_id(receipt_unique_id, user_id=None, event_id=None):
+    """
+    Returns a registration that received this exact receipt file, or None. The
+    user's own registration for the event that is still awaiting verification
+    comes first, so a resubmission is recognized even if someone else sent the
+    file earlier; otherwise the first registration that received it.
+    """
+    conn = get_db_connection()
+    cursor = conn.execute(
+        """
+        SELECT registration_id, user_id, event_id, status FROM registrations
+        WHERE receipt_unique_id = ?
+        ORDER BY (user_id = ? AND event_id = ? AND status = 'pending_verification') DESC,
+            registration_id
+        LIMIT 1
+        """,
+        (receipt_unique_id, user_id, event_id),
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+
+def _phash_to_sql(phash: int) -> int:
+    """SQLite integers are signed 64-bit; store the hash's bits as one."""
+    return phash - (1 << 64) if phash >= 1 << 63 else phash
+
+
+def _phash_bands(phash: int) -> list[int]:
+    return [(phash >> (16 * band)) & 0xFFFF for band in range(4)]
+
+
+def find_similar_receipts(phash: int, max_distance: int, exclude_registration_id=None):
+    """
+    Finds receipts whose perceptual hash differs from `phash` in at most
+    `max_distance` bits, as (registration_id, distance) pairs, closest first.
+    Candidates share at least one 16-bit band with `phash` and are found through
+    the band indexes, so every match within 3 bits is found without a scan.
+    """
+    conn = get_db_connection()
+    cursor = conn.execute(
+        """
+        SELECT registration_id, receipt_phash FROM registrations
+        WHERE (receipt_phash_b0 = ? OR receipt_phash_b1 = ?
+               OR receipt_phash_b2 = ? OR receipt_phash_b3 = ?)
+            AND registration_id IS NOT ?
+        """,
+        (*_phash_bands(phash), exclude_registration_id),
+    )
+    matches = []
+    for registration_id, stored in cursor:
+        distance = ((stored & 0xFFFFFFFFFFFFFFFF) ^ phash).bit_count()
+        if distance <= max_distance:
+            matches.append((registration_id, distance))
+    conn.close()
+    return sorted(matches, key=lambda match: match[1])
+
+
+def set_receipt_phash(registration_id: int, phash: int, duplicate_of=None):
+    """
+    Stores a receipt's perceptual hash. `duplicate_of` flags the registration as
+    a near duplicate, unless it was already flagged as an exact one.
+    """
+    conn = get_db_connection()
+    conn.execute(
+        """
+        UPDATE registrations
+        SET receipt_phash = ?, receipt_phash_b0 = ?, receipt_phash_b1 = ?,
+            receipt_phash_b2 = ?, receipt_phash_b3 = ?,
+            duplicate_of = COALESCE(duplicate_of, ?)
+        WHERE registration_id = ?
         """,
-        (receipt_file_id, user_id, event_id),
+        (
+            _phash_to_sql(phash),
+            *_phash_bands(phash),
+            duplicate_of,
+            registration_id,
+        ),
     )
     conn.commit()
+    _bump_data_version("registrations")
     conn.close()
 
 
@@ -228,6 +1290,44 @@ def get_confirmed_attendees(event_id):
     return attendees
 
 
+def get_confirmed_tickets(event_id: int):
+    """Fetches every confirmed ticket for an event along with its holder and check-in time."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT r.registration_id, r.ticket_code, r.checked_in_at, u.username, u.first_name
+        FROM registrations r
+        JOIN users u ON r.user_id = u.user_id
+        WHERE r.event_id = ? AND r.status = 'confirmed' AND r.ticket_code IS NOT NULL
+    """,
+        (event_id,),
+    )
+    tickets = cursor.fetchall()
+    conn.close()
+    return tickets
+
+
+def record_check_ins(check_ins, timeout: float = 5.0):
+    """
+    Stores many (registration_id, checked_in_at) pairs in one transaction.
+    The first recorded check-in for a registration wins.
+    """
+    conn = get_db_connection(timeout)
+    try:
+        conn.executemany(
+            "UPDATE registrations SET checked_in_at = ? WHERE registration_id = ? AND checked_in_at IS NULL",
+            [
+                (checked_in_at, registration_id)
+                for registration_id, checked_in_at in check_ins
+            ],
+        )
+        conn.commit()
+        _bump_data_version("registrations")
+    finally:
+        conn.close()
+
+
 def get_participants_for_event(event_id: int):
     """Fetches a list of participants for a given event."""
     conn = get_db_connection()
@@ -257,38 +1357,106 @@ def get_active_event():
     return event
 
 
-def create_event(name, description, date, fee, is_paid, payment_details, reminders):
-    """Creates a new event with detailed information."""
+def create_event(
+    name,
+    description,
+    starts_at,
+    timezone,
+    fee,
+    is_paid,
+    payment_details,
+    reminder_hours,
+    capacity=None,
+):
+    """
+    Creates a new event with detailed information and schedules its reminders.
+    `starts_at` is Unix time, `fee` is in Toman and `reminder_hours` lists the
+    hours before the start at which to remind attendees. A capacity of None
+    means no seat limit.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE events SET is_active = 0")
     cursor.execute(
         """
-        INSERT INTO events (name, description, date, fee, is_paid, payment_details, reminders, is_active)
-        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        INSERT INTO events (name, description, starts_at, timezone, fee, is_paid, payment_details, reminders, capacity, is_active)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
         """,
-        (name, description, date, fee, is_paid, payment_details, reminders),
+        (
+            name,
+            description,
+            starts_at,
+            timezone,
+            fee,
+            is_paid,
+            payment_details,
+            ",".join(map(str, reminder_hours)),
+            capacity,
+        ),
     )
+    event_id = cursor.lastrowid
+    if starts_at is not None:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO event_reminders (event_id, hours_before, remind_at) "
+            "VALUES (?, ?, ?)",
+            [(event_id, hour, starts_at - hour * 3600) for hour in reminder_hours],
+        )
+    if capacity is not None:
+        cursor.execute(
+            "INSERT INTO event_seats (event_id, seats_left) VALUES (?, ?)",
+            (event_id, capacity),
+        )
     conn.commit()
+    _bump_data_version("events")
     conn.close()
 
 
 def get_all_events():
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM events ORDER BY created_at DESC")
+    cursor.execute("SELECT * FROM events ORDER BY starts_at DESC")
     events = cursor.fetchall()
     conn.close()
     return events
 
 
-def get_events_with_pending_reminders():
+def get_due_reminders(now: int):
+    """
+    Fetches the unsent reminders of active events that are due at Unix time
+    `now`, oldest first, along with their event's name and start time.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM events WHERE is_active = 1 AND date IS NOT NULL")
-    events = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT r.event_id, r.hours_before, r.remind_at, e.name, e.starts_at
+        FROM event_reminders r
+        JOIN events e ON r.event_id = e.event_id
+        WHERE r.sent_at IS NULL AND r.remind_at <= ? AND e.is_active = 1
+        ORDER BY r.remind_at
+    """,
+        (now,),
+    )
+    reminders = cursor.fetchall()
     conn.close()
-    return events
+    return reminders
+
+
+def claim_reminder(event_id: int, hours_before: int) -> bool:
+    """
+    Marks a reminder as sent. Returns True only for the first caller, so a
+    reminder is never delivered twice, even across restarts.
+    """
+    conn = get_db_connection()
+    cursor = conn.execute(
+        "UPDATE event_reminders SET sent_at = CURRENT_TIMESTAMP "
+        "WHERE event_id = ? AND hours_before = ? AND sent_at IS NULL",
+        (event_id, hours_before),
+    )
+    claimed = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    return claimed
 
 
 def get_event_by_id(event_id: int):
@@ -306,6 +1474,7 @@ def set_active_event(event_id: int):
     cursor.execute("UPDATE events SET is_active = 0")
     cursor.execute("UPDATE events SET is_active = 1 WHERE event_id = ?", (event_id,))
     conn.commit()
+    _bump_data_version("events")
     conn.close()
 
 
@@ -317,7 +1486,13 @@ def delete_event_by_id(event_id: int):
         cursor.execute("DELETE FROM registrations WHERE event_id = ?", (event_id,))
         cursor.execute("DELETE FROM discount_codes WHERE event_id = ?", (event_id,))
         cursor.execute("DELETE FROM events WHERE event_id = ?", (event_id,))
+        cursor.execute("DELETE FROM event_stats WHERE event_id = ?", (event_id,))
+        cursor.execute("DELETE FROM event_referrals WHERE event_id = ?", (event_id,))
+        cursor.execute("DELETE FROM event_reminders WHERE event_id = ?", (event_id,))
+        cursor.execute("DELETE FROM event_seats WHERE event_id = ?", (event_id,))
+        cursor.execute("DELETE FROM event_waitlist WHERE event_id = ?", (event_id,))
         cursor.execute("COMMIT")
+        _bump_data_version("events", "registrations", "discount_codes")
     except sqlite3.Error:
         cursor.execute("ROLLBACK")
         raise
@@ -326,21 +1501,36 @@ def delete_event_by_id(event_id: int):
 
 
 # --- Discount Code Functions ---
-def get_discount_codes_for_event(event_id: int):
-    """Fetches all discount codes for a specific event."""
+def get_discount_codes_for_event(event_id: int, limit: int = None):
+    """Fetches the discount codes for a specific event, all of them unless `limit` is given."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM discount_codes WHERE event_id = ?", (event_id,))
+    cursor.execute(
+        "SELECT * FROM discount_codes WHERE event_id = ? ORDER BY code_id LIMIT ?",
+        (event_id, -1 if limit is None else limit),
+    )
     codes = cursor.fetchall()
     conn.close()
     return codes
 
 
+def count_discount_codes(event_id: int) -> int:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT COUNT(*) FROM discount_codes WHERE event_id = ?", (event_id,)
+    )
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+
 def delete_discount_code(code_id: int):
     """Deletes a discount code from the database."""
     conn = get_db_connection()
     conn.execute("DELETE FROM discount_codes WHERE code_id = ?", (code_id,))
     conn.commit()
+    _bump_data_version("discount_codes")
     conn.close()
 
 
@@ -351,9 +1541,83 @@ def create_discount_code(event_id, code, discount_type, value, uses_left):
         (event_id, code, discount_type, value, uses_left),
     )
     conn.commit()
+    _bump_data_version("discount_codes")
     conn.close()
 
 
+def _insert_discount_codes(conn, event_id, make_codes, discount_type, value, uses_left):
+    """
+    Inserts the codes returned by `make_codes(existing)` in one transaction,
+    where `existing` is the set of codes the event already has. The write lock
+    is taken first, so nothing can claim a code between the check and the
+    insert. Returns the codes inserted.
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(
+            "SELECT code FROM discount_codes WHERE event_id = ?", (event_id,)
+        )
+        codes = make_codes({row[0] for row in cursor})
+        cursor.executemany(
+            "INSERT INTO discount_codes (event_id, code, discount_type, value, uses_left) VALUES (?, ?, ?, ?, ?)",
+            ((event_id, code, discount_type, value, uses_left) for code in codes),
+        )
+        cursor.execute("COMMIT")
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK")
+        raise
+    if codes:
+        _bump_data_version("discount_codes")
+    return codes
+
+
+def generate_discount_codes(
+    event_id, count, prefix, discount_type, value, uses_left
+) -> list[str]:
+    """
+    Creates `count` random codes, each `prefix` followed by DISCOUNT_CODE_LENGTH
+    characters. A candidate that is taken (by an existing code or an earlier
+    candidate) is simply redrawn. Returns the new codes.
+    """
+
+    def make_codes(existing):
+        codes = {}  # Insertion ordered, unlike a set
+        while len(codes) < count:
+            code = prefix + random_code(DISCOUNT_CODE_LENGTH)
+            if code not in existing:
+                codes[code] = None
+        return list(codes)
+
+    conn = get_db_connection()
+    try:
+        return _insert_discount_codes(
+            conn, event_id, make_codes, discount_type, value, uses_left
+        )
+    finally:
+        conn.close()
+
+
+def create_discount_codes(
+    event_id, codes, discount_type, value, uses_left
+) -> list[str]:
+    """
+    Creates the given codes, for imports. Codes the event already has and
+    repeats within `codes` are skipped. Returns the codes actually created.
+    """
+
+    def make_codes(existing):
+        return [code for code in dict.fromkeys(codes) if code not in existing]
+
+    conn = get_db_connection()
+    try:
+        return _insert_discount_codes(
+            conn, event_id, make_codes, discount_type, value, uses_left
+        )
+    finally:
+        conn.close()
+
+
 def get_discount_code(event_id: int, code: str):
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -373,4 +1637,73 @@ def use_discount_code(code_id: int):
         (code_id,),
     )
     conn.commit()
+    _bump_data_version("discount_codes")
+    conn.close()
+
+
+# --- Statistics Functions ---
+def get_event_stats(event_id: int) -> dict:
+    """Reads the precomputed counters for an event as a {metric: value} dict."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT metric, value FROM event_stats WHERE event_id = ?", (event_id,)
+    )
+    stats = {row["metric"]: row["value"] for row in cursor.fetchall()}
     conn.close()
+    return stats
+
+
+def rebuild_event_stats():
+    """
+    Recomputes all event counters, seat counters included, from scratch and
+    replaces the stored ones. Returns a list of (event_id, metric, stored,
+    expected) tuples for every counter that had drifted from its true value.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN TRANSACTION")
+    try:
+        cursor.execute("SELECT event_id, metric, value FROM event_stats")
+        stored = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+        cursor.execute("SELECT event_id, 'seats_left', seats_left FROM event_seats")
+        stored.update({(row[0], row[1]): row[2] for row in cursor.fetchall()})
+        cursor.execute(EVENT_STATS_QUERY)
+        expected = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+        cursor.execute(EVENT_SEATS_QUERY)
+        expected_seats = {row[0]: row[1] for row in cursor.fetchall()}
+        expected.update(
+            {
+                (event_id, "seats_left"): seats
+                for event_id, seats in expected_seats.items()
+            }
+        )
+
+        drift = []
+        for key in sorted(stored.keys() | expected.keys()):
+            stored_value = stored.get(key, 0)
+            expected_value = expected.get(key, 0)
+            if abs(stored_value - expected_value) > 1e-6:
+                drift.append((*key, stored_value, expected_value))
+
+        cursor.execute("DELETE FROM event_stats")
+        cursor.executemany(
+            "INSERT INTO event_stats (event_id, metric, value) VALUES (?, ?, ?)",
+            [
+                (event_id, metric, value)
+                for (event_id, metric), value in expected.items()
+                if metric != "seats_left"
+            ],
+        )
+        cursor.execute("DELETE FROM event_seats")
+        cursor.executemany(
+            "INSERT INTO event_seats (event_id, seats_left) VALUES (?, ?)",
+            expected_seats.items(),
+        )
+        cursor.execute("COMMIT")
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return drift
@@ -67,6 +67,17 @@ scheduler_handler = RotatingFileHandler(
 scheduler_handler.setLevel(logging.DEBUG)
 scheduler_handler.setFormatter(file_formatter)
 
+# Raw incoming updates, one JSON object per line, written only in capture mode.
+# The file is opened on the first captured update.
+capture_handler = RotatingFileHandler(
+    os.path.join(LOG_DIR, "updates.jsonl"),
+    maxBytes=50 * 1024 * 1024,
+    backupCount=5,
+    delay=True,
+)
+capture_handler.setLevel(logging.INFO)
+capture_handler.setFormatter(logging.Formatter("%(message)s"))
+
 
 # --- Main Setup Function ---
 def setup_loggers():
@@ -95,4 +106,10 @@ def setup_loggers():
     scheduler_logger.addHandler(scheduler_handler)
     scheduler_logger.propagate = False
 
+    # Update capture logger
+    capture_logger = logging.getLogger("capture")
+    capture_logger.setLevel(logging.INFO)
+    capture_logger.addHandler(capture_handler)
+    capture_logger.propagate = False
+
     logging.info("Logging configuration loaded successfully.")
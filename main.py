@@ -10,6 +10,7 @@ from config import (
     HEARTBEAT_FILE,
     HEARTBEAT_INTERVAL,
     HEARTBEAT_TIMEOUT,
+    RESTART_EXIT_CODE,
 )
 
 # --- Setup ---
@@ -87,6 +88,13 @@ if __name__ == "__main__":
                 bot_process.wait()
                 start_bot_process()
 
+            # The bot drained its work and asked to be restarted.
+            elif not bot_is_running and bot_process.returncode == RESTART_EXIT_CODE:
+                log.warning(
+                    "Bot process shut down gracefully and requested a restart. Restarting..."
+                )
+                start_bot_process()
+
             # If the bot process has stopped for any reason, restart it.
             elif not bot_is_running:
                 log.error(
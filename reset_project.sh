@@ -26,4 +26,13 @@ else
   echo "💨 Database file not found, skipping."
 fi
 
+# 4. Remove the archived receipts
+if [ -d "receipts" ]; then
+  echo "🔥 Deleting receipt archive..."
+  rm -rf receipts
+  echo "✅ Receipt archive deleted."
+else
+  echo "💨 Receipt archive not found, skipping."
+fi
+
 echo "✨ Project cleanup complete. ✨"